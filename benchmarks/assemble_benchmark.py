@@ -0,0 +1,286 @@
+"""End-to-end benchmarks for assemble_from, at increasing scale.
+
+Every scenario runs a full assemble -- dictionary read through to writing the
+output file -- against the local fake API (tablecensus/fake_api.py), in a
+fresh process so its peak memory is its own. From a baseline of one county,
+10 indicators and one year, each axis is scaled on its own:
+
+    geography   one county -> every Michigan tract -> every US tract
+    indicators  10 -> 100 -> 500
+    years       1 -> 5 -> 10
+
+Stage times come from the StageTimer assemble_from already keeps. Results are
+written as JSON, so two commits can be compared:
+
+    python benchmarks/assemble_benchmark.py --output before.json
+    (check out the other commit)
+    python benchmarks/assemble_benchmark.py --output after.json --compare before.json
+
+--replay ARCHIVE runs every scenario's dictionary against a recording made
+with `tablecensus assemble --record` instead of the fake API.
+"""
+
+import asyncio
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from queue import Empty
+
+import click
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+GEOGRAPHIES = {
+    "1 county": {"state": ["26"], "county": ["163"]},
+    "MI tracts": {"state": ["26"], "county": ["*"], "tract": ["*"]},
+    "US tracts": {"state": ["*"], "county": ["*"], "tract": ["*"]},
+}
+INDICATORS = [10, 100, 500]
+YEARS = [1, 5, 10]
+
+BASELINE = ("1 county", 10, 1)
+
+# --quick stops short of the last step on every axis.
+QUICK = (list(GEOGRAPHIES)[:-1], INDICATORS[:-1], YEARS[:-1])
+
+
+def scenarios(quick: bool) -> list[tuple[str, int, int]]:
+    geography, indicators, years = BASELINE
+    found = [BASELINE]
+    found += [(g, indicators, years) for g in GEOGRAPHIES if g != geography]
+    found += [(geography, n, years) for n in INDICATORS if n != indicators]
+    found += [(geography, indicators, n) for n in YEARS if n != years]
+    if quick:
+        found = [s for s in found if all(value in allowed for value, allowed in zip(s, QUICK))]
+    return found
+
+
+def synthetic_indicators(count: int) -> pd.DataFrame:
+    """
+    Indicators shaped like a real dictionary: counts, sums of neighbouring
+    cells, and rates over a shared table total.
+    """
+    rows = []
+    for i in range(count):
+        table = f"B{90001 + i // 20:05d}"
+        cell = i % 20 + 2
+        match i % 3:
+            case 0:
+                calculation = f"{table}{cell:03d}"
+            case 1:
+                calculation = f"{table}{cell:03d} + {table}{cell + 1:03d}"
+            case _:
+                calculation = f"{table}{cell:03d} / {table}001"
+        rows.append({"name": f"indicator_{i}", "calculation": calculation})
+    return pd.DataFrame(rows)
+
+
+def write_dictionary(path: Path, geography: str, indicators: int, years: int) -> None:
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        synthetic_indicators(indicators).to_excel(writer, sheet_name="Variables", index=False)
+        pd.DataFrame({
+            "year": [2023 - i for i in range(years)],
+            "release": ["acs5"] * years,
+        }).to_excel(writer, sheet_name="Years", index=False)
+        pd.DataFrame(GEOGRAPHIES[geography]).to_excel(writer, sheet_name="Geographies", index=False)
+
+
+def peak_rss_mb() -> float | None:
+    # getrusage's peak survives fork and exec, so on Linux it would report
+    # the parent's peak (the fake API's, after a big scenario). VmHWM is this
+    # process's own.
+    try:
+        for line in Path("/proc/self/status").read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def run_scenario(scenario, workdir, output_format, replay, queue):
+    """
+    Runs in its own process. Puts the scenario's result on 'queue', or
+    {"error": ...} if it failed, so the parent never waits on a result that
+    isn't coming.
+    """
+    try:
+        queue.put(measure(scenario, workdir, output_format, replay))
+    except Exception as e:
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def wait_for_result(process, queue) -> dict:
+    """The child's result, or an error if it died without sending one."""
+    while True:
+        try:
+            return queue.get(timeout=1)
+        except Empty:
+            if process.exitcode is None:
+                continue
+            # It may have sent its result just before exiting.
+            try:
+                return queue.get(timeout=1)
+            except Empty:
+                return {"error": f"exited with code {process.exitcode} without a result"}
+
+
+def measure(scenario, workdir, output_format, replay) -> dict:
+    # Keep the run's config, cache and warehouse out of the real home folder.
+    os.environ["HOME"] = str(workdir)
+    os.environ["APPDATA"] = str(workdir)
+    config = Path(workdir) / ".config" / "tablecensus" / "config.toml"
+    config.parent.mkdir(parents=True, exist_ok=True)
+    config.write_text('[census]\napi_key = "benchmark"\n')
+
+    from tablecensus.assemble import assemble_from
+    from tablecensus.table_style import write_d3_excel
+    from tablecensus.timing import StageTimer
+
+    geography, indicators, years = scenario
+    dictionary = Path(workdir) / "dictionary.xlsx"
+    write_dictionary(dictionary, geography, indicators, years)
+
+    timer = StageTimer()
+    started = time.perf_counter()
+    result = assemble_from(dictionary, cache_mode="off", replay=replay, timer=timer)
+
+    with timer.stage("write"):
+        output = Path(workdir) / f"report.{output_format}"
+        if output_format == "xlsx":
+            write_d3_excel(result, output)
+        else:
+            result.to_csv(output, index=False)
+
+    return {
+        "geography": geography,
+        "indicators": indicators,
+        "years": years,
+        "rows": len(result),
+        "stages": timer.stages,
+        "total": time.perf_counter() - started,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def serve_fake_api(**settings) -> str:
+    """Starts the fake API on a background thread and returns its base URL."""
+    from tablecensus.fake_api import start_fake_api
+
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    found = {}
+
+    def run():
+        asyncio.set_event_loop(loop)
+        _, _, found["url"] = loop.run_until_complete(start_fake_api(**settings))
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    return found["url"]
+
+
+def commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: list[dict], baseline: list[dict]) -> str:
+    def key(r):
+        return (r["geography"], r["indicators"], r["years"])
+
+    before = {key(r): r for r in baseline}
+    lines = []
+    for result in results:
+        old = before.get(key(result))
+        if old is None:
+            continue
+        lines.append(
+            f"{'%s, %d indicators, %d years' % key(result):<40} "
+            f"{old['total']:8.2f}s -> {result['total']:8.2f}s  ({result['total'] / old['total']:.2f}x)"
+        )
+        for stage, seconds in result["stages"].items():
+            was = old["stages"].get(stage)
+            if was:
+                lines.append(f"    {stage:<12} {was:8.3f}s -> {seconds:8.3f}s  ({seconds / was:.2f}x)")
+    return "\n".join(lines)
+
+
+@click.command()
+@click.option("--output", type=click.Path(dir_okay=False, path_type=Path),
+              default=Path("benchmarks/results.json"), show_default=True)
+@click.option("--compare", "baseline", type=click.Path(exists=True, dir_okay=False, path_type=Path),
+              help="Earlier results to compare against.")
+@click.option("--quick", is_flag=True, help="Skip the largest scenarios.")
+@click.option("--format", "output_format", type=click.Choice(["csv", "xlsx"]), default="csv",
+              show_default=True, help="Output file written in the 'write' stage.")
+@click.option("--latency", default=0.0, type=float, help="Fake API latency per response, in seconds.")
+@click.option("--replay", type=click.Path(exists=True, dir_okay=False, path_type=Path),
+              help="Serve responses from a recording instead of the fake API.")
+def main(output, baseline, quick, output_format, latency, replay):
+    if replay is None:
+        os.environ["CENSUS_API_URL"] = serve_fake_api(latency=latency)
+
+    context = multiprocessing.get_context("spawn")
+    results, failed = [], []
+    for scenario in scenarios(quick):
+        print(f"{scenario[0]}, {scenario[1]} indicators, {scenario[2]} years ...", flush=True)
+        with tempfile.TemporaryDirectory() as workdir:
+            queue = context.Queue()
+            process = context.Process(
+                target=run_scenario, args=(scenario, workdir, output_format, replay, queue),
+            )
+            process.start()
+            result = wait_for_result(process, queue)
+            process.join()
+        if "error" in result:
+            print(f"  failed: {result['error']}")
+            failed.append(scenario)
+            continue
+        results.append(result)
+        print(f"  {result['rows']:,} rows in {result['total']:.2f}s, "
+              f"peak {result['peak_rss_mb'] or 0:,.0f} MB")
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        "commit": commit(),
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "latency": latency,
+        "results": results,
+    }, indent=2))
+    print(f"Wrote {output}")
+
+    if baseline is not None:
+        print(compare(results, json.loads(baseline.read_text())["results"]))
+
+    if failed:
+        raise click.ClickException(f"{len(failed)} of {len(failed) + len(results)} scenarios failed.")
+
+
+if __name__ == "__main__":
+    main()
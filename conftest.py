@@ -0,0 +1,15 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def isolated_config(tmp_path, monkeypatch):
+    """Keep the config file and local caches out of the real home directory."""
+    config_path = tmp_path / "config" / "config.toml"
+    monkeypatch.setattr("tablecensus.config._config_path", lambda: config_path)
+    return config_path
+
+
+@pytest.fixture(autouse=True)
+def no_preflight(monkeypatch):
+    """Pre-flight checks download variable lists; tests of them turn this back on."""
+    monkeypatch.setenv("CENSUS_PREFLIGHT", "0")
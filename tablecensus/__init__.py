@@ -1,11 +1,45 @@
+"""Census data pulls defined in a spreadsheet. `tablecensus` is the CLI.
+
+Importing the package is cheap: pandas, numpy, aiohttp and openpyxl are only
+loaded when a command needs them, so `tablecensus start` and `--help` don't
+wait on them. The names below are imported on first use.
+"""
+
 from pathlib import Path
 import shutil
+from importlib import import_module
 from importlib.resources import files, as_file
 import datetime
 import click
 
-from .assemble import assemble_from
-from .table_style import apply_d3_style
+from .dataset import CODECS, DEFAULT_ROW_GROUP_ROWS
+
+_LAZY = {
+    "assemble_from": ".assemble",
+    "assemble_async": ".assemble",
+    "plan_report": ".assemble",
+    "read_dictionary": ".assemble",
+    "column_calculations": ".dataset",
+    "write_report": ".output",
+    "assemble_partitioned": ".partitioned",
+    "assemble_batch": ".batch",
+    "fetch_async": ".request_manager",
+    "AdaptiveLimiter": ".request_manager",
+    "apply_d3_style": ".table_style",
+    "write_d3_excel": ".table_style",
+    "Profiler": ".timing",
+    "StageTimer": ".timing",
+}
+
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
 
 TODAY = datetime.date.today().strftime("%Y%m%d")
 
@@ -49,18 +83,245 @@ def start(destination):
     "--dump-raw",
     is_flag=True,
 )
-def assemble(dictionary_path, output_path, short_geoids, dump_raw):
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    help="Neither read nor write the local response cache.",
+)
+@click.option(
+    "--refresh",
+    is_flag=True,
+    help="Re-fetch everything from the API and update the local cache.",
+)
+@click.option(
+    "--record",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="Save every API response to this archive (.jsonl.gz) for later replay.",
+)
+@click.option(
+    "--replay",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    help="Serve API responses from an archive made with --record, offline.",
+)
+@click.option(
+    "--profile",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="Write a timing tree of the run (stages and every API request) to this file.",
+)
+@click.option(
+    "--profile-format",
+    type=click.Choice(["json", "chrome"]),
+    default="json",
+    help="'chrome' writes a trace for chrome://tracing or ui.perfetto.dev.",
+)
+@click.option(
+    "--profile-cpu",
+    is_flag=True,
+    help="With --profile, also cProfile the CPU-bound stages into a .prof file.",
+)
+@click.option(
+    "--partitioned",
+    is_flag=True,
+    help="With a .parquet output, write a dataset folder partitioned by year, release and summary level.",
+)
+@click.option(
+    "--compression",
+    type=click.Choice(CODECS),
+    default="zstd",
+    show_default=True,
+    help="Compression for .parquet output.",
+)
+@click.option(
+    "--row-group-size",
+    type=click.IntRange(min=1),
+    default=DEFAULT_ROW_GROUP_ROWS,
+    show_default=True,
+    help="Rows per row group in a --partitioned dataset.",
+)
+@click.option(
+    "--memory-budget",
+    type=click.FloatRange(min=1),
+    help="Assemble a state and year at a time, keeping each piece under roughly this many MB.",
+)
+def assemble(dictionary_path, output_path, short_geoids, dump_raw, no_cache, refresh, record, replay,
+             profile, profile_format, profile_cpu, partitioned, compression, row_group_size,
+             memory_budget):
+    if record and replay:
+        raise click.UsageError("--record and --replay can't be used together.")
+    if partitioned and Path(output_path).suffix != ".parquet":
+        raise click.UsageError("--partitioned needs a .parquet output path.")
+    if memory_budget and dump_raw:
+        raise click.UsageError("--dump-raw can't be used with --memory-budget.")
+
+    from .assemble import assemble_from, read_dictionary
+    from .dataset import column_calculations
+    from .output import write_report
+    from .partitioned import assemble_partitioned
+    from .timing import Profiler, StageTimer
+
     print(f"Assembling data from dictionary {dictionary_path} and saving to {output_path}")
-    
-    final = assemble_from(dictionary_path, short_geoids, dump_raw)
+
+    timer = Profiler(cpu=profile_cpu) if profile else StageTimer()
+
+    cache_mode = "off" if no_cache else "refresh" if refresh else "use"
     path = Path(output_path)
+    options = dict(partitioned=partitioned, compression=compression, row_group_size=row_group_size)
+    if partitioned:
+        variables, _, _ = read_dictionary(dictionary_path)
+        options["calculations"] = column_calculations(variables)
 
-    if path.suffix == ".xlsx":
-        apply_d3_style(final).to_excel(output_path, index=False)
+    if memory_budget:
+        with assemble_partitioned(
+            dictionary_path, memory_budget, short_geoids, cache_mode,
+            record=record, replay=replay, timer=timer,
+        ) as report:
+            with timer.stage("write"):
+                write_report(report, path, **options)
+    else:
+        final = assemble_from(
+            dictionary_path, short_geoids, dump_raw, cache_mode,
+            record=record, replay=replay, timer=timer,
+        )
+        with timer.stage("write"):
+            write_report([final], path, **options)
 
-    elif path.suffix == ".csv":
-        final.to_csv(output_path, index=False)
+    if profile:
+        print(f"\nTime by stage:\n{timer.report()}")
+        for written in timer.write(profile, profile_format):
+            print(f"Profile written to {written}")
+
+
+
+@main.command()
+@click.argument(
+    "dictionary_path",
+)
+def plan(dictionary_path):
+    from .assemble import plan_report
+
+    print(plan_report(dictionary_path))
+
+
+@main.command()
+@click.argument(
+    "source",
+    type=click.Path(exists=True, path_type=Path),
+)
+@click.option(
+    "--output-dir",
+    type=click.Path(file_okay=False, path_type=Path),
+    help="Where a folder's reports go. Defaults to the folder itself.",
+)
+@click.option(
+    "--format",
+    "output_format",
+    type=click.Choice(["xlsx", "csv", "parquet"]),
+    default="xlsx",
+    show_default=True,
+    help="Report format for a folder of dictionaries.",
+)
+@click.option(
+    "-s",
+    "--short-geoids",
+    is_flag=True,
+)
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    help="Neither read nor write the local response cache.",
+)
+@click.option(
+    "--refresh",
+    is_flag=True,
+    help="Re-fetch everything from the API and update the local cache.",
+)
+def batch(source, output_dir, output_format, short_geoids, no_cache, refresh):
+    """
+    Assemble every data dictionary in a folder, or listed in a TOML manifest,
+    fetching the data they share only once.
+    """
+    from .batch import assemble_batch, find_entries
+    from .output import write_report
+
+    entries = find_entries(source, output_dir, output_format, stamp=f"_{TODAY}")
+    if not entries:
+        raise click.UsageError(f"No data dictionaries found in {source}.")
+
+    cache_mode = "off" if no_cache else "refresh" if refresh else "use"
+    failures = 0
+    for entry, report in assemble_batch(entries, short_geoids, cache_mode):
+        if isinstance(report, Exception):
+            failures += 1
+            print(f"\n{entry.dictionary}: {report}")
+            continue
+        entry.output.parent.mkdir(parents=True, exist_ok=True)
+        write_report([report], entry.output)
+        print(f"Wrote {entry.output}")
+
+    if failures:
+        raise click.ClickException(f"{failures} of {len(entries)} dictionaries failed.")
+
+
+
+def _complete_code(ctx, param, incomplete):
+    # Completes from whatever's already downloaded; never fetches.
+    from .catalog import open_catalog
+
+    release = ctx.params.get("release") or "acs5"
+    catalog = open_catalog()
+    try:
+        year = ctx.params.get("year") or catalog.latest(release)
+        if year is None:
+            return []
+        return [code for code, _, _ in catalog.search(incomplete, year, release)]
+    finally:
+        catalog.close()
+
+
+@main.group(name="vars")
+def vars_():
+    """Look up Census variable codes."""
+
+
+@vars_.command()
+@click.argument("query", nargs=-1, required=True, shell_complete=_complete_code)
+@click.option(
+    "--year",
+    type=int,
+    help="Defaults to the latest year already downloaded.",
+)
+@click.option(
+    "--release",
+    default="acs5",
+    show_default=True,
+)
+@click.option(
+    "--limit",
+    type=click.IntRange(min=1),
+    default=20,
+    show_default=True,
+)
+def search(query, year, release, limit):
+    """
+    Find variable codes by the start of the code (B17001, B17001_00) or by
+    words in the label and table title (poverty female).
+    """
+    from .catalog import open_catalog
 
-    elif path.suffix == ".parquet":
-        final.to_parquet(path, index=False)
+    catalog = open_catalog()
+    try:
+        year = year or catalog.latest(release)
+        if year is None:
+            raise click.UsageError(
+                f"No {release} variable list downloaded yet; pass --year to fetch one."
+            )
+        if not catalog.ensure(year, release):
+            raise click.ClickException(f"No variable list for {year} {release}.")
+        rows = catalog.search(" ".join(query), year, release, limit)
+    finally:
+        catalog.close()
 
+    if not rows:
+        print(f"Nothing in {year} {release} matches '{' '.join(query)}'.")
+    for code, label, concept in rows:
+        print(f"{code:<12} {label}  ({concept})")
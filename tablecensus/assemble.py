@@ -1,10 +1,29 @@
-from itertools import groupby
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+import numpy as np
 import pandas as pd
+from aiohttp import ClientSession
 
-from .variables import collect_census_variables, create_namespace, unwrap_calculations
+from .variables import (
+    collect_census_variables,
+    create_array_namespace,
+    unwrap_arrays,
+)
+from .calculations import compile_calculations
+from .decode import decode_payload
+from .dictionary import load_sheets
 from .geography import build_api_geo_parts
-from .request_prep import build_calls
-from .request_manager import populate_data
+from .request_prep import build_calls, estimate_payload, plan_calls, plan_needs
+from .request_manager import AdaptiveLimiter, fetch_async, populate_data, report_rejected
+from .cache import open_cache
+from .catalog import preflight, unpublished, without
+from .cassette import Recorder, Replay
+from .timing import StageTimer, active_timer
+from .warehouse import open_warehouse
 
 
 def shorten_geoid(geoid: str):
@@ -13,10 +32,108 @@ def shorten_geoid(geoid: str):
     return geoid[:5] + geoid[7:]
 
 
-def assemble_from(dictionary_path, short_geoids=False, dump_raw=False):
+class _LabelColumns:
+    """The columns gathered so far for one label, in the first batch's row order."""
+
+    def __init__(self):
+        self.geo_ids = None
+        self.names = None
+        self.values = {}
+
+    def add(self, geo_ids, names, values):
+        if self.geo_ids is None:
+            self.geo_ids = geo_ids
+            rows = slice(None)
+        elif np.array_equal(geo_ids, self.geo_ids):
+            # The usual case: every batch for a label lists the same
+            # geographies in the same order, so they join by position.
+            rows = slice(None)
+        else:
+            rows = self._align(geo_ids)
+
+        if names is not None:
+            if self.names is None:
+                self.names = np.full(len(self.geo_ids), None, dtype=object)
+                self.names[rows] = names
+            elif not isinstance(rows, slice):
+                unnamed = pd.isna(self.names[rows])
+                self.names[rows[unnamed]] = names[unnamed]
+
+        for code, column in values.items():
+            # group() responses can repeat codes another batch already has.
+            if code in self.values:
+                continue
+            if isinstance(rows, slice):
+                self.values[code] = column
+            else:
+                self.values[code] = np.full(len(self.geo_ids), np.nan)
+                self.values[code][rows] = column
+
+    def _align(self, geo_ids) -> np.ndarray:
+        """Row positions for 'geo_ids', adding rows for any not seen yet."""
+        positions = {geo_id: i for i, geo_id in enumerate(self.geo_ids)}
+        new = [g for g in dict.fromkeys(geo_ids) if g not in positions]
+        if new:
+            positions.update((g, len(positions) + i) for i, g in enumerate(new))
+            self.geo_ids = np.concatenate([self.geo_ids, np.array(new, dtype=object)])
+            grow = len(new)
+            self.values = {
+                code: np.concatenate([column, np.full(grow, np.nan)])
+                for code, column in self.values.items()
+            }
+            if self.names is not None:
+                self.names = np.concatenate([self.names, np.full(grow, None, dtype=object)])
+        return np.array([positions[g] for g in geo_ids], dtype=np.intp)
+
+    def frame(self) -> pd.DataFrame:
+        names = self.names if self.names is not None else np.full(len(self.geo_ids), None)
+        return pd.DataFrame(
+            {"NAME": names, **self.values},
+            index=pd.Index(self.geo_ids, name="GEO_ID"),
+        )
+
+
+class ResponseFrames:
+    """
+    Builds one frame per (geo_part, year, release) label from API payloads,
+    in whatever order they turn up. Payloads are decoded straight into float
+    columns (see decode.py) and only become a DataFrame once per label.
+    """
+
+    def __init__(self, variable_codes):
+        self.wanted_codes = set(variable_codes)
+        self._labels = {}
+
+    def add(self, label, data):
+        columns = self._labels.setdefault(label, _LabelColumns())
+        try:
+            decoded = decode_payload(data, self.wanted_codes)
+        except (TypeError, ValueError):
+            print(f"{label} missing from data set, skipping.")
+            return
+        columns.add(*decoded)
+
+    def frames(self, labels=None):
+        """
+        Each label's columns as one frame indexed by GEO_ID, in label order.
+        'labels' picks out some of them.
+        """
+        wanted = self._labels.keys() if labels is None else self._labels.keys() & set(labels)
+        for label in sorted(wanted):
+            columns = self._labels[label]
+            if columns.geo_ids is None:
+                print(f"All data missing for {label}, skipping.")
+                continue
+            yield label, columns.frame()
+
+
+def read_dictionary(dictionary_path, use_cache=True):
+    """
+    Reads the Variables, Geographies and Years sheets of a data dictionary,
+    opening the workbook once (see dictionary.py).
+    """
     try:
-        variables = pd.read_excel(dictionary_path, sheet_name="Variables")
-        assert len(set(variables["name"])) == len(variables["name"])
+        sheets = load_sheets(dictionary_path, use_cache=use_cache)
 
     except FileNotFoundError:
         raise FileNotFoundError(
@@ -24,147 +141,327 @@ def assemble_from(dictionary_path, short_geoids=False, dump_raw=False):
             "Make sure the file path is correct and the file exists."
         )
 
-    except ValueError as e:
-        if "Variables" in str(e):
-            raise ValueError(
-                f"❌ Missing 'Variables' sheet in {dictionary_path}\n"
-                "Your data dictionary must have a 'Variables' sheet. Use 'tablecensus start' to create a proper template."
-            )
-        raise ValueError(f"❌ Error reading Variables sheet: {e}")
+    if sheets["Variables"] is None:
+        raise ValueError(
+            f"❌ Missing 'Variables' sheet in {dictionary_path}\n"
+            "Your data dictionary must have a 'Variables' sheet. Use 'tablecensus start' to create a proper template."
+        )
+
+    variables = sheets["Variables"].infer_objects()
+    variables = variables.where(variables.notna(), np.nan)
+
+    if variables.empty:
+        raise ValueError("❌ Variables sheet is empty. Add at least one variable definition.")
 
+    try:
+        assert len(set(variables["name"])) == len(variables["name"])
+    except KeyError as e:
+        raise ValueError(f"❌ Error reading Variables sheet: missing column {e}")
     except AssertionError as e:
         raise ValueError(f"❌ No repeated variable names allowed. Review your data dictionary and fix.")
-    
-    try:
-        geographies = pd.read_excel(
-            dictionary_path, sheet_name="Geographies", dtype="string"
+
+    if sheets["Geographies"] is None:
+        raise ValueError(
+            f"❌ Missing 'Geographies' sheet in {dictionary_path}\n"
+            "Your data dictionary must have a 'Geographies' sheet with geography definitions."
         )
-    except ValueError as e:
-        if "Geographies" in str(e):
-            raise ValueError(
-                f"❌ Missing 'Geographies' sheet in {dictionary_path}\n"
-                "Your data dictionary must have a 'Geographies' sheet with geography definitions."
-            )
-        raise ValueError(f"❌ Error reading Geographies sheet: {e}")
-    
-    try:
-        releases = (
-            pd.read_excel(dictionary_path, sheet_name="Years")
-            .itertuples(index=False, name=None)
+
+    geographies = sheets["Geographies"].astype("string")
+
+    if sheets["Years"] is None:
+        raise ValueError(
+            f"❌ Missing 'Years' sheet in {dictionary_path}\n"
+            "Your data dictionary must have a 'Years' sheet specifying which ACS years to include."
         )
-    except ValueError as e:
-        if "Years" in str(e):
-            raise ValueError(
-                f"❌ Missing 'Years' sheet in {dictionary_path}\n"
-                "Your data dictionary must have a 'Years' sheet specifying which ACS years to include."
-            )
-        raise ValueError(f"❌ Error reading Years sheet: {e}")
-    
-    if variables.empty:
-        raise ValueError("❌ Variables sheet is empty. Add at least one variable definition.")
-    
+
+    releases = list(sheets["Years"].infer_objects().itertuples(index=False, name=None))
+
     if geographies.empty:
         raise ValueError("❌ Geographies sheet is empty. Add at least one geography definition.")
     
     if not releases:
         raise ValueError("❌ Years sheet is empty. Add at least one year/release combination.")
 
-    geo_parts = build_api_geo_parts(geographies)
-    
-    variable_stems, variable_codes = collect_census_variables(variables)
-    
-    calls = build_calls(geo_parts, variable_codes, releases)
+    return variables, geographies, releases
 
-    # The calls are broken up by year and head of geography tree
-    responses = populate_data(calls)
 
-    grp_key = lambda r: r[0]
+def plan_report(dictionary_path, cache_mode="use") -> str:
+    """
+    Describes what assembling a dictionary would do -- the calculation plan,
+    and the calls it would send -- without fetching anything.
+    """
+    variables, geographies, releases = read_dictionary(
+        dictionary_path, use_cache=cache_mode != "off"
+    )
+    geo_parts = build_api_geo_parts(geographies)
+    _, variable_codes = collect_census_variables(variables)
 
-    grouped_responses = []
-    # Group by label for east-west concatenation
-    for label, group in groupby(sorted(responses, key=grp_key), key=grp_key):
+    needs = preflight(plan_needs(geo_parts, variable_codes, releases), cache_mode)
+    total = len(needs)
 
-        variable_batches = []
-        for g, data in group:
-            try:
-                columns, *rows = data
+    warehouse = open_warehouse(cache_mode)
+    if warehouse is not None:
+        _, needs = warehouse.split(needs)
+        warehouse.close()
 
-            except TypeError:
-                print(f"{label}, {g} missing from data set, skipping.")
-                continue
+    planned = plan_calls(needs)
+    rows, size = estimate_payload(planned, needs, geo_parts)
+    groups = sum(1 for _, get in planned if get.startswith("group("))
+
+    lines = [
+        compile_calculations(variables).report(),
+        "",
+        f"Call plan: {len(planned)} calls for {len(geo_parts)} geography parts "
+        f"x {len(releases)} years ({groups} whole-table group() calls)",
+        f"  Estimated payload: {size / 1_000:,.0f} KB, about {rows:,} rows",
+    ]
+    if len(needs) < total:
+        lines.append(
+            f"  {total - len(needs)} of {total} geography/year combinations "
+            "are already held locally"
+        )
+    return "\n".join(lines)
 
-            active_cols = [c for c in columns if c in variable_codes]
-            header = active_cols.copy()
-            header.append("GEO_ID")
 
-            if not variable_batches:
-                # Include the name of the first group
-                header.append("NAME")
+NO_DATA = (
+    "❌ No data was returned from the Census API.\n\n"
+    "This usually means:\n"
+    "  • Variable names in your Variables sheet don't exist in the Census API\n"
+    "  • Geography codes in your Geographies sheet are invalid\n"
+    "  • The combination of variables, geographies, and years doesn't exist\n"
+    "  • All API requests failed (see errors above)\n\n"
+    "Check your data dictionary and ensure:\n"
+    "  • Variable names match Census variable codes (like B01001001)\n"
+    "  • Geography codes are valid (use FIPS codes)\n"
+    "  • Years match available ACS releases for your variables"
+)
 
-            frame = (
-                pd.DataFrame(rows, columns=columns)[header]
-                .astype({var: pd.Float64Dtype() for var in active_cols})
-                .set_index(["GEO_ID"])
-            )
 
-            variable_batches.append(frame)
+def assemble_from(dictionary_path, short_geoids=False, dump_raw=False, cache_mode="use",
+                  record=None, replay=None, timer: StageTimer | None = None, fetch=None):
+    """
+    Builds the report table for a data dictionary. 'record' names a file to
+    save every API response to; 'replay' names one to serve them from instead
+    of the API (see cassette.py). Pass a StageTimer to see where the time went.
 
-        if not variable_batches:
-            print(f"All data missing for {label}, skipping.")
-            continue
+    'fetch' stands in for 'populate_data', taking the same arguments; see
+    'assemble_async'.
+    """
+    timer = timer if timer is not None else StageTimer()
 
-        grouped_responses.append(
-            (label, pd.concat(variable_batches, axis=1).reset_index())
+    with timer.stage("read"):
+        variables, geographies, releases = read_dictionary(
+            dictionary_path, use_cache=cache_mode != "off"
         )
 
+    with timer.stage("plan"):
+        geo_parts = build_api_geo_parts(geographies)
 
-    result = []
-    # North-south concatenation for different geos / years
-    for response in grouped_responses:
-        (_, year, release), data = response # skip the geo stuff
-        frame = (
-            data
-            .assign(Year=year, Release=release)
-        )
-        result.append(frame)
-    
-    if not result:
-        raise ValueError(
-            "❌ No data was returned from the Census API.\n\n"
-            "This usually means:\n"
-            "  • Variable names in your Variables sheet don't exist in the Census API\n"
-            "  • Geography codes in your Geographies sheet are invalid\n"
-            "  • The combination of variables, geographies, and years doesn't exist\n"
-            "  • All API requests failed (see errors above)\n\n"
-            "Check your data dictionary and ensure:\n"
-            "  • Variable names match Census variable codes (like B01001001)\n"
-            "  • Geography codes are valid (use FIPS codes)\n"
-            "  • Years match available ACS releases for your variables"
+    recorder = Recorder(record) if record else None
+    try:
+        result = assemble_parts(
+            variables, geo_parts, releases, short_geoids, dump_raw, cache_mode,
+            recorder=recorder, replay=Replay(replay) if replay else None, timer=timer,
+            fetch=fetch,
         )
+    finally:
+        if recorder is not None:
+            recorder.close()
+            print(f"Recorded {recorder.count} responses to {recorder.path}")
+
+    if result is None:
+        raise ValueError(NO_DATA)
+    return result
+
+
+async def assemble_async(dictionary_path, short_geoids=False, cache_mode="use", record=None,
+                         replay=None, timer: StageTimer | None = None,
+                         session: ClientSession | None = None,
+                         limiter: AdaptiveLimiter | None = None):
+    """
+    'assemble_from' for code that already runs an event loop -- a notebook,
+    a web handler, an async worker. API calls go out on the caller's loop,
+    through 'session' and 'limiter' if given, so assemblies running side by
+    side can share one connection pool and one concurrency bound. Reading,
+    parsing and calculating run in a worker thread and don't block the loop.
+    """
+    loop = asyncio.get_running_loop()
+
+    def fetch(calls, **options):
+        # Called from the worker thread; the fetch itself runs on the loop,
+        # which doesn't see the worker's active timer unless told.
+        timer_ = active_timer()
+
+        async def run():
+            with timer_.activate() if timer_ is not None else nullcontext():
+                return await fetch_async(calls, session=session, limiter=limiter, **options)
+
+        return asyncio.run_coroutine_threadsafe(run(), loop).result()
+
+    # A thread of its own rather than one of the loop's default executor:
+    # this one sits blocked on the fetch, and the fetch hands each response
+    # to the default executor to parse. Enough assemblies side by side would
+    # otherwise hold every worker and wait on each other for ever.
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tablecensus-assemble")
+    run_assembly = functools.partial(
+        contextvars.copy_context().run, assemble_from, dictionary_path, short_geoids,
+        False, cache_mode, record=record, replay=replay, timer=timer, fetch=fetch,
+    )
+    try:
+        return await loop.run_in_executor(executor, run_assembly)
+    finally:
+        executor.shutdown(wait=False)
+
+
+def assemble_parts(variables, geo_parts, releases, short_geoids=False, dump_raw=False,
+                   cache_mode="use", recorder: Recorder | None = None,
+                   replay: Replay | None = None, timer: StageTimer | None = None,
+                   fetch=None, absent: dict | None = None):
+    """
+    The report rows for some geography parts over some years: fetched,
+    parsed and calculated. None if nothing came back for any of them.
+    'absent' is passed on to fetch_frames.
+    """
+    timer = timer if timer is not None else StageTimer()
+
+    with timer.stage("plan"):
+        variable_stems, variable_codes = collect_census_variables(variables)
+
+        # Compile before fetching so an unsupported formula fails fast.
+        calculation_plan = compile_calculations(variables)
+
+        needs = plan_needs(geo_parts, variable_codes, releases)
+
+    frames = fetch_frames(needs, variable_codes, cache_mode, recorder, replay, timer, fetch, absent)
+    return calculate_report(
+        frames, needs, geo_parts, variable_stems, calculation_plan, short_geoids, dump_raw, timer
+    )
+
+
+def fetch_frames(needs, variable_codes, cache_mode="use", recorder: Recorder | None = None,
+                 replay: Replay | None = None, timer: StageTimer | None = None,
+                 fetch=None, absent: dict | None = None) -> ResponseFrames:
+    """
+    Gets everything in 'needs' (see plan_needs) -- from the warehouse where
+    it can, from the API otherwise -- parsed into ResponseFrames.
+
+    Codes are checked against the variable catalog first, or on replay
+    taken from the recording. A caller that fetches a pull in pieces checks
+    the whole pull once, with catalog.unpublished, and passes what it found
+    as 'absent': a piece only sees some of the years, and can't tell a code
+    missing from one year from a code missing from all of them.
+    """
+    timer = timer if timer is not None else StageTimer()
+    fetch = fetch if fetch is not None else populate_data
+
+    with timer.stage("plan"):
+        if recorder is not None or replay is not None:
+            # Every response has to pass through the client to be recorded, and a
+            # replay must not lean on anything it didn't record.
+            cache_mode = "off" if replay is not None else cache_mode
+            warehouse_mode = "off"
+        else:
+            warehouse_mode = cache_mode
+
+        # Codes a year doesn't publish are caught here rather than as a 400
+        # halfway through the fetch. A replay is offline and checks nothing:
+        # it leaves out what the recording did.
+        if absent is None:
+            absent = replay.absent if replay is not None else unpublished(needs, cache_mode)
+        if recorder is not None:
+            recorder.record_absent(absent)
+        needs = without(needs, absent)
+
+        # Whatever the warehouse already holds is served locally; only the
+        # missing cells become API calls.
+        warehouse = open_warehouse(warehouse_mode)
+        served, refused = [], []
+        if warehouse is not None:
+            held, needs = warehouse.split(needs)
+            served = [(label, warehouse.payload(*label, codes)) for label, codes in held.items()]
+            refused = warehouse.rejections(held)
+
+        calls = build_calls(needs, require_key=replay is None) if needs else []
+
+    frames = ResponseFrames(variable_codes)
+    # (label, codes) the API refused; a response's are in before it's consumed.
+    rejected = []
+
+    def consume(label, data):
+        # Runs alongside the fetch, so 'ingest' overlaps 'fetch'.
+        with timer.stage("ingest"):
+            if warehouse is not None:
+                dropped = [code for seen, codes in rejected if seen == label for code in codes]
+                warehouse.store([(label, data)], variable_codes, {label: dropped})
+            frames.add(label, data)
+
+    # Responses are parsed as they arrive, so nothing waits for the slowest
+    # call and the raw payloads don't pile up. Anything handed back unparsed
+    # still goes through the same path.
+    with timer.stage("fetch"), timer.activate():
+        leftovers = fetch(
+            calls, cache=open_cache(cache_mode), on_response=consume,
+            recorder=recorder, replay=replay, rejected=rejected,
+        ) if calls else []
+
+    for label, data in leftovers:
+        consume(label, data)
+
+    if warehouse is not None:
+        warehouse.close()
+        if served:
+            print(f"Served {len(served)} geography/year combinations from the local warehouse.")
+        report_rejected(refused)
+
+    with timer.stage("ingest"):
+        for label, data in served:
+            frames.add(label, data)
+
+    return frames
+
+
+def calculate_report(frames: ResponseFrames, labels, geo_parts, variable_stems, calculation_plan,
+                     short_geoids=False, dump_raw=False, timer: StageTimer | None = None):
+    """
+    The report rows for 'labels' out of the fetched frames, or None if
+    nothing came back for any of them.
+    """
+    timer = timer if timer is not None else StageTimer()
+
+    with timer.stage("ingest"):
+        parts_by_query = {part.query: part for part in geo_parts}
+        result = []
+        # North-south concatenation for different geos / years
+        for (geo_part, year, release), frame in frames.frames(labels):
+            # Wildcards that stand in for explicit lists bring back extra rows.
+            part = parts_by_query.get(geo_part)
+            if part is not None and part.keep is not None:
+                frame = frame[[part.keeps(geo_id) for geo_id in frame.index]]
+
+            result.append(frame.reset_index().assign(Year=year, Release=release))
+
+        if not result:
+            return None
+
+        raw_census = pd.concat(result).reset_index(drop=True)
 
-    raw_census = pd.concat(result).reset_index(drop=True)
-    
     if dump_raw:
         # Allow to dump the raw output for debugging
         raw_census.to_csv("dumped_output")
 
-    namespace = create_namespace(raw_census, variable_stems)
+    with timer.stage("namespace"):
+        namespace = create_array_namespace(raw_census, variable_stems)
 
-    # Shorten the geoids if that's what the user would like
-    if short_geoids:
-        namespace["GEO_ID"]  = namespace["GEO_ID"].apply(shorten_geoid)
+        header = raw_census[["GEO_ID", "NAME", "Year", "Release"]]
 
-    result = [namespace["GEO_ID"], namespace["NAME"], namespace["Year"], namespace["Release"]]
-    for _, variable in variables.iterrows():
-        result.append(
-            namespace.eval(variable["calculation"]).rename(variable["name"])
-        )
-    
-    calculated = (
-        pd.concat(result, axis=1)
-        .rename(columns={"GEO_ID": "geoid", "NAME": "geoname"})
-    )
+        # Shorten the geoids if that's what the user would like
+        if short_geoids:
+            header = header.assign(GEO_ID=header["GEO_ID"].apply(shorten_geoid))
 
-    unwrapped = unwrap_calculations(calculated, variables) 
+    with timer.stage("eval"):
+        calculated = calculation_plan.evaluate(namespace)
 
-    return unwrapped
+    with timer.stage("unwrap"):
+        return unwrap_arrays(
+            header.rename(columns={"GEO_ID": "geoid", "NAME": "geoname"}), calculated
+        )
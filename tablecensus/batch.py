@@ -0,0 +1,154 @@
+"""Assemble many data dictionaries in one run, fetching what they share once.
+
+Dictionaries pulled side by side ask for a lot of the same data -- the same
+counties, the same years, the same population denominators. Run one at a
+time, each plans and sends its own calls. Here every dictionary's needs are
+merged into one plan first: each (geography part, year, release) is asked
+for once, with every variable any dictionary wants from it, under a single
+scheduler and connection pool. The responses are parsed once, and each
+dictionary's report is calculated from them and written to its own file.
+
+Dictionaries only share calls where they name geographies the same way; a
+dictionary asking for two counties and another asking for one of them still
+make their own calls.
+
+'tablecensus batch' takes a folder of dictionaries or a TOML manifest:
+
+    [[report]]
+    dictionary = "poverty.xlsx"
+    output = "out/poverty.csv"
+
+Relative paths in a manifest are relative to the manifest.
+"""
+
+import tomllib
+from dataclasses import dataclass
+from pathlib import Path
+
+from .assemble import NO_DATA, calculate_report, fetch_frames, read_dictionary
+from .calculations import compile_calculations
+from .catalog import open_catalog, preflight, preflight_enabled
+from .geography import build_api_geo_parts
+from .request_prep import plan_calls, plan_needs
+from .timing import StageTimer
+from .variables import collect_census_variables
+
+
+@dataclass(frozen=True)
+class BatchEntry:
+    dictionary: Path
+    output: Path
+
+
+@dataclass
+class _Planned:
+    entry: BatchEntry
+    geo_parts: list
+    variable_stems: list
+    calculation_plan: object
+    needs: dict
+
+
+def load_manifest(path) -> list[BatchEntry]:
+    path = Path(path)
+    try:
+        with open(path, "rb") as f:
+            reports = tomllib.load(f).get("report", [])
+    except tomllib.TOMLDecodeError as e:
+        raise ValueError(f"❌ Could not read the batch manifest {path}: {e}")
+
+    entries = []
+    for i, report in enumerate(reports, 1):
+        try:
+            entries.append(BatchEntry(
+                path.parent / report["dictionary"], path.parent / report["output"]
+            ))
+        except (KeyError, TypeError):
+            raise ValueError(
+                f"❌ Report {i} in {path} needs a 'dictionary' and an 'output' path."
+            )
+    return entries
+
+
+def find_entries(source, output_dir=None, output_format="xlsx", stamp="") -> list[BatchEntry]:
+    """
+    The dictionaries to assemble: every workbook in a folder, each written
+    to '<output_dir>/report_<name><stamp>.<format>', or a manifest's list.
+    """
+    source = Path(source)
+    if source.is_file():
+        return load_manifest(source)
+
+    output_dir = Path(output_dir) if output_dir is not None else source
+    return [
+        BatchEntry(path, output_dir / f"report_{path.stem}{stamp}.{output_format}")
+        for path in sorted(source.glob("*.xlsx"))
+        # Excel leaves lock files next to open workbooks.
+        if not path.name.startswith("~$")
+    ]
+
+
+def merge_needs(all_needs: list[dict]) -> dict[tuple, list[str]]:
+    """Every label any dictionary needs, with every code any of them wants from it."""
+    merged: dict[tuple, dict[str, None]] = {}
+    for needs in all_needs:
+        for label, codes in needs.items():
+            merged.setdefault(label, {}).update(dict.fromkeys(codes))
+    return {label: list(codes) for label, codes in merged.items()}
+
+
+def assemble_batch(entries: list[BatchEntry], short_geoids=False, cache_mode="use",
+                   timer: StageTimer | None = None):
+    """
+    Yields (entry, report) for each dictionary, or (entry, error) for one
+    that couldn't be read or came back empty -- the others go ahead.
+    """
+    timer = timer if timer is not None else StageTimer()
+
+    planned, failed = [], []
+    # One for every dictionary, so each variable list is downloaded once even
+    # with the cache off.
+    catalog = open_catalog(cache_mode) if preflight_enabled() else None
+    try:
+        for entry in entries:
+            try:
+                with timer.stage("read"):
+                    variables, geographies, releases = read_dictionary(
+                        entry.dictionary, use_cache=cache_mode != "off"
+                    )
+                with timer.stage("plan"):
+                    geo_parts = build_api_geo_parts(geographies)
+                    variable_stems, variable_codes = collect_census_variables(variables)
+                    planned.append(_Planned(
+                        entry, geo_parts, variable_stems, compile_calculations(variables),
+                        # Checked here so a bad code fails its own dictionary only.
+                        preflight(plan_needs(geo_parts, variable_codes, releases), cache_mode,
+                                  catalog),
+                    ))
+            except (OSError, ValueError) as e:
+                failed.append((entry, e))
+    finally:
+        if catalog is not None:
+            catalog.close()
+
+    yield from failed
+    if not planned:
+        return
+
+    with timer.stage("plan"):
+        needs = merge_needs([p.needs for p in planned])
+        codes = list(dict.fromkeys(code for label_codes in needs.values() for code in label_codes))
+        separate = sum(len(plan_calls(p.needs)) for p in planned)
+        merged = len(plan_calls(needs))
+    print(f"{len(planned)} dictionaries: {merged} calls in one plan "
+          f"instead of {separate} made separately.")
+
+    # Every dictionary's codes were checked as it was planned.
+    frames = fetch_frames(needs, codes, cache_mode, timer=timer, absent={})
+
+    for p in planned:
+        report = calculate_report(
+            frames, p.needs, p.geo_parts, p.variable_stems, p.calculation_plan,
+            short_geoids, timer=timer,
+        )
+        yield p.entry, report if report is not None else ValueError(NO_DATA)
@@ -0,0 +1,156 @@
+"""Keep Census API responses on disk so repeated runs skip the network.
+
+A published ACS release never changes, so re-running a dictionary -- or a
+second dictionary that shares some of its calls -- can be served entirely from
+what was fetched before.
+
+Entries are content-addressed: the file name is a hash of the request URL with
+the API key removed, so rotating a key (or sharing a cache between colleagues)
+does not invalidate anything. Each entry is the gzipped JSON body -- along
+with the codes it lacks, for a call the API partly refused and that was
+salvaged without them.
+
+Eviction is least-recently-used by total size. An entry's mtime is when it
+was written and its atime when it was last used: a cache hit moves only the
+atime forward, and `evict` removes the least recently used entries until the
+directory fits under the size limit. Entries written longer ago than the TTL
+are treated as misses, however often they're read.
+
+Both limits come from the optional [cache] table in config.toml:
+
+    [cache]
+    ttl_days = 90
+    max_size_mb = 1024
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from .config import cache_dir, get_cache_settings
+
+
+# "use" reads and writes, "refresh" skips reads but stores what it fetches,
+# "off" leaves the cache alone entirely.
+CACHE_MODES = ("use", "refresh", "off")
+
+
+def strip_api_key(url: str) -> str:
+    base, _, query = url.partition("?")
+    if not query:
+        return url
+
+    kept = [p for p in query.split("&") if not p.startswith("key=")]
+    return f"{base}?{'&'.join(kept)}"
+
+
+def cache_key(url: str) -> str:
+    return hashlib.sha256(strip_api_key(url).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, directory: Path, ttl_days: float, max_size_mb: float, read: bool = True):
+        self.directory = Path(directory)
+        self.ttl_seconds = ttl_days * 24 * 60 * 60
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.read = read
+        self.hits = 0
+
+    def _path(self, url: str) -> Path:
+        key = cache_key(url)
+        return self.directory / key[:2] / f"{key}.json.gz"
+
+    def get(self, url: str, count: bool = True, dropped: list | None = None):
+        """
+        The cached body for 'url', or None. 'count' adds a hit to 'hits'. The
+        codes a salvaged body was kept without (see 'put') are added to
+        'dropped'.
+        """
+        if not self.read:
+            return None
+
+        path = self._path(url)
+        try:
+            written = path.stat().st_mtime
+            now = time.time()
+            if now - written > self.ttl_seconds:
+                return None
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            # Missing, unreadable or half-written: all just misses.
+            return None
+
+        # Mark it used for eviction, keeping the write time the TTL runs from.
+        # Explicit times are set even on noatime mounts.
+        try:
+            os.utime(path, (now, written))
+        except OSError:
+            pass
+        if count:
+            self.hits += 1
+        if isinstance(data, dict):
+            if dropped is not None:
+                dropped.extend(data["dropped"])
+            data = data["data"]
+        return data
+
+    def put(self, url: str, data, dropped: list | None = None) -> None:
+        """
+        Stores the body for 'url'. 'dropped' names the codes the API refused
+        and the body was salvaged without, so a hit can still report them.
+        """
+        if dropped:
+            data = {"data": data, "dropped": list(dropped)}
+
+        path = self._path(url)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write beside the entry then rename, so a concurrent reader never
+        # sees a partial file. The name is unique to this thread: assemblies
+        # running side by side may be storing the same URL at once.
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    def evict(self) -> int:
+        """Drop least-recently-used entries until under the size limit."""
+        entries = []
+        for path in self.directory.glob("*/*.json.gz"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_atime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+
+        return removed
+
+
+def open_cache(mode: str = "use") -> ResponseCache | None:
+    if mode not in CACHE_MODES:
+        raise ValueError(f"Unknown cache mode {mode!r}, expected one of {CACHE_MODES}")
+
+    if mode == "off":
+        return None
+
+    ttl_days, max_size_mb = get_cache_settings()
+    return ResponseCache(
+        cache_dir() / "responses", ttl_days, max_size_mb, read=(mode == "use")
+    )
@@ -0,0 +1,193 @@
+"""Compile every calculation in the Variables sheet into one expression graph.
+
+Evaluating the sheet row by row re-parses each formula and recomputes every
+piece of it, even though dictionaries repeat themselves constantly: thirty
+rate indicators all divide by the same B17001001, and "B01001003 + B01001027"
+turns up in every age bucket that starts at under-5.
+
+Here each formula is parsed once (with the same parser 'extract_names' uses)
+and folded into a single DAG of operations. Identical subexpressions become
+the same node -- including "a + b" versus "b + a", since addition and scaling
+are commutative -- and constant arithmetic is folded away. Evaluation walks
+the nodes once in order, over whole CensusArray columns, dropping each
+intermediate result as soon as its last consumer has run.
+
+'CalculationPlan.report' prints the graph, which is what `tablecensus plan`
+shows.
+"""
+
+import ast
+import operator
+from collections import Counter
+from dataclasses import dataclass
+
+import pandas as pd
+
+from .census_value import CensusArray
+from .variables import parse_calculation
+
+
+BINARY_OPERATORS = {
+    ast.Add: "+",
+    ast.Sub: "-",
+    ast.Mult: "*",
+    ast.Div: "/",
+}
+
+APPLY = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": operator.truediv,
+}
+
+COMMUTATIVE = {"+", "*"}
+
+
+@dataclass(frozen=True)
+class Node:
+    """
+    One step of the plan. 'var' and 'const' nodes hold a name or a number in
+    'args'; operator nodes hold the ids of the nodes they combine.
+    """
+    op: str
+    args: tuple
+
+
+class CalculationPlan:
+    def __init__(self):
+        self.nodes: list[Node] = []
+        self.outputs: dict[str, int] = {}
+        self._ids: dict[Node, int] = {}
+
+    def _add(self, node: Node) -> int:
+        if node not in self._ids:
+            self._ids[node] = len(self.nodes)
+            self.nodes.append(node)
+        return self._ids[node]
+
+    def _operation(self, op: str, left: int, right: int) -> int:
+        a, b = self.nodes[left], self.nodes[right]
+        if a.op == "const" and b.op == "const":
+            return self._add(Node("const", (APPLY[op](a.args[0], b.args[0]),)))
+
+        if op in COMMUTATIVE:
+            left, right = sorted((left, right))
+
+        return self._add(Node(op, (left, right)))
+
+    def add_calculation(self, name: str, expr: str) -> int:
+        def visit(node):
+            match node:
+                case ast.Expression(body=body):
+                    return visit(body)
+
+                case ast.BinOp(left=left, op=op, right=right) if type(op) in BINARY_OPERATORS:
+                    return self._operation(BINARY_OPERATORS[type(op)], visit(left), visit(right))
+
+                case ast.UnaryOp(op=ast.USub(), operand=operand):
+                    return self._operation("*", self._add(Node("const", (-1,))), visit(operand))
+
+                case ast.UnaryOp(op=ast.UAdd(), operand=operand):
+                    return visit(operand)
+
+                case ast.Constant(value=value) if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    return self._add(Node("const", (value,)))
+
+                case ast.Name(id=variable):
+                    return self._add(Node("var", (variable,)))
+
+                case _:
+                    raise ValueError(
+                        f"Unsupported expression '{ast.unparse(node)}' in calculation '{expr}'. "
+                        "Calculations can only use census variables, numbers, + - * / and parentheses."
+                    )
+
+        try:
+            node_id = visit(parse_calculation(expr))
+        except ZeroDivisionError:
+            # Folding the constants worked it out already.
+            raise ValueError(f"❌ Calculation '{expr}' for '{name}' divides by zero.")
+        self.outputs[name] = node_id
+        return node_id
+
+    def use_counts(self) -> Counter:
+        """How many other nodes and outputs read each node."""
+        counts = Counter()
+        for node in self.nodes:
+            if node.op not in ("var", "const"):
+                counts.update(node.args)
+        counts.update(self.outputs.values())
+        return counts
+
+    def evaluate(self, namespace: dict[str, CensusArray]) -> dict:
+        last_use = {}
+        for i, node in enumerate(self.nodes):
+            if node.op not in ("var", "const"):
+                for arg in node.args:
+                    last_use[arg] = i
+
+        keep = set(self.outputs.values())
+        values = {}
+        for i, node in enumerate(self.nodes):
+            match node.op:
+                case "var":
+                    values[i] = namespace[node.args[0]]
+                case "const":
+                    values[i] = node.args[0]
+                case op:
+                    left, right = node.args
+                    values[i] = APPLY[op](values[left], values[right])
+                    for arg in set(node.args):
+                        if last_use[arg] == i and arg not in keep:
+                            del values[arg]
+
+        return {name: values[node_id] for name, node_id in self.outputs.items()}
+
+    def describe(self, node_id: int) -> str:
+        node = self.nodes[node_id]
+        if node.op in ("var", "const"):
+            return str(node.args[0])
+        left, right = node.args
+        return f"n{left} {node.op} n{right}"
+
+    def report(self) -> str:
+        uses = self.use_counts()
+        outputs = {}
+        for name, node_id in self.outputs.items():
+            outputs.setdefault(node_id, []).append(name)
+
+        variables = sum(1 for n in self.nodes if n.op == "var")
+        operations = sum(1 for n in self.nodes if n.op not in ("var", "const"))
+        shared = sum(1 for i in range(len(self.nodes)) if uses[i] > 1)
+
+        lines = [
+            f"Calculation plan: {len(self.outputs)} indicators from {variables} census "
+            f"variables in {operations} operations ({shared} shared results)"
+        ]
+        for i in range(len(self.nodes)):
+            line = f"  n{i} = {self.describe(i)}"
+            notes = []
+            if uses[i] > 1:
+                notes.append(f"used {uses[i]}x")
+            if i in outputs:
+                notes.append("-> " + ", ".join(outputs[i]))
+            if notes:
+                line = f"{line:<40} {'  '.join(notes)}"
+            lines.append(line)
+
+        return "\n".join(lines)
+
+
+def compile_calculations(indicators: pd.DataFrame) -> CalculationPlan:
+    plan = CalculationPlan()
+    for _, row in indicators.iterrows():
+        plan.add_calculation(row["name"], row["calculation"])
+    return plan
+
+
+def evaluate_calculation(expr: str, namespace: dict[str, CensusArray]):
+    """Evaluate a single calculation, outside of any sheet-wide plan."""
+    plan = CalculationPlan()
+    plan.add_calculation("result", expr)
+    return plan.evaluate(namespace)["result"]
@@ -0,0 +1,84 @@
+"""Record the API responses of a run, and replay them later without a network.
+
+A recording is a single gzipped file with one JSON object per line:
+
+    {"label": ["for=county:163&in=state:26", 2023, "acs5"],
+     "url": "https://api.census.gov/data/2023/acs/acs5?get=...&for=...",
+     "data": [["GEO_ID", "NAME", ...], ...]}
+
+URLs are stored without the API key, so a recording can be shared, and is
+replayed by matching the keyless URL. Codes left out of the calls because
+their year doesn't publish them (see catalog.py) are recorded too,
+
+    {"absent": [[2021, "acs5", ["B17001_001E", "B17001_001M"]]]}
+
+so that a replay, which checks nothing, builds the same calls. A replay never opens a connection: a
+call that isn't in the recording is reported as failed, like any other
+request that didn't come back.
+
+Runs that record or replay skip the local warehouse. A warehouse hit is never
+fetched, so it couldn't be recorded, and replay has to stand on its own.
+"""
+
+import gzip
+import json
+from pathlib import Path
+
+from .cache import strip_api_key
+
+
+class Recorder:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = gzip.open(self.path, "wt", encoding="utf-8")
+        self.count = 0
+        self.absent = {}
+
+    def record(self, label, url: str, data) -> None:
+        label = list(label) if isinstance(label, tuple) else label
+        entry = {"label": label, "url": strip_api_key(url), "data": data}
+        self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self.count += 1
+
+    def record_absent(self, absent: dict[tuple, set[str]]) -> None:
+        """Notes the codes 'catalog.unpublished' left out, unless already noted."""
+        new = {}
+        for (year, release), codes in absent.items():
+            noted = self.absent.setdefault((int(year), release), set())
+            if not noted.issuperset(codes):
+                new[int(year), release] = set(codes) - noted
+                noted.update(codes)
+        if new:
+            entry = {"absent": [[year, release, sorted(codes)] for (year, release), codes in new.items()]}
+            self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class Replay:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        if not self.path.exists():
+            raise FileNotFoundError(
+                f"❌ Replay archive not found: {self.path}\n"
+                "Record one first with 'tablecensus assemble --record'."
+            )
+
+        self.responses = {}
+        # The codes left out of the recorded calls, as catalog.unpublished gives them.
+        self.absent = {}
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if "absent" in entry:
+                    for year, release, codes in entry["absent"]:
+                        self.absent.setdefault((year, release), set()).update(codes)
+                else:
+                    self.responses[entry["url"]] = entry["data"]
+
+    def get(self, url: str):
+        return self.responses.get(strip_api_key(url))
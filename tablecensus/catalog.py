@@ -0,0 +1,312 @@
+"""Check variable codes against the Census Bureau's own list before fetching.
+
+A code the API doesn't know otherwise only shows up as a 400, once the whole
+fetch is under way, and is then bisected out of its call one request at a
+time. Every (year, release) publishes the full list of its variables at
+
+    https://api.census.gov/data/{year}/acs/{release}/variables.json
+
+which is downloaded once and kept in a small SQLite index under the cache
+folder, keyed by the code as it's written in a data dictionary (B01001001).
+Before any call is built, every code is looked up there:
+
+  * a code that no requested year has is a mistake in the dictionary, and
+    stops the run with the codes named;
+  * a code missing from only some years is dropped from those years' calls,
+    and its columns are left empty for them.
+
+The same index answers `tablecensus vars search`, by code prefix or by words
+in the label and table title.
+
+With the cache off the lists are still downloaded and checked, but only
+kept in memory. Set CENSUS_PREFLIGHT=0 to skip the checks. A list that can't be downloaded
+is reported and its year isn't checked.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import time
+import urllib.request
+from pathlib import Path
+
+from .config import cache_dir
+from .request_prep import api_base_url
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS releases (
+    year INTEGER NOT NULL,
+    release TEXT NOT NULL,
+    fetched REAL NOT NULL,
+    PRIMARY KEY (year, release)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS variables (
+    year INTEGER NOT NULL,
+    release TEXT NOT NULL,
+    code TEXT NOT NULL,
+    label TEXT,
+    concept TEXT,
+    estimate INTEGER NOT NULL,
+    moe INTEGER NOT NULL,
+    PRIMARY KEY (year, release, code)
+) WITHOUT ROWID;
+"""
+
+# The API's name for an estimate or MOE cell: table, cell number, E or M.
+# Annotation columns (EA, MA) and GEO_ID, NAME and friends don't match.
+API_CODE = re.compile(r"^([A-Z][0-9A-Z]*)_(\d{3})([EM])$")
+
+DOWNLOAD_TIMEOUT = 120
+SEARCH_LIMIT = 20
+
+
+def preflight_enabled() -> bool:
+    return os.environ.get("CENSUS_PREFLIGHT", "").strip() not in {"0", "false", "no"}
+
+
+def dictionary_code(api_code: str) -> str:
+    # B01001_001E -> B01001001
+    table, _, cell = api_code.partition("_")
+    return f"{table}{cell[:3]}"
+
+
+def _label(label: str | None) -> str | None:
+    # "Estimate!!Total:!!Male:" -> "Total: > Male:"
+    if label is None:
+        return None
+    parts = label.split("!!")
+    if parts[0] == "Estimate":
+        parts = parts[1:]
+    return " > ".join(parts)
+
+
+def parse_variables(document: dict) -> dict[str, list]:
+    """
+    A variables.json document as {dictionary code: [label, concept, has
+    estimate, has MOE]}. The label comes from the estimate.
+    """
+    found = {}
+    for name, details in document.get("variables", {}).items():
+        match = API_CODE.match(name)
+        if match is None:
+            continue
+        table, cell, kind = match.groups()
+        entry = found.setdefault(f"{table}{cell}", [None, None, False, False])
+        if kind == "E":
+            entry[0] = _label(details.get("label"))
+            entry[1] = details.get("concept")
+            entry[2] = True
+        else:
+            entry[3] = True
+    return found
+
+
+def download_variables(year, release, base_url: str | None = None) -> dict | None:
+    """The variables.json for a release, or None if it can't be had."""
+    url = f"{api_base_url(base_url)}/{year}/acs/{release}/variables.json"
+    try:
+        with urllib.request.urlopen(url, timeout=DOWNLOAD_TIMEOUT) as response:
+            return json.load(response)
+    except (OSError, ValueError) as e:
+        # URLError and HTTPError are OSErrors; a garbled body is a ValueError.
+        print(f"⚠️  Couldn't download the variable list for {year} {release} ({e}); "
+              "its codes aren't checked before fetching.")
+        return None
+
+
+class Catalog:
+    def __init__(self, path: Path | None, read: bool = True):
+        """With no 'path' the index is kept in memory and gone when closed."""
+        self.path = Path(path) if path is not None else None
+        self.read = read
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.path if self.path is not None else ":memory:")
+        self.connection.executescript(SCHEMA)
+        self._refreshed = set()
+
+    def close(self):
+        self.connection.close()
+
+    def has(self, year, release) -> bool:
+        return self.connection.execute(
+            "SELECT 1 FROM releases WHERE year = ? AND release = ?", (int(year), release)
+        ).fetchone() is not None
+
+    def store(self, year, release, document: dict) -> int:
+        """Replaces what's held for a release with a variables.json document."""
+        year = int(year)
+        variables = parse_variables(document)
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM variables WHERE year = ? AND release = ?", (year, release)
+            )
+            self.connection.executemany(
+                "INSERT INTO variables VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (year, release, code, label, concept, estimate, moe)
+                    for code, (label, concept, estimate, moe) in variables.items()
+                ),
+            )
+            self.connection.execute(
+                "INSERT OR REPLACE INTO releases VALUES (?, ?, ?)", (year, release, time.time())
+            )
+        return len(variables)
+
+    def ensure(self, year, release) -> bool:
+        """
+        Downloads a release's list unless it's held already (or, in refresh
+        mode, was already downloaded this run). False if it isn't available.
+        """
+        key = (int(year), release)
+        if key in self._refreshed or (self.read and self.has(*key)):
+            return True
+
+        document = download_variables(year, release)
+        if document is None:
+            return self.has(*key)
+        self.store(year, release, document)
+        self._refreshed.add(key)
+        return True
+
+    def api_codes(self, year, release) -> set[str] | None:
+        """Every estimate and MOE code a release has, as the API names them."""
+        if not self.ensure(year, release):
+            return None
+
+        codes = set()
+        for code, estimate, moe in self.connection.execute(
+            "SELECT code, estimate, moe FROM variables WHERE year = ? AND release = ?",
+            (int(year), release),
+        ):
+            table, cell = code[:-3], code[-3:]
+            if estimate:
+                codes.add(f"{table}_{cell}E")
+            if moe:
+                codes.add(f"{table}_{cell}M")
+        return codes
+
+    def latest(self, release) -> int | None:
+        (year,) = self.connection.execute(
+            "SELECT MAX(year) FROM releases WHERE release = ?", (release,)
+        ).fetchone()
+        return year
+
+    def search(self, query: str, year, release, limit: int = SEARCH_LIMIT) -> list[tuple]:
+        """
+        (code, label, concept) of the estimates matching 'query': codes that
+        start with it (B01001, B01001_00, b0100100), or failing that every
+        word of it found in the label or table title.
+        """
+        year = int(year)
+        prefix = query.strip().upper().replace("_", "")
+        if prefix and prefix.isalnum():
+            # A range over the primary key, so this stays quick for
+            # completing a code as it's typed.
+            rows = self.connection.execute(
+                "SELECT code, label, concept FROM variables "
+                "WHERE year = ? AND release = ? AND code >= ? AND code < ? AND estimate "
+                "ORDER BY code LIMIT ?",
+                (year, release, prefix, prefix + "\uffff", limit),
+            ).fetchall()
+            if rows:
+                return rows
+
+        words = query.split()
+        if not words:
+            return []
+        clauses = " AND ".join(["(label || ' ' || coalesce(concept, '')) LIKE ?"] * len(words))
+        return self.connection.execute(
+            "SELECT code, label, concept FROM variables "
+            f"WHERE year = ? AND release = ? AND estimate AND {clauses} "
+            "ORDER BY code LIMIT ?",
+            (year, release, *(f"%{word}%" for word in words), limit),
+        ).fetchall()
+
+
+def open_catalog(mode: str = "use") -> Catalog:
+    """
+    Follows the same modes as `cache.open_cache`, except that "off" still
+    checks: the lists are downloaded afresh and kept in memory only.
+    """
+    if mode == "off":
+        return Catalog(None, read=False)
+    return Catalog(cache_dir() / "catalog.sqlite3", read=(mode == "use"))
+
+
+def unpublished(needs: dict[tuple, list[str]], cache_mode: str = "use",
+                catalog: Catalog | None = None) -> dict[tuple, set[str]]:
+    """
+    The codes in 'needs' (see plan_needs) that their year doesn't publish,
+    by (year, release). Raises ValueError naming the codes no requested
+    year has at all.
+
+    A 'catalog' is used as is and left open, so checking many dictionaries
+    downloads each list once even with the cache off; otherwise one is
+    opened for the call.
+    """
+    if not preflight_enabled():
+        return {}
+    own = catalog is None
+    catalog = open_catalog(cache_mode) if own else catalog
+    try:
+        known = {}
+        for _, year, release in needs:
+            if (year, release) not in known:
+                known[year, release] = catalog.api_codes(year, release)
+    finally:
+        if own:
+            catalog.close()
+
+    checked = {key: codes for key, codes in known.items() if codes is not None}
+    absent = {}
+    for (_, year, release), codes in needs.items():
+        published = checked.get((year, release))
+        if published is not None:
+            absent.setdefault((year, release), set()).update(
+                code for code in codes if code not in published
+            )
+
+    # A code could still be in a year whose list couldn't be downloaded.
+    nowhere = set()
+    if checked and len(checked) == len(known):
+        requested = {code for codes in needs.values() for code in codes}
+        nowhere = {code for code in requested if all(code in missing for missing in absent.values())}
+    if nowhere:
+        raise ValueError(
+            "❌ These variables aren't published for any year in your Years sheet:\n"
+            + "".join(f"  • {code}\n" for code in sorted({dictionary_code(c) for c in nowhere}))
+            + "\nCheck them against the Census tables; "
+            "'tablecensus vars search' finds codes by name."
+        )
+
+    absent = {key: codes for key, codes in absent.items() if codes}
+    if absent:
+        print("\n⚠️  Not published for every year requested, so not asked for; "
+              "these columns are left empty for:")
+        for (year, release), codes in sorted(absent.items()):
+            print(f"  • {', '.join(sorted(codes))} ({year} {release})")
+    return absent
+
+
+def without(needs: dict[tuple, list[str]], absent: dict[tuple, set[str]]) -> dict[tuple, list[str]]:
+    """'needs' less the codes 'unpublished' found; labels left with none are dropped."""
+    if not absent:
+        return needs
+
+    kept = {}
+    for (geo_part, year, release), codes in needs.items():
+        missing = absent.get((year, release), set())
+        remaining = [code for code in codes if code not in missing]
+        if remaining:
+            kept[geo_part, year, release] = remaining
+    return kept
+
+
+def preflight(needs: dict[tuple, list[str]], cache_mode: str = "use",
+              catalog: Catalog | None = None) -> dict[tuple, list[str]]:
+    """'needs' without the codes their year doesn't publish (see 'unpublished')."""
+    return without(needs, unpublished(needs, cache_mode, catalog))
@@ -90,9 +90,10 @@ class CensusValue:
         if self.error is None:
             return CensusValue(estimate, None, self.table)
 
+        # A margin of error is a size; scaling by a negative doesn't flip it.
         return CensusValue(
             estimate,
-            self.error * other,
+            self.error * abs(other),
             self.table
         )
 
@@ -136,7 +137,7 @@ class CensusValue:
 
                 return CensusValue(
                     estimate,
-                    self.error / other,
+                    self.error / abs(other),
                     self.table
                 )
         except ZeroDivisionError:
@@ -187,3 +188,123 @@ class CensusValue:
     
     def __repr__(self):
         return f"CensusValue({self.estimate})"
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class CensusArray:
+    """
+    A whole column of CensusValues at once: paired estimate and error arrays
+    sharing one table tag. Every operation follows the same rules as the
+    matching CensusValue operation, applied to all rows in one NumPy call.
+
+    Missing values are NaN rather than None. As with CensusValue, a missing
+    estimate also blanks the error, and dividing by zero blanks both.
+    """
+    estimate: np.ndarray
+    error: np.ndarray
+    table: str | None = None
+
+    def __len__(self):
+        return len(self.estimate)
+
+    def _handle_table(self, other) -> str | None:
+        if self.table == other.table:
+            return self.table
+        return None
+
+    def _result(self, estimate, error, table) -> "CensusArray":
+        error = np.where(np.isnan(estimate), np.nan, error)
+        return CensusArray(estimate, error, table)
+
+    def __add__(self, other):
+        if not isinstance(other, CensusArray):
+            return NotImplemented
+
+        return self._result(
+            self.estimate + other.estimate,
+            np.sqrt(self.error**2 + other.error**2),
+            self._handle_table(other),
+        )
+
+    # Addition is commutative
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if not isinstance(other, CensusArray):
+            return NotImplemented
+
+        return self._result(
+            self.estimate - other.estimate,
+            np.sqrt(self.error**2 + other.error**2),
+            self._handle_table(other),
+        )
+
+    def __rsub__(self, other):
+        if not isinstance(other, CensusArray):
+            return NotImplemented
+
+        return other - self
+
+    def __mul__(self, other: int | float):
+        if not isinstance(other, numbers.Number):
+            raise TypeError(
+                f"CensusValues cannot be multiplied with {type(other).__name__}, only number values."
+            )
+
+        # A margin of error is a size; scaling by a negative doesn't flip it.
+        return self._result(self.estimate * other, self.error * abs(other), self.table)
+
+    # Multiplication is commutative
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        if isinstance(other, CensusArray):
+            with np.errstate(divide="ignore", invalid="ignore"):
+                estimate = self.estimate / other.estimate
+
+                # Same-universe estimates have correlated errors; see
+                # CensusValue.__truediv__.
+                vsu = self.error**2 - (estimate * other.error)**2
+                vdu = self.error**2 + (estimate * other.error)**2
+
+                if (self.table is not None) and (self.table == other.table):
+                    v = np.where(vsu > 0, vsu, vdu)
+                else:
+                    v = vdu
+
+                error = (1 / other.estimate) * np.sqrt(v)
+
+            zero = other.estimate == 0
+            return self._result(
+                np.where(zero, np.nan, estimate),
+                np.where(zero, np.nan, error),
+                self._handle_table(other),
+            )
+
+        if isinstance(other, numbers.Number):
+            if other == 0:
+                return CensusArray(
+                    np.full(len(self), np.nan), np.full(len(self), np.nan)
+                )
+
+            return self._result(self.estimate / other, self.error / abs(other), self.table)
+
+        return NotImplemented
+
+    def __rtruediv__(self, other):
+        if not isinstance(other, numbers.Number):
+            return NotImplemented
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            estimate = other / self.estimate
+            error = other / self.error
+
+        zero = self.estimate == 0
+        return self._result(
+            np.where(zero, np.nan, estimate),
+            np.where(zero, np.nan, error),
+            self.table,
+        )
+
+    def __repr__(self):
+        return f"CensusArray({len(self)} values, table={self.table!r})"
@@ -5,6 +5,12 @@ from pathlib import Path
 import tomllib
 
 
+# Published ACS releases do not change, but the Bureau does occasionally
+# reissue a table with errata -- so cached responses still expire.
+DEFAULT_CACHE_TTL_DAYS = 90
+DEFAULT_CACHE_MAX_SIZE_MB = 1024
+
+
 def _config_path() -> Path:
     if sys.platform == "win32":
         base = Path(os.environ.get("APPDATA", Path.home() / "AppData" / "Roaming"))
@@ -12,25 +18,52 @@ def _config_path() -> Path:
     return Path.home() / ".config" / "tablecensus" / "config.toml"
 
 
-def get_api_key() -> str:
+def cache_dir() -> Path:
+    return _config_path().parent / "cache"
+
+
+def _load_config() -> dict:
     config_path = _config_path()
 
     if not config_path.exists():
-        return ""
+        return {}
 
     try:
         raw = config_path.read_bytes()
         # Strip UTF-8 BOM if present (common with PowerShell/Notepad on Windows)
         if raw.startswith(b"\xef\xbb\xbf"):
             raw = raw[3:]
-        config = tomllib.loads(raw.decode("utf-8"))
-        return config.get("census", {}).get("api_key", "")
+        return tomllib.loads(raw.decode("utf-8"))
     except UnicodeDecodeError:
         warnings.warn(
             f"Config file {config_path} is not valid UTF-8. "
             "Re-save it as UTF-8 (PowerShell: Set-Content -Encoding utf8NoBOM)."
         )
-        return ""
+        return {}
     except tomllib.TOMLDecodeError as e:
         warnings.warn(f"Config file {config_path} has invalid TOML: {e}")
-        return ""
+        return {}
+
+
+def get_api_key() -> str:
+    return _load_config().get("census", {}).get("api_key", "")
+
+
+def get_cache_settings() -> tuple[float, float]:
+    """
+    Returns (ttl_days, max_size_mb) from the optional [cache] table of the
+    config file, falling back to the defaults for missing or bad values.
+    """
+    cache = _load_config().get("cache", {})
+
+    def positive(name, default):
+        value = cache.get(name, default)
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0:
+            return value
+        warnings.warn(f"Ignoring [cache] {name} = {value!r}; using {default}.")
+        return default
+
+    return (
+        positive("ttl_days", DEFAULT_CACHE_TTL_DAYS),
+        positive("max_size_mb", DEFAULT_CACHE_MAX_SIZE_MB),
+    )
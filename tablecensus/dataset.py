@@ -0,0 +1,148 @@
+"""Write a report as a partitioned Parquet dataset.
+
+    report.parquet/
+        _schema.json
+        Year=2023/Release=acs5/summary_level=050/part-0.parquet
+        Year=2023/Release=acs5/summary_level=140/part-0.parquet
+        ...
+
+Partitioning by year, release and summary level (the first three characters
+of the geoid) lets DuckDB, Spark or pyarrow skip whole files when a query
+filters on them. Within a file, rows are sorted by geoid, so the row group
+statistics let readers skip most of a file when looking up a geography.
+
+geoid, geoname and Release are dictionary encoded -- they repeat on every
+row -- and every indicator is a nullable float64, whatever pandas inferred.
+Each indicator's field carries its calculation in the Parquet metadata, and
+_schema.json records the same for tools that don't read field metadata.
+Readers skip files that start with an underscore.
+
+Needs pyarrow, which isn't installed by default: `pip install 'tablecensus[parquet]'`.
+"""
+
+import json
+import shutil
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+# The CLI reads the constants below at startup; pandas can wait until a
+# dataset is actually written.
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+CODECS = ("zstd", "snappy")
+DEFAULT_ROW_GROUP_ROWS = 100_000
+PARTITIONS = ("Year", "Release", "summary_level")
+SIDECAR = "_schema.json"
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError(
+            "❌ Writing a Parquet dataset needs pyarrow, which isn't installed.\n"
+            "Install it with: pip install 'tablecensus[parquet]'"
+        )
+    return pyarrow
+
+
+def column_calculations(variables: "pd.DataFrame") -> dict[str, str]:
+    """The calculation behind each indicator column, MOE columns included."""
+    from .variables import moe_column_name
+
+    calculations = {}
+    for name, calculation in zip(variables["name"], variables["calculation"]):
+        calculations[name] = str(calculation)
+        calculations[moe_column_name(name)] = f"margin of error of {calculation}"
+    return calculations
+
+
+def dataset_schema(df: "pd.DataFrame", calculations: dict[str, str]):
+    pa = _pyarrow()
+    text = pa.dictionary(pa.int32(), pa.string())
+
+    fields = [pa.field("geoid", text), pa.field("geoname", text)]
+    for column in df.columns:
+        if column in ("geoid", "geoname", "Year", "Release", "summary_level"):
+            continue
+        metadata = {"calculation": calculations[column]} if column in calculations else None
+        fields.append(pa.field(column, pa.float64(), metadata=metadata))
+    fields += [
+        pa.field("Year", pa.int16()),
+        pa.field("Release", text),
+        pa.field("summary_level", text),
+    ]
+    return pa.schema(fields, metadata={"tablecensus.partitioning": ",".join(PARTITIONS)})
+
+
+def _sidecar(schema, codec: str, row_group_rows: int) -> dict:
+    return {
+        # Readers infer partition types from the folder names, so "050" comes
+        # back as 50 unless they're given these.
+        "partitioning": [{"name": name, "type": str(schema.field(name).type)} for name in PARTITIONS],
+        "compression": codec,
+        "row_group_rows": row_group_rows,
+        "columns": [
+            {
+                "name": field.name,
+                "type": str(field.type),
+                **({"calculation": field.metadata[b"calculation"].decode()} if field.metadata else {}),
+            }
+            for field in schema
+        ],
+    }
+
+
+def write_parquet_dataset(df: "pd.DataFrame", path, calculations: dict[str, str] | None = None,
+                          codec: str = "zstd",
+                          row_group_rows: int = DEFAULT_ROW_GROUP_ROWS,
+                          part: int | None = None) -> Path:
+    """
+    Writes an assembled report as a dataset folder at 'path', replacing a
+    dataset written there before. Raises FileExistsError rather than
+    replacing anything else.
+
+    A report written in pieces passes each piece's number as 'part': part 0
+    replaces the dataset like a whole report would, and later parts add
+    their files to it.
+    """
+    pa = _pyarrow()
+    if codec not in CODECS:
+        raise ValueError(f"❌ Unknown Parquet compression '{codec}', use one of: {', '.join(CODECS)}")
+
+    path = Path(path)
+    if path.exists() and not part:
+        if not (path / SIDECAR).is_file():
+            raise FileExistsError(
+                f"❌ {path} already exists and isn't a tablecensus dataset; not replacing it."
+            )
+        shutil.rmtree(path)
+
+    df = (
+        df.assign(summary_level=df["geoid"].str[:3])
+        .sort_values(["Year", "Release", "summary_level", "geoid"], kind="stable")
+    )
+    schema = dataset_schema(df, calculations or {})
+    table = pa.Table.from_pandas(df[schema.names], schema=schema, preserve_index=False)
+
+    file_format = pa.dataset.ParquetFileFormat()
+    pa.dataset.write_dataset(
+        table,
+        path,
+        format=file_format,
+        file_options=file_format.make_write_options(compression=codec),
+        partitioning=pa.dataset.partitioning(
+            pa.schema([schema.field(name) for name in PARTITIONS]), flavor="hive"
+        ),
+        basename_template="part-{i}.parquet" if part is None else f"part-{part}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+        max_rows_per_group=row_group_rows,
+        min_rows_per_group=min(row_group_rows, 10_000),
+    )
+
+    (path / SIDECAR).write_text(json.dumps(_sidecar(schema, codec, row_group_rows), indent=2))
+    return path
@@ -0,0 +1,62 @@
+"""Turn Census API payloads straight into typed columns.
+
+The API answers with a JSON list of lists: a header row, then one row of
+strings per geography. Building a DataFrame from that makes an object cell
+for every string before anything is numeric. Here each wanted column is
+pulled out and converted to float64 in one NumPy call, and the API's
+annotation sentinels are turned into NaN on the way.
+"""
+
+import numpy as np
+
+
+# Values the API puts in estimate and MOE cells in place of a number:
+# -999999999 and -888888888 (not available / not applicable),
+# -666666666 (too few sample observations), -555555555 (controlled, so no
+# MOE), -333333333 (median in an open-ended interval) and -222222222 (MOE
+# not computed). None of them is a measurement.
+CENSUS_SENTINELS = np.array(
+    [-999999999, -888888888, -666666666, -555555555, -333333333, -222222222],
+    dtype="float64",
+)
+
+
+def decode_column(values) -> np.ndarray:
+    """A column of API values as float64, with nulls and sentinels as NaN."""
+    try:
+        column = np.array(values, dtype="float64")
+    except (TypeError, ValueError):
+        # Something non-numeric slipped in (an annotation, say); only that
+        # cell is lost.
+        column = np.array([_to_float(v) for v in values], dtype="float64")
+
+    column[np.isin(column, CENSUS_SENTINELS)] = np.nan
+    return column
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def decode_payload(data, codes) -> tuple[np.ndarray, np.ndarray | None, dict[str, np.ndarray]]:
+    """
+    Splits an API payload into its GEO_ID column, its NAME column (None if
+    it has none) and a float column for each of 'codes' it holds.
+    """
+    columns, *rows = data
+    by_column = list(zip(*rows)) if rows else [()] * len(columns)
+
+    geo_ids = np.array(by_column[columns.index("GEO_ID")], dtype=object)
+    names = (
+        np.array(by_column[columns.index("NAME")], dtype=object)
+        if "NAME" in columns else None
+    )
+    values = {
+        code: decode_column(by_column[i])
+        for i, code in enumerate(columns)
+        if code in codes
+    }
+    return geo_ids, names, values
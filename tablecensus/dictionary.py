@@ -0,0 +1,150 @@
+"""Load the three sheets of a data dictionary that a run actually uses.
+
+Calling pd.read_excel once per sheet reopens and re-parses the whole
+workbook every time, reference sheets and all. Here the workbook is opened
+once, in openpyxl's read-only streaming mode, and only Variables,
+Geographies and Years are read. Cells come out the way pd.read_excel would
+give them, so nothing downstream notices the difference.
+
+Parsed dictionaries are also cached, in memory and under the cache folder,
+keyed by a hash of the file's bytes: a dictionary that hasn't changed since
+the last run isn't parsed again. In memory, an unchanged modification time
+and size skip even the hashing.
+"""
+
+import hashlib
+import os
+import pickle
+from pathlib import Path
+from zipfile import BadZipFile
+
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+
+from .config import cache_dir
+
+
+SHEETS = ("Variables", "Geographies", "Years")
+
+# Bump when what the loader returns changes, so old cache entries are ignored.
+LOADER_VERSION = 1
+
+_loaded: dict[Path, tuple[int, int, str, tuple]] = {}
+
+
+def _cell(value):
+    # Excel keeps every number as a float; pd.read_excel gives whole ones back as ints.
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _sheet_frame(worksheet) -> pd.DataFrame:
+    rows = worksheet.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return pd.DataFrame()
+
+    data = [[_cell(v) for v in row] for row in rows]
+    data = [row for row in data if any(v is not None for v in row)]
+
+    width = len(header)
+    while width and header[width - 1] is None and all(
+        len(row) < width or row[width - 1] is None for row in data
+    ):
+        width -= 1
+
+    columns = [
+        name if name is not None else f"Unnamed: {i}"
+        for i, name in enumerate(header[:width])
+    ]
+    data = [list(row[:width]) + [None] * (width - len(row)) for row in data]
+    return pd.DataFrame(data, columns=columns)
+
+
+def _parse(path: Path) -> dict[str, pd.DataFrame | None]:
+    """Each wanted sheet as a frame, or None for a sheet the workbook lacks."""
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        return {
+            name: _sheet_frame(workbook[name]) if name in workbook.sheetnames else None
+            for name in SHEETS
+        }
+    finally:
+        workbook.close()
+
+
+def _digest(path: Path) -> str:
+    h = hashlib.sha256(f"v{LOADER_VERSION}".encode())
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def load_sheets(path, use_cache: bool = True) -> dict[str, pd.DataFrame | None]:
+    """
+    The Variables, Geographies and Years sheets of a workbook. Raises
+    FileNotFoundError if there's no such file and ValueError if it isn't a
+    workbook openpyxl can read.
+    """
+    path = Path(path).resolve()
+    stat = path.stat()
+
+    if not use_cache:
+        sheets = _read(path)
+        return {name: _copy(frame) for name, frame in sheets.items()}
+
+    known = _loaded.get(path)
+    if known is not None and known[:2] == (stat.st_mtime_ns, stat.st_size):
+        return {name: _copy(frame) for name, frame in known[3].items()}
+
+    digest = _digest(path)
+    if known is not None and known[2] == digest:
+        sheets = known[3]
+    else:
+        sheets = _from_disk(digest)
+        if sheets is None:
+            sheets = _read(path)
+            _to_disk(digest, sheets)
+
+    _loaded[path] = (stat.st_mtime_ns, stat.st_size, digest, sheets)
+    return {name: _copy(frame) for name, frame in sheets.items()}
+
+
+def _read(path: Path):
+    try:
+        return _parse(path)
+    except (InvalidFileException, BadZipFile, KeyError) as e:
+        raise ValueError(f"❌ Could not read {path} as an Excel workbook: {e}")
+
+
+def _copy(frame):
+    # Callers are free to change what they get back; the cache keeps its own.
+    return None if frame is None else frame.copy()
+
+
+def _disk_path(digest: str) -> Path:
+    return cache_dir() / "dictionaries" / f"{digest}.pkl"
+
+
+def _from_disk(digest: str):
+    try:
+        with open(_disk_path(digest), "rb") as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+
+
+def _to_disk(digest: str, sheets) -> None:
+    path = _disk_path(digest)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(sheets, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except OSError:
+        # A cache that can't be written just means parsing again next time.
+        pass
@@ -0,0 +1,253 @@
+"""A local stand-in for api.census.gov, for load and latency testing.
+
+Serves /data/{year}/acs/{release} and answers get=, for=, in= and group()
+the way the real API does, with made-up but deterministic numbers: the same
+URL always gets the same body. Wildcards return as many geographies as
+reference.TYPICAL_WILDCARD_ROWS says a real one would, with GEO_IDs shaped
+by reference.GEOID_DECOMPOSER, so payload sizes are realistic too.
+
+Everything that makes the real API hard to work with can be dialled in:
+
+    latency          seconds before every response
+    latency_per_row  extra seconds per row returned (wildcards are slow)
+    error_rate       share of requests answered with a 500
+    overload_rate    share answered with a 429 or a 503
+    max_concurrent   requests worked on at once; the rest queue
+    rate_limit       requests per second before everything gets a 429
+
+Point a run at it with the CENSUS_API_URL environment variable:
+
+    python -m tablecensus.fake_api --port 8765 --latency 0.5 --overload-rate 0.05
+    CENSUS_API_URL=http://127.0.0.1:8765/data tablecensus assemble dictionary.xlsx
+"""
+
+import asyncio
+import random
+import time
+import zlib
+from dataclasses import dataclass
+from urllib.parse import unquote
+
+import click
+from aiohttp import web
+
+from .reference import (
+    API_GEO_PARAMS,
+    DEFAULT_WILDCARD_ROWS,
+    GEOID_DECOMPOSER,
+    GEO_TO_API_PARAMS,
+    STATE_FIPS,
+    SUMLEV_TO_STEM,
+    SumLevel,
+    TYPICAL_WILDCARD_ROWS,
+)
+from .request_prep import API_MAX_VARIABLES
+
+
+# The fake can't know how many cells a real table has, so every group()
+# answers with this many.
+GROUP_CELLS = 40
+
+
+@dataclass
+class FakeSettings:
+    latency: float = 0.0
+    latency_per_row: float = 0.0
+    error_rate: float = 0.0
+    overload_rate: float = 0.0
+    max_concurrent: int | None = None
+    rate_limit: float | None = None
+    seed: int = 0
+
+
+class FakeCensusAPI:
+    def __init__(self, settings: FakeSettings | None = None):
+        self.settings = settings or FakeSettings()
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._random = random.Random(self.settings.seed)
+        self._gate = (
+            asyncio.Semaphore(self.settings.max_concurrent)
+            if self.settings.max_concurrent else None
+        )
+        self._window_start = time.monotonic()
+        self._window_count = 0
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/data/{year}/acs/{release}", self.handle)
+        return app
+
+    def _over_rate_limit(self) -> bool:
+        if not self.settings.rate_limit:
+            return False
+        now = time.monotonic()
+        if now - self._window_start >= 1:
+            self._window_start, self._window_count = now, 0
+        self._window_count += 1
+        return self._window_count > self.settings.rate_limit
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        if self._over_rate_limit():
+            return web.Response(status=429, text="Too Many Requests")
+
+        roll = self._random.random()
+        if roll < self.settings.error_rate:
+            return web.Response(status=500, text="Internal Server Error")
+        if roll < self.settings.error_rate + self.settings.overload_rate:
+            return web.Response(status=self._random.choice([429, 503]), text="Overloaded")
+
+        if self._gate is None:
+            return await self._answer(request)
+        async with self._gate:
+            return await self._answer(request)
+
+    async def _answer(self, request: web.Request) -> web.Response:
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            try:
+                body = respond(
+                    request.match_info["year"],
+                    request.query.get("get", ""),
+                    request.query.get("for", ""),
+                    request.query.get("in", ""),
+                )
+            except ValueError as e:
+                return web.Response(status=400, text=f"error: {e}")
+
+            await asyncio.sleep(
+                self.settings.latency + self.settings.latency_per_row * (len(body) - 1)
+            )
+            return web.json_response(body)
+        finally:
+            self.in_flight -= 1
+
+
+def _level(api_name: str) -> SumLevel:
+    try:
+        return GEO_TO_API_PARAMS[api_name]
+    except KeyError:
+        raise ValueError(f"unknown/unsupported geography hierarchy '{api_name}'")
+
+
+def _identities(level: SumLevel, values: list[str], above: SumLevel) -> list[str]:
+    width = GEOID_DECOMPOSER.get(level, {}).get(level, 0)
+    if values != ["*"]:
+        return [v.zfill(width) for v in values]
+    if level == SumLevel.STATE:
+        return list(STATE_FIPS)
+    count = TYPICAL_WILDCARD_ROWS.get((level, above), DEFAULT_WILDCARD_ROWS)
+    return [str(i + 1).zfill(width) for i in range(count)]
+
+
+def geographies(for_clause: str, in_clause: str) -> tuple[SumLevel, list[dict]]:
+    """
+    Every geography a for=/in= pair names, as {level: identity} in GEO_ID
+    order. Parents the clause leaves out are filled in as wildcards.
+    """
+    name, _, values = unquote(for_clause).rpartition(":")
+    level = _level(name)
+    if level == SumLevel.NATION:
+        return level, [{}]
+
+    named = {level: values.split(",")}
+    for part in unquote(in_clause).split():
+        parent_name, _, parent_values = part.rpartition(":")
+        named[_level(parent_name)] = parent_values.split(",")
+
+    found, above = [{}], SumLevel.NATION
+    for part_level, width in GEOID_DECOMPOSER[level].items():
+        if not width:
+            continue
+        ids = _identities(part_level, named.get(part_level, ["*"]), above)
+        found = [{**f, part_level: i} for f in found for i in ids]
+        above = part_level
+
+    return level, found
+
+
+def _value(*seed) -> int:
+    return zlib.crc32("|".join(map(str, seed)).encode("utf-8"))
+
+
+def respond(year: str, get: str, for_clause: str, in_clause: str) -> list[list]:
+    """The body the fake sends back for one call."""
+    items = [item for item in unquote(get).split(",") if item]
+    columns = []
+    for item in items:
+        if item.startswith("group(") and item.endswith(")"):
+            table = item[len("group("):-1]
+            columns.extend(["GEO_ID", "NAME"])
+            for cell in range(1, GROUP_CELLS + 1):
+                code = f"{table}_{cell:03d}"
+                columns.extend([f"{code}E", f"{code}EA", f"{code}M", f"{code}MA"])
+        elif item not in columns:
+            columns.append(item)
+
+    if not columns:
+        raise ValueError("the get clause is required")
+    if sum(1 for item in items if not item.startswith("group(")) > API_MAX_VARIABLES:
+        raise ValueError(f"you can only request up to {API_MAX_VARIABLES} variables")
+
+    level, found = geographies(for_clause, in_clause)
+    stem = SUMLEV_TO_STEM[level]
+    # Like the real API, the geography's own parts come back as trailing columns.
+    parts = [lev for lev, width in GEOID_DECOMPOSER.get(level, {}).items() if width]
+
+    rows = []
+    for geo in found:
+        geo_id = f"{stem}00US{''.join(geo.values())}"
+        row = []
+        for column in columns:
+            if column == "GEO_ID":
+                row.append(geo_id)
+            elif column == "NAME":
+                names = [f"{API_GEO_PARAMS[lev].title()} {i}" for lev, i in reversed(geo.items())]
+                row.append("; ".join(names) or "United States")
+            elif column.endswith("A"):
+                row.append(None)
+            elif column.endswith("M"):
+                row.append(str(_value(year, geo_id, column) % 5_000))
+            else:
+                row.append(str(_value(year, geo_id, column) % 100_000))
+        rows.append(row + [geo[lev] for lev in parts])
+
+    return [columns + [API_GEO_PARAMS[lev] for lev in parts], *rows]
+
+
+async def start_fake_api(host: str = "127.0.0.1", port: int = 0, **settings):
+    """
+    Starts a fake API in the running event loop. Returns the server, its
+    runner (call 'await runner.cleanup()' to stop it) and the base URL to
+    put in CENSUS_API_URL.
+    """
+    api = FakeCensusAPI(FakeSettings(**settings))
+    runner = web.AppRunner(api.app())
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound = site._server.sockets[0].getsockname()[1]
+    return api, runner, f"http://{host}:{bound}/data"
+
+
+@click.command()
+@click.option("--host", default="127.0.0.1")
+@click.option("--port", default=8765, type=int)
+@click.option("--latency", default=0.0, type=float, help="Seconds before every response.")
+@click.option("--latency-per-row", default=0.0, type=float, help="Extra seconds per row returned.")
+@click.option("--error-rate", default=0.0, type=float, help="Share of requests answered with a 500.")
+@click.option("--overload-rate", default=0.0, type=float, help="Share answered with a 429 or 503.")
+@click.option("--max-concurrent", default=None, type=int, help="Requests worked on at once.")
+@click.option("--rate-limit", default=None, type=float, help="Requests per second before 429s.")
+@click.option("--seed", default=0, type=int)
+def main(host, port, **settings):
+    api = FakeCensusAPI(FakeSettings(**settings))
+    print(f"Fake Census API on http://{host}:{port}/data -- set CENSUS_API_URL to that.")
+    web.run_app(api.app(), host=host, port=port, print=None)
+
+
+if __name__ == "__main__":
+    main()
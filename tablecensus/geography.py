@@ -9,13 +9,17 @@ from .reference import (
     STRING_NAME_TRANSLATION,
     SUMLEV_FROM_PARTS,
     API_GEO_PARAMS,
+    GEOID_DECOMPOSER,
+    TYPICAL_WILDCARD_ROWS,
+    DEFAULT_WILDCARD_ROWS,
 )
-from .request_prep import chunk
+from .request_prep import MAX_GEO_QUERY_LENGTH, pack
 
-MAX_GEOS_PER_CALL = 100
-
-
-MAX_GEOS_PER_CALL = 200
+# What one extra call costs, in rows of response. Listing many children
+# explicitly can take several calls where a single wildcard under the same
+# parent would do; the wildcard wins once the calls it saves are worth more
+# than the extra rows it brings back (which are filtered out after parsing).
+CALL_COST_ROWS = 500
 
 
 def _chunk(lst, n):
@@ -53,6 +57,54 @@ class Geography:
         return self.parts[self.sum_level]
 
 
+@dataclass(frozen=True)
+class GeoPart:
+    """
+    The geography half of one API call ("for=...&in=..."), with a rough
+    count of the rows it should return.
+
+    'keep' is set when a wildcard stands in for an explicit list: it holds
+    the requested identities, zero-padded to their GEO_ID width, and every
+    other row is dropped after parsing.
+    """
+    query: str
+    rows: int
+    keep: frozenset[str] | None = None
+
+    def keeps(self, geo_id: str) -> bool:
+        if self.keep is None:
+            return True
+        width = len(next(iter(self.keep)))
+        return geo_id[-width:] in self.keep
+
+
+def _typical_rows(child: SumLevel, parent: SumLevel) -> int:
+    return TYPICAL_WILDCARD_ROWS.get((child, parent), DEFAULT_WILDCARD_ROWS)
+
+
+def estimate_rows(sum_level: SumLevel, parents, identities: list[str]) -> int:
+    """
+    Explicit identities are one row each; a '*' is filled in from the
+    typical number of children under its narrowest named parent. Wildcard
+    parents multiply in the same way.
+    """
+    parent_values = {} if isinstance(parents, SumLevel) else dict(parents)
+    chain = [lev for lev in GEOID_DECOMPOSER.get(sum_level, {}) if lev != sum_level]
+
+    above = SumLevel.NATION
+    multiplier = 1
+    for level in chain:
+        if level not in parent_values:
+            continue
+        if parent_values[level] == "*":
+            multiplier *= _typical_rows(level, above)
+        above = level
+
+    if "*" in identities:
+        return multiplier * _typical_rows(sum_level, above)
+    return multiplier * len(identities)
+
+
 def create_geography_from_parts(parts):
     if "nation" in parts:
         return Geography(
@@ -98,39 +150,66 @@ def consolidate_calls(geos: list[Geography]) -> defaultdict:
     return tree
 
 
-def create_consolodated_api_calls(tree: defaultdict):
+def create_consolodated_api_calls(tree: defaultdict) -> list[GeoPart]:
     """
     This takes the CallTree created by 'consolidate_calls' and returns
     a list of the geography portion of the api calls.
+
+    Each parent's children are packed into as few calls as fit the URL
+    budget for geographies, with the batches evened out -- unless one
+    wildcard call under that parent is cheaper, in which case the result is
+    filtered back down to the requested children.
     """
 
     calls = []
     # You don't need the sumlevel, you just need separate line items in
     # the defaultdict in the CallTree
     for (_, parents), children in tree.items():
-        for batch in chunk(children, MAX_GEOS_PER_CALL):
-            child_str = ",".join([child.identity for child in batch])
-
-            match parents:
-                case SumLevel():
-                    calls.append(
-                        f"for={quote(API_GEO_PARAMS[parents])}:{child_str}"
-                    )
-
-                case frozenset():
-                    ingeos = "%20".join(
-                        f"{quote(API_GEO_PARAMS[key])}:{val}"
-                        for key, val in parents
-                    )
-                    sumlevel = batch[0].sum_level
-
-                    for_str = f"for={quote(API_GEO_PARAMS[sumlevel])}:{child_str}"
-                    in_str = f"in={ingeos}"
-
-                    calls.append(f"{for_str}&{in_str}")
+        sumlevel = children[0].sum_level
+
+        match parents:
+            case SumLevel():
+                template = f"for={quote(API_GEO_PARAMS[parents])}:{{}}"
+
+            case frozenset():
+                # Sorted so the same parents always build the same URL,
+                # which the response cache and warehouse rely on.
+                ingeos = "%20".join(
+                    f"{quote(API_GEO_PARAMS[key])}:{val}"
+                    for key, val in sorted(parents, key=lambda p: p[0].value)
+                )
+                template = f"for={quote(API_GEO_PARAMS[sumlevel])}:{{}}&in={ingeos}"
+
+            case _:
+                raise TypeError(f"{type(parents)} isn't a valid parent type.")
+
+        identities = [child.identity for child in children]
+        if "*" in identities:
+            # A county listed on its own and again under a wildcard row would
+            # otherwise be asked for twice, in one call that also says '*'.
+            identities = ["*"]
+        budget = MAX_GEO_QUERY_LENGTH - len(template.format(""))
+        batches = pack(identities, len(identities), budget)
+
+        if "*" not in identities:
+            # The parent holds at least the children that were listed.
+            wildcard_rows = max(estimate_rows(sumlevel, parents, ["*"]), len(identities))
+            explicit_cost = len(batches) * CALL_COST_ROWS + len(identities)
+
+            if CALL_COST_ROWS + wildcard_rows < explicit_cost:
+                width = GEOID_DECOMPOSER[sumlevel][sumlevel]
+                calls.append(GeoPart(
+                    template.format("*"),
+                    wildcard_rows,
+                    frozenset(identity.zfill(width) for identity in identities),
+                ))
+                continue
 
-                case _:
-                    raise TypeError(f"{type(parents)} isn't a valid parent type.")
+        for batch in batches:
+            calls.append(GeoPart(
+                template.format(",".join(batch)),
+                estimate_rows(sumlevel, parents, batch),
+            ))
 
     return calls
 
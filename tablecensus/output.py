@@ -0,0 +1,49 @@
+"""Write an assembled report in the format its file name asks for.
+
+The report comes as frames with the same columns, one after another -- a
+single frame from assemble_from, or a partitioned assembly's spills (see
+partitioned.py) -- and only one of them is held at a time.
+"""
+
+from pathlib import Path
+
+from .dataset import DEFAULT_ROW_GROUP_ROWS, _pyarrow, write_parquet_dataset
+from .table_style import write_d3_excel_parts
+
+
+def _write_parquet(frames, path: Path, compression: str) -> None:
+    pa = _pyarrow()
+    writer = None
+    try:
+        for frame in frames:
+            if writer is None:
+                schema = pa.Schema.from_pandas(frame, preserve_index=False)
+                writer = pa.parquet.ParquetWriter(path, schema, compression=compression)
+            writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def write_report(frames, path, calculations: dict[str, str] | None = None,
+                 partitioned: bool = False, compression: str = "zstd",
+                 row_group_size: int = DEFAULT_ROW_GROUP_ROWS) -> None:
+    """
+    Writes .xlsx, .csv or .parquet; with 'partitioned', a .parquet path
+    becomes a dataset folder (see dataset.py).
+    """
+    path = Path(path)
+
+    if path.suffix == ".xlsx":
+        write_d3_excel_parts(frames, path)
+
+    elif path.suffix == ".csv":
+        for i, frame in enumerate(frames):
+            frame.to_csv(path, index=False, mode="a" if i else "w", header=not i)
+
+    elif path.suffix == ".parquet" and partitioned:
+        for i, frame in enumerate(frames):
+            write_parquet_dataset(frame, path, calculations, compression, row_group_size, part=i)
+
+    elif path.suffix == ".parquet":
+        _write_parquet(frames, path, compression)
@@ -0,0 +1,204 @@
+"""Assemble a dictionary a piece at a time, for pulls too big to hold at once.
+
+assemble_from keeps everything for the whole pull in memory together: the
+decoded responses, the raw table, the calculation namespace and the finished
+report. Every block group in the country, hundreds of indicators and several
+years of them doesn't fit.
+
+Calculations only ever combine values from the same row, so the report can
+be built in pieces. Here the geography parts are divided by state -- a
+wildcard over 'state:*' becomes one part per state -- and for each year the
+states are packed into partitions whose estimated peak memory stays under a
+budget. Each partition is fetched, calculated and spilled to disk before the
+next one starts, and the output is written from the spills one at a time:
+
+    with assemble_partitioned("dictionary.xlsx", memory_budget_mb=2000) as report:
+        write_report(report, "report.csv")
+
+Rows come out by year, then state, rather than in assemble_from's order.
+"""
+
+import tempfile
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from pathlib import Path
+from urllib.parse import unquote
+
+import pandas as pd
+
+from .assemble import NO_DATA, assemble_parts, read_dictionary
+from .cassette import Recorder, Replay
+from .catalog import unpublished
+from .geography import GeoPart, build_api_geo_parts
+from .reference import STATE_FIPS
+from .request_prep import plan_needs
+from .timing import StageTimer
+from .variables import collect_census_variables
+
+
+DEFAULT_MEMORY_BUDGET_MB = 2048
+
+# Rough peak bytes per report row while a partition is assembled. Each census
+# code is decoded to a float column, copied into a CensusArray and dropped
+# into the raw table; each indicator becomes an estimate and a MOE column in
+# the calculated result and again in the report. On top of that, the geoid,
+# name and the slice of raw JSON still waiting to be decoded.
+ROW_OVERHEAD_BYTES = 600
+BYTES_PER_CODE = 3 * 8
+BYTES_PER_INDICATOR = 4 * 8
+
+
+@dataclass
+class Partition:
+    states: list[str | None]
+    geo_parts: list[GeoPart]
+    releases: list[tuple]
+    rows: int
+
+
+def _params(query: str) -> dict[str, str]:
+    return dict(param.split("=", 1) for param in query.split("&") if param)
+
+
+def state_of(part: GeoPart) -> str | None:
+    """The one state a geography part lies in, or None if it spans several."""
+    params = _params(part.query)
+    level, _, identity = unquote(params.get("for", "")).rpartition(":")
+    if level == "state":
+        return identity if identity.isdigit() else None
+
+    for parent in unquote(params.get("in", "")).split():
+        name, _, value = parent.rpartition(":")
+        if name == "state":
+            return value if value.isdigit() else None
+    return None
+
+
+def by_state(geo_parts: list[GeoPart]) -> dict[str | None, list[GeoPart]]:
+    """
+    Geography parts grouped by state. Parts under every state are split into
+    one per state; whatever still spans several states is grouped under None.
+    """
+    found: dict[str | None, list[GeoPart]] = {}
+    for part in geo_parts:
+        params = _params(part.query)
+        if "state:*" in unquote(params.get("in", "")).split():
+            in_value = params["in"]
+            for fips in STATE_FIPS:
+                narrowed = in_value.replace("state:*", f"state:{fips}")
+                found.setdefault(fips, []).append(replace(
+                    part,
+                    query=part.query.replace(f"in={in_value}", f"in={narrowed}"),
+                    rows=max(1, part.rows // len(STATE_FIPS)),
+                ))
+        else:
+            found.setdefault(state_of(part), []).append(part)
+    return found
+
+
+def row_bytes(codes: int, indicators: int) -> int:
+    return ROW_OVERHEAD_BYTES + BYTES_PER_CODE * codes + BYTES_PER_INDICATOR * indicators
+
+
+def plan_partitions(geo_parts, releases, row_size: int, budget_bytes: int) -> list[Partition]:
+    """
+    For each year, consecutive states packed into partitions that fit the
+    budget. A state that doesn't fit on its own is still one partition.
+    """
+    states = by_state(geo_parts)
+    order = sorted(states, key=lambda state: (state is None, state or ""))
+
+    partitions = []
+    for release in releases:
+        current = None
+        for state in order:
+            parts = states[state]
+            rows = sum(part.rows for part in parts)
+            if current is not None and (current.rows + rows) * row_size <= budget_bytes:
+                current.states.append(state)
+                current.geo_parts.extend(parts)
+                current.rows += rows
+                continue
+            current = Partition([state], list(parts), [release], rows)
+            partitions.append(current)
+    return partitions
+
+
+class SpilledReport:
+    """The finished partitions on disk; iterating loads them one at a time."""
+
+    def __init__(self, paths: list[Path]):
+        self.paths = paths
+
+    def __iter__(self):
+        for path in self.paths:
+            yield pd.read_pickle(path)
+
+    def __len__(self):
+        return len(self.paths)
+
+
+@contextmanager
+def assemble_partitioned(dictionary_path, memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB,
+                         short_geoids=False, cache_mode="use", record=None, replay=None,
+                         timer: StageTimer | None = None, spill_dir=None):
+    """
+    Assembles a data dictionary partition by partition (see the module
+    docstring) and yields the report as a SpilledReport. The spill files are
+    removed when the block ends.
+    """
+    timer = timer if timer is not None else StageTimer()
+
+    with timer.stage("read"):
+        variables, geographies, releases = read_dictionary(
+            dictionary_path, use_cache=cache_mode != "off"
+        )
+
+    with timer.stage("plan"):
+        geo_parts = build_api_geo_parts(geographies)
+        _, variable_codes = collect_census_variables(variables)
+        # Checked over the whole pull: each partition holds a single year.
+        replayed = Replay(replay) if replay else None
+        absent = replayed.absent if replayed is not None else unpublished(
+            plan_needs(geo_parts, variable_codes, releases), cache_mode
+        )
+        row_size = row_bytes(len(variable_codes), len(variables))
+        partitions = plan_partitions(
+            geo_parts, releases, row_size, int(memory_budget_mb * 1024 * 1024)
+        )
+
+    largest = max(partition.rows for partition in partitions) * row_size
+    print(f"Assembling in {len(partitions)} partitions of about "
+          f"{largest / 1024 / 1024:,.1f} MB at most")
+
+    recorder = Recorder(record) if record else None
+    with tempfile.TemporaryDirectory(prefix="tablecensus-", dir=spill_dir) as workdir:
+        spills = []
+        try:
+            for i, partition in enumerate(partitions, 1):
+                states = ", ".join(state or "multi-state" for state in partition.states)
+                year, release = partition.releases[0]
+                print(f"Partition {i}/{len(partitions)}: {year} {release} ({states})")
+
+                result = assemble_parts(
+                    variables, partition.geo_parts, partition.releases, short_geoids,
+                    cache_mode=cache_mode, recorder=recorder, replay=replayed, timer=timer,
+                    absent=absent,
+                )
+                if result is None:
+                    continue
+
+                with timer.stage("spill"):
+                    path = Path(workdir) / f"partition-{i:05d}.pkl"
+                    result.to_pickle(path)
+                    spills.append(path)
+                del result
+        finally:
+            if recorder is not None:
+                recorder.close()
+                print(f"Recorded {recorder.count} responses to {recorder.path}")
+
+        if not spills:
+            raise ValueError(NO_DATA)
+
+        yield SpilledReport(spills)
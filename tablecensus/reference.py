@@ -163,6 +163,46 @@ SUMLEV_FROM_PARTS = {
 SUMLEV_FROM_PARTS[frozenset({SumLevel.NATION})] = SumLevel.NATION
 
 
+# Rough number of geographies a wildcard returns, keyed by (child, parent)
+# summary level. Only used to estimate payload sizes before fetching -- the
+# Census API decides the real counts.
+
+TYPICAL_WILDCARD_ROWS = {
+    (SumLevel.STATE, SumLevel.NATION): 52,
+    (SumLevel.COUNTY, SumLevel.NATION): 3222,
+    (SumLevel.ZCTA, SumLevel.NATION): 33774,
+    (SumLevel.CONGRESSIONAL_DISTRICT, SumLevel.NATION): 437,
+    (SumLevel.PLACE, SumLevel.NATION): 32000,
+    (SumLevel.COUNTY, SumLevel.STATE): 62,
+    (SumLevel.ZCTA, SumLevel.STATE): 650,
+    (SumLevel.CONGRESSIONAL_DISTRICT, SumLevel.STATE): 9,
+    (SumLevel.STATE_LEG_LOWER, SumLevel.STATE): 95,
+    (SumLevel.STATE_LEG_UPPER, SumLevel.STATE): 38,
+    (SumLevel.COUNTY_SUBDIVISION, SumLevel.STATE): 700,
+    (SumLevel.PLACE, SumLevel.STATE): 620,
+    (SumLevel.TRACT, SumLevel.STATE): 1650,
+    (SumLevel.BLOCK_GROUP, SumLevel.STATE): 4700,
+    (SumLevel.ELEM_SCH_DISTRICT, SumLevel.STATE): 40,
+    (SumLevel.SEC_SCH_DISTRICT, SumLevel.STATE): 10,
+    (SumLevel.UNI_SCH_DISTRICT, SumLevel.STATE): 215,
+    (SumLevel.COUNTY_SUBDIVISION, SumLevel.COUNTY): 11,
+    (SumLevel.TRACT, SumLevel.COUNTY): 27,
+    (SumLevel.BLOCK_GROUP, SumLevel.COUNTY): 77,
+    (SumLevel.BLOCK_GROUP, SumLevel.TRACT): 3,
+}
+
+# Used when a combination isn't listed above.
+DEFAULT_WILDCARD_ROWS = 100
+
+# The FIPS codes 'state:*' covers in the ACS: the states, DC and Puerto Rico.
+STATE_FIPS = (
+    "01", "02", "04", "05", "06", "08", "09", "10", "11", "12", "13", "15", "16",
+    "17", "18", "19", "20", "21", "22", "23", "24", "25", "26", "27", "28", "29",
+    "30", "31", "32", "33", "34", "35", "36", "37", "38", "39", "40", "41", "42",
+    "44", "45", "46", "47", "48", "49", "50", "51", "53", "54", "55", "56", "72",
+)
+
+
 class ACSEra(Enum):
     ONE_YEAR = auto()
     THREE_YEAR = auto()
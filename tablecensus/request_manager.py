@@ -18,22 +18,72 @@ errors far from their cause:
    that never arrived. Silent partial data is worse than a hard failure in an
    ETL, so incomplete fetches now raise.
 
+The concurrency bound is adaptive (additive increase, multiplicative
+decrease). It starts at CENSUS_MAX_CONCURRENCY and opens up by one slot after
+each full window of fast, successful responses. It halves on a timeout, a 429
+or a 5xx. At most one halving happens per window, so a single slow wave can't
+collapse it to one. A fixed setting was either too timid on a good day or hit
+the timeout wall on a bad one.
+
 Tunable through the environment:
 
-    CENSUS_MAX_CONCURRENCY   simultaneous requests            (default 8)
-    CENSUS_REQUEST_TIMEOUT   seconds per attempt              (default 120)
-    CENSUS_MAX_RETRIES       attempts after the first         (default 3)
-    CENSUS_ALLOW_PARTIAL     "1" to return partial results    (default off)
+    CENSUS_MAX_CONCURRENCY       starting number of simultaneous requests  (default 8)
+    CENSUS_CONCURRENCY_CEILING   most simultaneous requests ever allowed   (default 32)
+    CENSUS_ADAPTIVE_CONCURRENCY  "0" to pin concurrency at the start value (default on)
+    CENSUS_REQUEST_TIMEOUT       seconds per attempt                       (default 120)
+    CENSUS_MAX_RETRIES           attempts after the first                  (default 3)
+    CENSUS_ALLOW_PARTIAL         "1" to return partial results             (default off)
+
+A call that still times out after its retries is split rather than given
+up on: a state-wide wildcard is re-sent one county at a time, anything else
+as two calls for half the variables each. The pieces are merged back into a
+single response under the original label and cached under the original URL.
+
+A 400 that names an unknown variable is bisected the same way, since it's
+usually one misspelled or unpublished code sinking the other forty-odd. The
+codes the API still refuses on their own are dropped, reported, and left
+empty. The salvaged response is cached under the original URL too, along
+with the codes it dropped, so a run served from the cache reports them
+again. Any other 400 -- a bad geography, say -- fails the call once.
+
+Callers that pass 'on_response' get each response as it completes rather
+than all of them at the end, so parsing overlaps with the network.
+
+A request for a URL that is already on its way -- from the same run, or
+another one on the same event loop -- doesn't go out again: it waits for the
+first one's response. URLs are compared without their API key.
+
+Responses can also be served from, and saved to, the on-disk cache in
+`cache.py`; a cached URL is never sent to the API.
+
+'populate_data' runs its own event loop. Code that already has one awaits
+'fetch_async' instead, and can pass in its own ClientSession and
+AdaptiveLimiter so that many fetches share one connection pool and one
+concurrency bound.
 """
 
 import asyncio
 import os
 import random
-from typing import Any
+import re
+import time
+import weakref
+from typing import Any, Callable
 
 from aiohttp import ClientError, ClientResponseError, ClientSession, ClientTimeout
 from tqdm import tqdm
 
+from .cache import ResponseCache, strip_api_key
+from .cassette import Recorder, Replay
+from .timing import active_timer
+from .request_prep import (
+    county_lookup_url,
+    in_county,
+    merge_payloads,
+    query_param,
+    split_variables,
+)
+
 
 def _env_int(name: str, default: int) -> int:
     try:
@@ -43,6 +93,8 @@ def _env_int(name: str, default: int) -> int:
 
 
 MAX_CONCURRENCY = _env_int("CENSUS_MAX_CONCURRENCY", 8)
+CONCURRENCY_CEILING = max(MAX_CONCURRENCY, _env_int("CENSUS_CONCURRENCY_CEILING", 32))
+ADAPTIVE_CONCURRENCY = os.environ.get("CENSUS_ADAPTIVE_CONCURRENCY", "").strip() not in {"0", "false", "no"}
 REQUEST_TIMEOUT = _env_int("CENSUS_REQUEST_TIMEOUT", 120)
 MAX_RETRIES = _env_int("CENSUS_MAX_RETRIES", 3)
 ALLOW_PARTIAL = os.environ.get("CENSUS_ALLOW_PARTIAL", "").strip() in {"1", "true", "yes"}
@@ -51,83 +103,507 @@ ALLOW_PARTIAL = os.environ.get("CENSUS_ALLOW_PARTIAL", "").strip() in {"1", "tru
 # Retrying cannot help and only slows the failure down.
 PERMANENT_STATUSES = {400, 404}
 
+# How a 400's body names a bad variable ("error: unknown variable 'B01001_999E'").
+# Only then is there anything to salvage by bisecting the call.
+UNKNOWN_VARIABLE = re.compile(r"unknown variable", re.IGNORECASE)
+
+
+# Signs the API is overloaded rather than the request being wrong.
+OVERLOAD_STATUSES = {429, 500, 502, 503, 504}
+
+# A response slower than this multiple of the fastest typical latency seen so
+# far suggests requests are queueing at the API, so it doesn't count towards
+# opening up another slot.
+HEALTHY_LATENCY_FACTOR = 3
+
+# How many times a call that keeps timing out may be cut into smaller calls.
+# Two halvings take a 48-variable chunk down to 12.
+MAX_SPLIT_DEPTH = 2
+
 
 class RequestError(Exception):
     pass
 
 
-async def make_request(
-    request: tuple[Any, str],
-    session: ClientSession,
-    pbar: tqdm,
-    semaphore: asyncio.Semaphore,
-):
-    label, url = request
+class RejectedRequest(RequestError):
+    """A 400 for a call that named its variables, so they can be bisected."""
+
+    def __init__(self, message: str, codes: list[str]):
+        super().__init__(message)
+        self.codes = codes
+
+
+class AdaptiveLimiter:
+    """
+    Bounds simultaneous requests, adjusting the bound as responses come back.
+    Each request holds a slot for its whole attempt:
+
+        async with limiter.slot():
+            ...
+
+    Leaving the slot normally counts as a success; leaving it with a timeout
+    or an overload status counts against the limit. Other errors are neutral.
+    """
+
+    def __init__(self, initial: int = MAX_CONCURRENCY, ceiling: int = CONCURRENCY_CEILING,
+                 adaptive: bool = ADAPTIVE_CONCURRENCY):
+        self.limit = initial
+        self.ceiling = max(initial, ceiling)
+        self.adaptive = adaptive
+        self.peak = initial
+        self.in_flight = 0
+        self.sent = 0
+        # Requests answered by an identical one that was already in flight.
+        self.shared = 0
+        self._condition = asyncio.Condition()
+        self._successes = 0
+        self._epoch = 0
+        self._latency = None
+        self._baseline = None
+
+    def slot(self) -> "_Slot":
+        return _Slot(self)
+
+    async def _acquire(self) -> int:
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+            self.sent += 1
+            return self._epoch
+
+    async def _release(self):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def record_success(self, latency: float):
+        # Exponentially weighted latency, and the best level it has reached.
+        self._latency = latency if self._latency is None else 0.8 * self._latency + 0.2 * latency
+        self._baseline = self._latency if self._baseline is None else min(self._baseline, self._latency)
+
+        if not self.adaptive or latency > HEALTHY_LATENCY_FACTOR * self._baseline:
+            return
+
+        self._successes += 1
+        if self._successes >= self.limit and self.limit < self.ceiling:
+            self.limit += 1
+            self.peak = max(self.peak, self.limit)
+            self._successes = 0
+
+    async def record_overload(self, epoch: int):
+        if not self.adaptive or epoch != self._epoch:
+            # Already backed off for the wave this request belonged to.
+            return
+
+        async with self._condition:
+            self.limit = max(1, self.limit // 2)
+            self._successes = 0
+            self._epoch += 1
+
+    def summary(self) -> str:
+        if not self.adaptive:
+            return f"Concurrency fixed at {self.limit}."
+        return f"Concurrency settled at {self.limit} (peak {self.peak}, ceiling {self.ceiling})."
+
+
+class _Slot:
+    def __init__(self, limiter: AdaptiveLimiter):
+        self.limiter = limiter
+
+    async def __aenter__(self):
+        asked = time.monotonic()
+        self.epoch = await self.limiter._acquire()
+        self.started = time.monotonic()
+        self.waited = self.started - asked
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.limiter._release()
+
+        if exc_type is None:
+            self.limiter.record_success(time.monotonic() - self.started)
+        elif issubclass(exc_type, asyncio.TimeoutError) or (
+            isinstance(exc, ClientResponseError) and exc.status in OVERLOAD_STATUSES
+        ):
+            await self.limiter.record_overload(self.epoch)
+
+        return False
+
+
+async def _fetch(label, url: str, session: ClientSession, limiter: AdaptiveLimiter,
+                 cache: ResponseCache | None, rejected: list, depth: int = 0):
+    """
+    The payload for one URL, or a RequestError saying why there isn't one.
+    Variables the API refused, and that were dropped to save the rest of the
+    call, are added to 'rejected' as (label, codes).
+    """
     last_error = None
+    timed_out = False
+    permanent = None
+    detail = ""
+    timer = active_timer()
 
     for attempt in range(MAX_RETRIES + 1):
+        started = time.perf_counter()
+        slot = None
+        outcome, size = "ok", None
         try:
-            async with semaphore:
+            async with limiter.slot() as slot:
                 async with session.get(
                     url, timeout=ClientTimeout(total=REQUEST_TIMEOUT)
                 ) as r:
+                    if r.status in PERMANENT_STATUSES:
+                        # The reason phrase only says "Bad Request"; what was
+                        # wrong with it is in the body.
+                        detail = (await r.text()).strip()
                     r.raise_for_status()
                     data = await r.json()
-                    pbar.update(1)
-                    return (label, data)
+                    size = len(await r.read())
+                    if cache is not None:
+                        cache.put(url, data)
+                    return data
 
         except ClientResponseError as e:
+            outcome = f"HTTP {e.status}"
             if e.status in PERMANENT_STATUSES:
-                pbar.update(1)
-                if e.status == 400:
-                    return RequestError(
-                        f"Invalid request for {label}: Check your variable names "
-                        f"and geography codes. Census API returned: {e.message}")
-                return RequestError(
-                    f"Data not found for {label}: The combination of variables, "
-                    f"geography, and year may not be available in the Census API")
+                permanent = e
+                break
             last_error = f"HTTP {e.status}: {e.message}"
+            timed_out = False
 
         except asyncio.TimeoutError:
+            outcome = "timeout"
             last_error = f"timed out after {REQUEST_TIMEOUT}s"
+            timed_out = True
 
         except ClientError as e:
+            outcome = "connection error"
             last_error = f"connection error: {e}"
+            timed_out = False
 
         except Exception as e:  # noqa: BLE001 - reported, not swallowed
-            pbar.update(1)
+            outcome = "error"
             return RequestError(f"Unexpected error for {label}: {e}")
 
+        finally:
+            if timer is not None:
+                timer.record_request(
+                    label=label, url=url, attempt=attempt, depth=depth,
+                    started=started, finished=time.perf_counter(),
+                    waited=slot.waited if slot is not None else time.perf_counter() - started,
+                    outcome=outcome, size=size,
+                )
+
         if attempt < MAX_RETRIES:
             # Exponential backoff with jitter, so retries do not resynchronise
             # into another burst against an API that is already struggling.
             delay = (2 ** attempt) + random.uniform(0, 1)
             await asyncio.sleep(delay)
 
-    pbar.update(1)
+    if permanent is not None:
+        if permanent.status == 400:
+            message = (
+                f"Invalid request for {label}: Check your variable names "
+                f"and geography codes. Census API returned: {detail or permanent.message}"
+            )
+            if UNKNOWN_VARIABLE.search(detail):
+                return await _bisect(label, url, message, session, limiter, cache, rejected)
+            return RequestError(message)
+        return RequestError(
+            f"Data not found for {label}: The combination of variables, "
+            f"geography, and year may not be available in the Census API")
+
+    if timed_out and depth < MAX_SPLIT_DEPTH:
+        pieces = await _split(label, url, session, limiter, cache, rejected, depth)
+        if pieces:
+            below = []
+            results = await asyncio.gather(
+                *(_fetch_piece(label, piece, session, limiter, cache, below, depth + 1)
+                  for piece in pieces)
+            )
+            rejected.extend(below)
+            failed = next((r for r in results if isinstance(r, RequestError)), None)
+            if failed is not None:
+                return failed
+
+            data = merge_payloads(results)
+            if cache is not None:
+                cache.put(url, data, dropped=[code for _, codes in below for code in codes])
+            return data
+
     return RequestError(
         f"Request failed for {label} after {MAX_RETRIES + 1} attempts "
-        f"({last_error}). Lower CENSUS_MAX_CONCURRENCY (currently "
-        f"{MAX_CONCURRENCY}) or raise CENSUS_REQUEST_TIMEOUT (currently "
+        f"({last_error}). Lower CENSUS_CONCURRENCY_CEILING (currently "
+        f"{limiter.ceiling}) or raise CENSUS_REQUEST_TIMEOUT (currently "
         f"{REQUEST_TIMEOUT}s)."
     )
 
 
-async def manage_requests(requests: list[tuple[Any, str]]):
-    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+def _cached(label, url, cache, rejected, count=True):
+    """
+    The cached payload for 'url', or None. Codes it was salvaged without are
+    added to 'rejected', as they were when it was fetched.
+    """
+    if cache is None:
+        return None
+    dropped = []
+    data = cache.get(url, count=count, dropped=dropped)
+    if dropped:
+        rejected.append((label, dropped))
+    return data
+
+
+async def _fetch_piece(label, url, session, limiter, cache, rejected, depth=0):
+    """_fetch for a piece of a split call, reusing it if an earlier run kept it."""
+    data = _cached(label, url, cache, rejected, count=False)
+    if data is not None:
+        return data
+    return await _fetch(label, url, session, limiter, cache, rejected, depth)
+
+
+async def _bisect(label, url, message, session, limiter, cache, rejected):
+    """
+    A 400 naming a variable usually means one bad code -- misspelled, or not
+    published that year -- has sunk the whole chunk. Halve the chunk until
+    the bad codes are on their own, keep everything else, and leave the bad
+    codes' columns empty.
+    """
+    get = query_param(url, "get") or ""
+    if not get.startswith("GEO_ID,NAME,"):
+        return RequestError(message)
+
+    pieces = split_variables(url)
+    if not pieces:
+        codes = get.split(",")[2:]
+        return RejectedRequest(f"{message} (variables: {', '.join(codes)})", codes)
+
+    below = []
+    results = await asyncio.gather(
+        *(_fetch_piece(label, piece, session, limiter, cache, below) for piece in pieces)
+    )
+    rejected.extend(below)
+    failed = next(
+        (r for r in results if isinstance(r, RequestError) and not isinstance(r, RejectedRequest)),
+        None,
+    )
+    if failed is not None:
+        return failed
+
+    dropped = [code for r in results if isinstance(r, RejectedRequest) for code in r.codes]
+    kept = [r for r in results if not isinstance(r, RejectedRequest)]
+    if not kept:
+        return RejectedRequest(f"{message} (variables: {', '.join(dropped)})", dropped)
+
+    # Only the level that salvaged something reports the drop; the levels
+    # above it see a successful response.
+    if dropped:
+        rejected.append((label, dropped))
+    header, *rows = merge_payloads(kept)
+    data = [header + dropped, *(row + [None] * len(dropped) for row in rows)]
+    # Kept under the whole call's URL, so the next run doesn't bisect again,
+    # along with every code dropped on the way so that it still reports them.
+    if cache is not None:
+        cache.put(url, data, dropped=[code for _, codes in below for code in codes] + dropped)
+    return data
+
+
+async def _split(label, url, session, limiter, cache, rejected, depth) -> list[str]:
+    """
+    Smaller calls that together cover a call that keeps timing out. A
+    state-wide wildcard is broken up by county, since the rows are what make
+    it slow; anything else has its variable list halved.
+    """
+    lookup = county_lookup_url(url)
+    if lookup is not None:
+        counties = await _fetch(label, lookup, session, limiter, cache, rejected, MAX_SPLIT_DEPTH)
+        if not isinstance(counties, RequestError):
+            header, *rows = counties
+            column = header.index("county")
+            return [in_county(url, row[column]) for row in rows]
+
+    return split_variables(url)
+
+
+# Per event loop: keyless URL -> the task fetching it.
+_in_flight: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, asyncio.Task]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+async def _fetch_reporting(label, url, session, limiter, cache):
+    """_fetch, and the (label, codes) it dropped on the way."""
+    dropped = []
+    return await _fetch(label, url, session, limiter, cache, dropped), dropped
+
+
+async def _fetch_once(label, url, session, limiter, cache, rejected):
+    """
+    _fetch, unless the same URL is already being fetched: then its result.
+    Variables the API rejected are added to every waiter's 'rejected'.
+    """
+    in_flight = _in_flight.setdefault(asyncio.get_running_loop(), {})
+    key = strip_api_key(url)
+
+    task = in_flight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_fetch_reporting(label, url, session, limiter, cache))
+        in_flight[key] = task
+        task.add_done_callback(lambda _: in_flight.pop(key, None))
+    else:
+        limiter.shared += 1
+
+    # Shielded, so one waiter being cancelled doesn't cancel it for the rest.
+    data, dropped = await asyncio.shield(task)
+    rejected.extend(dropped)
+    return data
+
+
+async def make_request(
+    request: tuple[Any, str],
+    session: ClientSession,
+    pbar: tqdm,
+    limiter: AdaptiveLimiter,
+    cache: ResponseCache | None = None,
+    rejected: list | None = None,
+):
+    label, url = request
+    data = await _fetch_once(
+        label, url, session, limiter, cache, [] if rejected is None else rejected
+    )
+    pbar.update(1)
+
+    if isinstance(data, RequestError):
+        return data
+    return (label, data)
+
+
+async def manage_requests(
+    requests: list[tuple[Any, str]],
+    cache: ResponseCache | None = None,
+    limiter: AdaptiveLimiter | None = None,
+    rejected: list | None = None,
+    on_response: Callable[[Any, list], None] | None = None,
+    recorder: Recorder | None = None,
+    replay: Replay | None = None,
+    session: ClientSession | None = None,
+):
+    """
+    Fetches every request. Successful responses are returned, unless
+    'on_response' is given: then each is handed to it as soon as it arrives,
+    in a worker thread, and dropped. Only one call to 'on_response' runs at a
+    time, so it needs no locking of its own.
+
+    With a 'recorder' every successful response is also written to it. With
+    'replay' responses come only from the recording and nothing is sent.
+    A 'session' is used as is and left open; otherwise one is opened for
+    the call.
+    """
+    if limiter is None:
+        limiter = AdaptiveLimiter()
+    if rejected is None:
+        rejected = []
+    ok, errors = [], []
+
+    async def deliver(url, result):
+        if isinstance(result, (Exception, RequestError)):
+            errors.append(result)
+            return
+        if recorder is not None:
+            label, data = result
+            recorder.record(label, url, data)
+        if on_response is not None:
+            await asyncio.to_thread(on_response, *result)
+        else:
+            ok.append(result)
+
+    async def fetch(request, session, pbar):
+        return request[1], await make_request(request, session, pbar, limiter, cache, rejected)
+
     with tqdm(total=len(requests), desc="Assembling table") as pbar:
-        async with ClientSession() as session:
-            results = await asyncio.gather(
-                *(make_request(r, session, pbar, semaphore) for r in requests)
-            )
+        if replay is not None:
+            for label, url in requests:
+                data = replay.get(url)
+                if data is None:
+                    await deliver(url, RequestError(
+                        f"No response for {label} in the replay archive {replay.path}"
+                    ))
+                else:
+                    await deliver(url, (label, data))
+                pbar.update(1)
+            return ok, errors
+
+        pending = []
+        for label, url in requests:
+            data = _cached(label, url, cache, rejected)
+            if data is None:
+                pending.append((label, url))
+                continue
+            await deliver(url, (label, data))
+            pbar.update(1)
+
+        if pending and session is not None:
+            for result in asyncio.as_completed([fetch(r, session, pbar) for r in pending]):
+                await deliver(*await result)
+        elif pending:
+            async with ClientSession() as own_session:
+                for result in asyncio.as_completed([fetch(r, own_session, pbar) for r in pending]):
+                    await deliver(*await result)
 
-    ok = [r for r in results if not isinstance(r, (Exception, RequestError))]
-    errors = [e for e in results if isinstance(e, (Exception, RequestError))]
     return ok, errors
 
 
-def populate_data(requests):
-    ok, errors = asyncio.run(manage_requests(requests))
+def populate_data(requests, cache: ResponseCache | None = None, on_response=None,
+                  recorder: Recorder | None = None, replay: Replay | None = None,
+                  rejected: list | None = None):
+    """
+    Fetches 'requests' on an event loop of its own. Variables the API
+    refused, and that were dropped to save the rest of their call, are
+    reported, and added to 'rejected' as (label, codes) -- before the
+    response they were dropped from is handed to 'on_response'.
+    """
+    return asyncio.run(fetch_async(requests, cache, on_response, recorder, replay,
+                                   rejected=rejected))
+
+
+def report_rejected(rejected: list) -> None:
+    """Prints the (label, codes) the API refused, by year."""
+    if not rejected:
+        return
+    print("\n⚠️  The Census API rejected these variables. The rest of each call was kept; "
+          "these columns are left empty:")
+    by_release = {}
+    for (_, year, release), codes in rejected:
+        by_release.setdefault((year, release), set()).update(codes)
+    for (year, release), codes in by_release.items():
+        print(f"  • {', '.join(sorted(codes))} ({year} {release})")
+
+
+async def fetch_async(requests, cache: ResponseCache | None = None, on_response=None,
+                      recorder: Recorder | None = None, replay: Replay | None = None,
+                      session: ClientSession | None = None,
+                      limiter: AdaptiveLimiter | None = None,
+                      rejected: list | None = None):
+    """
+    'populate_data' for a running event loop. A shared 'session' and
+    'limiter' are used as they are; their summary covers everything they've
+    done so far.
+    """
+    limiter = limiter if limiter is not None else AdaptiveLimiter()
+    rejected = rejected if rejected is not None else []
+    ok, errors = await manage_requests(
+        requests, cache, limiter, rejected, on_response, recorder, replay, session
+    )
+    if limiter.sent:
+        print(limiter.summary())
+    if limiter.shared:
+        print(f"{limiter.shared} duplicate requests shared a response already on its way.")
+
+    report_rejected(rejected)
+
+    if cache is not None:
+        if cache.hits:
+            print(f"Served {cache.hits} of {len(requests)} requests from the local cache.")
+        cache.evict()
 
     if not errors:
         return ok
@@ -162,7 +638,7 @@ def populate_data(requests):
         "variable that was never the problem.\n\n"
         "  • Transient? Retries are already applied "
         f"({MAX_RETRIES} after the first attempt).\n"
-        "  • Still timing out? Lower CENSUS_MAX_CONCURRENCY or raise "
+        "  • Still timing out? Lower CENSUS_CONCURRENCY_CEILING or raise "
         "CENSUS_REQUEST_TIMEOUT.\n"
         "  • Need the partial result anyway? Set CENSUS_ALLOW_PARTIAL=1."
     )
@@ -1,26 +1,150 @@
+"""Turn the variables and geographies a dictionary needs into API calls.
+
+Calls are packed against the two limits the Census API actually enforces:
+at most 50 variables per call (GEO_ID and NAME count), and a URL short enough
+for the API's front end to accept. Within those limits the planner uses the
+fewest calls it can, then evens the chunks out so there's no tiny straggler
+call at the end of every label.
+"""
+
+import os
+from collections import defaultdict
 from itertools import product
+from math import ceil
+from urllib.parse import unquote
 
 from .config import get_api_key
 
 
-MAX_VARS_PER_CALL = 25
+API_BASE_URL = "https://api.census.gov/data"
+
+API_MAX_VARIABLES = 50
+MAX_CODES_PER_CALL = API_MAX_VARIABLES - 2  # GEO_ID and NAME
+
+# The API's front end starts refusing URLs well before browsers do. Keep
+# comfortably below that, and give geographies at most half of it.
+MAX_URL_LENGTH = 4000
+MAX_GEO_QUERY_LENGTH = MAX_URL_LENGTH // 2
+
+# Everything in a URL besides the variables and the geography: scheme, host,
+# path, parameter names and a 40-character key.
+URL_OVERHEAD = 120
+
+# A table is fetched whole with get=group(TABLE) when the dictionary uses
+# enough of it. The table's true size isn't known here, so coverage is the
+# share of cells up to the highest one referenced -- an upper bound on the
+# real share. Tables small enough to share a regular chunk are left alone.
+GROUP_MIN_COVERAGE = 0.5
+GROUP_MIN_CELLS = MAX_CODES_PER_CALL // 2 + 1
+
+# group() responses carry an annotation column beside every estimate and MOE.
+GROUP_COLUMNS_PER_CELL = 4
+
+# A quoted value and its comma in the JSON body, on average.
+BYTES_PER_CELL = 12
+
+
+def pack(items: list[str], max_items: int, max_chars: int) -> list[list[str]]:
+    """
+    Splits items into the fewest chunks that keep both under max_items and,
+    comma-joined, under max_chars -- then evens out the chunk sizes.
+    """
+    if not items:
+        return []
+
+    def chars(batch):
+        return sum(len(item) for item in batch) + len(batch) - 1
+
+    count = max(ceil(len(items) / max_items), ceil((chars(items) + 1) / (max_chars + 1)))
+    while count < len(items):
+        size, extra = divmod(len(items), count)
+        batches, start = [], 0
+        for i in range(count):
+            end = start + size + (1 if i < extra else 0)
+            batches.append(items[start:end])
+            start = end
+
+        if all(chars(batch) <= max_chars for batch in batches):
+            return batches
+        count += 1
+
+    return [[item] for item in items]
+
 
+def plan_needs(geo_parts, variables, releases) -> dict[tuple, list[str]]:
+    """
+    Every (geo_part, year, release) label mapped to the variable codes it
+    needs. Before anything is checked against the warehouse that's all of
+    them, everywhere.
+    """
+    return {
+        (geo_part.query, year, release): list(variables)
+        for geo_part, (year, release) in product(geo_parts, releases)
+    }
 
-def chunk(lst, n):
-    for i in range(0, len(lst), n):
-        yield lst[i : i + n]
 
+def group_tables(codes: list[str]) -> tuple[list[str], list[str]]:
+    """
+    Splits estimate/MOE codes into the tables worth a single group() call and
+    the loose codes still requested one by one.
+    """
+    cells = defaultdict(set)
+    for code in codes:
+        table, _, cell = code.partition("_")
+        cells[table].add(cell[:-1])
 
-def build_calls(geo_parts, variables, releases):
-    # chunk out var string to 50 vars
+    grouped = []
+    for table, numbers in cells.items():
+        try:
+            highest = max(int(n) for n in numbers)
+        except ValueError:
+            continue
+        if len(numbers) >= GROUP_MIN_CELLS and len(numbers) / highest >= GROUP_MIN_COVERAGE:
+            grouped.append(table)
 
+    loose = [code for code in codes if code.partition("_")[0] not in grouped]
+    return grouped, loose
+
+
+def plan_calls(needs: dict[tuple, list[str]]) -> list[tuple[tuple, str]]:
+    """The (label, get= value) of every call, before any URL is built."""
+    planned = []
+    for label, codes in needs.items():
+        geo_part = label[0]
+        grouped, loose = group_tables(list(codes))
+
+        # group() responses carry GEO_ID and NAME already
+        planned.extend((label, f"group({table})") for table in grouped)
+
+        budget = MAX_URL_LENGTH - URL_OVERHEAD - len(geo_part) - len("GEO_ID,NAME,")
+        planned.extend(
+            (label, f"GEO_ID,NAME,{','.join(batch)}")
+            for batch in pack(loose, MAX_CODES_PER_CALL, budget)
+        )
+
+    return planned
+
+
+def api_base_url(base_url: str | None = None) -> str:
+    return (base_url or os.environ.get("CENSUS_API_URL") or API_BASE_URL).rstrip("/")
+
+
+def build_calls(needs: dict[tuple, list[str]], require_key: bool = True,
+                base_url: str | None = None):
+    """
+    The (label, URL) of every call. Replays match URLs without their key,
+    so they can build them with 'require_key' off. 'base_url' (or the
+    CENSUS_API_URL environment variable) points the calls somewhere other
+    than api.census.gov -- at `fake_api`, say.
+    """
+    base_url = api_base_url(base_url)
     template = (
-        "https://api.census.gov/data/{year}/acs/{release}"
-        "?get=GEO_ID,NAME,{vars_str}&{geo_part}{key_string}"
+        base_url + "/{year}/acs/{release}"
+        "?get={get}&{geo_part}{key_string}"
     )
 
     api_key = get_api_key()
-    if not api_key:
+    if not api_key and require_key:
         from .config import _config_path
         raise RuntimeError(
             "No Census API key found.\n\n"
@@ -30,20 +154,138 @@ def build_calls(geo_parts, variables, releases):
             '    api_key = "YOUR_KEY"\n\n'
             "  Get a free key at https://api.census.gov/data/key_signup.html"
         )
-    key_string = f"&key={api_key}"
+    key_string = f"&key={api_key}" if api_key else ""
 
     return [
         (
             (geo_part, year, release),
             template.format(
-                vars_str=",".join(vars_str),
+                get=get,
                 geo_part=geo_part,
                 key_string=key_string,
                 year=year,
                 release=release,
             )
         )
-        for geo_part, vars_str, (year, release) in product(
-            geo_parts, chunk(list(variables), MAX_VARS_PER_CALL), releases
-        )
+        for (geo_part, year, release), get in plan_calls(needs)
     ]
+
+
+def estimate_payload(planned, needs, geo_parts) -> tuple[int, int]:
+    """
+    Rough (rows, bytes) the planned calls will bring back, using each geography
+    part's row estimate. A group() call is assumed to run to the highest cell
+    the dictionary references.
+    """
+    rows_by_query = {part.query: part.rows for part in geo_parts}
+
+    total_rows = total_bytes = 0
+    for label, get in planned:
+        rows = rows_by_query.get(label[0], 1)
+
+        if get.startswith("group("):
+            table = get[len("group("):-1]
+            highest = max(
+                int(code.partition("_")[2][:-1])
+                for code in needs[label]
+                if code.partition("_")[0] == table
+            )
+            columns = 2 + GROUP_COLUMNS_PER_CELL * highest
+        else:
+            columns = len(get.split(","))
+
+        total_rows += rows
+        total_bytes += rows * columns * BYTES_PER_CELL
+
+    return total_rows, total_bytes
+
+
+# Summary levels that can be fetched one county at a time when a state-wide
+# wildcard is too slow to come back whole.
+COUNTY_SPLITTABLE = {"tract", "block group", "county subdivision"}
+
+
+def _query(url: str) -> tuple[str, list[list[str]]]:
+    # Split by hand rather than with urllib so each value keeps its exact
+    # encoding -- the cache keys on the URL text.
+    base, _, query = url.partition("?")
+    return base, [param.split("=", 1) for param in query.split("&") if param]
+
+
+def _with_params(url: str, **changes) -> str:
+    base, params = _query(url)
+    params = [[name, changes.pop(name, value)] for name, value in params]
+    params.extend([name, value] for name, value in changes.items())
+    return f"{base}?{'&'.join(f'{name}={value}' for name, value in params)}"
+
+
+def query_param(url: str, name: str) -> str | None:
+    _, params = _query(url)
+    return next((value for key, value in params if key == name), None)
+
+
+def split_variables(url: str) -> list[str]:
+    """Two calls asking for half the codes each, or nothing if it can't split."""
+    get = query_param(url, "get") or ""
+    items = get.split(",")
+    if get.startswith("group(") or items[:2] != ["GEO_ID", "NAME"] or len(items) < 4:
+        return []
+
+    codes = items[2:]
+    half = len(codes) // 2
+    return [
+        _with_params(url, get=",".join(["GEO_ID", "NAME", *part]))
+        for part in (codes[:half], codes[half:])
+    ]
+
+
+def county_lookup_url(url: str) -> str | None:
+    """
+    For a state-wide wildcard ("for=tract:*&in=state:26"), the call that lists
+    the state's counties. None for anything else.
+    """
+    for_value = query_param(url, "for") or ""
+    in_value = query_param(url, "in") or ""
+    level, _, identity = unquote(for_value).rpartition(":")
+
+    if identity != "*" or level not in COUNTY_SPLITTABLE:
+        return None
+
+    parents = unquote(in_value).split()
+    if len(parents) != 1 or not parents[0].startswith("state:") or parents[0].endswith("*"):
+        return None
+
+    return _with_params(url, get="NAME", **{"for": "county:*", "in": in_value})
+
+
+def in_county(url: str, county: str) -> str:
+    """The same call narrowed to one county of its state."""
+    in_value = query_param(url, "in")
+    return _with_params(url, **{"in": f"{in_value}%20county:{county}"})
+
+
+def merge_payloads(payloads: list[list[list]]) -> list[list]:
+    """
+    Puts split responses back together. Pieces with the same header hold
+    different rows and are stacked; pieces with different headers hold
+    different columns for the same rows and are joined on GEO_ID.
+    """
+    header, *rows = payloads[0]
+    rows = [list(row) for row in rows]
+
+    for other_header, *other_rows in payloads[1:]:
+        if other_header == header:
+            rows.extend(list(row) for row in other_rows)
+            continue
+
+        geo_idx = header.index("GEO_ID")
+        other_geo_idx = other_header.index("GEO_ID")
+        new_cols = [(i, c) for i, c in enumerate(other_header) if c not in header]
+        by_geo = {row[other_geo_idx]: row for row in other_rows}
+
+        header = header + [c for _, c in new_cols]
+        for row in rows:
+            match = by_geo.get(row[geo_idx])
+            row.extend(match[i] if match is not None else None for i, _ in new_cols)
+
+    return [header, *rows]
@@ -0,0 +1,229 @@
+"""Wall-clock time spent in each stage of a run.
+
+    timer = StageTimer()
+    with timer.stage("fetch"):
+        ...
+    print(timer.report())
+
+A stage entered more than once adds up. Stages can overlap -- ingest runs in
+a worker thread while the fetch is still going -- so the stages can add up
+to more than the run took.
+
+A Profiler is a StageTimer that also keeps the nesting and timing of every
+stage, every attempt `request_manager` makes (latency, queue wait, bytes,
+outcome), and optionally a cProfile of the CPU-bound stages. It writes all
+of that as JSON, or as a Chrome trace for chrome://tracing or Perfetto.
+This is what `tablecensus assemble --profile` uses.
+
+The timer of the run in progress is found through 'active_timer', so code
+deep in the fetch can report to it without having it passed down.
+"""
+
+import cProfile
+import json
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .cache import strip_api_key
+
+
+_active: ContextVar["StageTimer | None"] = ContextVar("tablecensus_timer", default=None)
+
+
+def active_timer() -> "StageTimer | None":
+    return _active.get()
+
+
+class StageTimer:
+    def __init__(self):
+        self.stages: dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    @contextmanager
+    def activate(self):
+        """Makes this the timer 'active_timer' returns, for the block."""
+        token = _active.set(self)
+        try:
+            yield self
+        finally:
+            _active.reset(token)
+
+    def add(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def record_request(self, **details) -> None:
+        """One attempt at one API call. Only a Profiler keeps these."""
+
+    def report(self) -> str:
+        width = max((len(name) for name in self.stages), default=0)
+        return "\n".join(
+            f"  {name:<{width}}  {seconds:8.3f}s" for name, seconds in self.stages.items()
+        )
+
+
+# Stages that are all CPU, as opposed to waiting on the network. Ingest runs
+# on a worker thread, which cProfile can't follow.
+CPU_STAGES = {"read", "plan", "namespace", "eval", "unwrap", "write"}
+
+
+@dataclass
+class Span:
+    name: str
+    start: float
+    thread: str
+    end: float | None = None
+    children: list["Span"] = field(default_factory=list)
+
+    def as_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "start": round(self.start, 6),
+            "duration": round((self.end or self.start) - self.start, 6),
+            "thread": self.thread,
+            "children": [child.as_dict() for child in self.children],
+        }
+
+
+class Profiler(StageTimer):
+    def __init__(self, cpu: bool = False):
+        super().__init__()
+        self.origin = time.perf_counter()
+        self.spans: list[Span] = []
+        self.requests: list[dict] = []
+        self.cpu = cProfile.Profile() if cpu else None
+        self._open = threading.local()
+        self._lock = threading.Lock()
+
+    def _now(self) -> float:
+        return time.perf_counter() - self.origin
+
+    @contextmanager
+    def stage(self, name: str):
+        stack = self._open.__dict__.setdefault("stack", [])
+        span = Span(name, self._now(), threading.current_thread().name)
+        with self._lock:
+            (stack[-1].children if stack else self.spans).append(span)
+        stack.append(span)
+
+        profiling = (
+            self.cpu is not None and name in CPU_STAGES and len(stack) == 1
+            and threading.current_thread() is threading.main_thread()
+        )
+        if profiling:
+            self.cpu.enable()
+        try:
+            with super().stage(name):
+                yield
+        finally:
+            if profiling:
+                self.cpu.disable()
+            span.end = self._now()
+            stack.pop()
+
+    def record_request(self, *, label, url, attempt, depth, started, finished, waited,
+                       outcome, size) -> None:
+        with self._lock:
+            self.requests.append({
+                "label": list(label) if isinstance(label, tuple) else label,
+                "url": strip_api_key(url),
+                "attempt": attempt,
+                "split_depth": depth,
+                "start": round(started - self.origin, 6),
+                "latency": round(finished - started - waited, 6),
+                "queue_wait": round(waited, 6),
+                "outcome": outcome,
+                "bytes": size,
+            })
+
+    def summary(self) -> dict:
+        latencies = sorted(r["latency"] for r in self.requests)
+        return {
+            "attempts": len(self.requests),
+            "retries": sum(1 for r in self.requests if r["attempt"] > 0),
+            "failed_attempts": sum(1 for r in self.requests if r["outcome"] != "ok"),
+            "bytes": sum(r["bytes"] or 0 for r in self.requests),
+            "median_latency": latencies[len(latencies) // 2] if latencies else None,
+            "max_latency": latencies[-1] if latencies else None,
+            "total_queue_wait": round(sum(r["queue_wait"] for r in self.requests), 6),
+        }
+
+    def as_dict(self) -> dict:
+        return {
+            "stages": [span.as_dict() for span in self.spans],
+            "totals": self.stages,
+            "requests": self.requests,
+            "summary": self.summary(),
+        }
+
+    def chrome_trace(self) -> dict:
+        """Trace Event Format: stages on their threads, requests on lanes."""
+        events = []
+        threads = {}
+
+        def tid(thread):
+            return threads.setdefault(thread, len(threads) + 1)
+
+        def walk(span):
+            events.append({
+                "name": span.name, "cat": "stage", "ph": "X", "pid": 1,
+                "tid": tid(span.thread),
+                "ts": span.start * 1e6, "dur": ((span.end or span.start) - span.start) * 1e6,
+            })
+            for child in span.children:
+                walk(child)
+
+        for span in self.spans:
+            walk(span)
+
+        # Overlapping requests go on separate lanes so the viewer can show them.
+        lanes = []
+        for request in sorted(self.requests, key=lambda r: r["start"]):
+            start = request["start"] + request["queue_wait"]
+            end = start + request["latency"]
+            lane = next((i for i, free in enumerate(lanes) if free <= request["start"]), None)
+            if lane is None:
+                lane = len(lanes)
+                lanes.append(0.0)
+            lanes[lane] = end
+
+            lane_tid = tid(f"request lane {lane + 1}")
+            if request["queue_wait"] > 0:
+                events.append({
+                    "name": "queued", "cat": "wait", "ph": "X", "pid": 1, "tid": lane_tid,
+                    "ts": request["start"] * 1e6, "dur": request["queue_wait"] * 1e6,
+                })
+            events.append({
+                "name": request["outcome"], "cat": "request", "ph": "X", "pid": 1, "tid": lane_tid,
+                "ts": start * 1e6, "dur": request["latency"] * 1e6,
+                "args": {k: request[k] for k in ("label", "url", "attempt", "bytes")},
+            })
+
+        events.extend(
+            {"name": "thread_name", "ph": "M", "pid": 1, "tid": i, "args": {"name": name}}
+            for name, i in threads.items()
+        )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write(self, path: Path, format: str = "json") -> list[Path]:
+        """Writes the profile, plus a .prof file if CPU profiling was on."""
+        path = Path(path)
+        body = self.chrome_trace() if format == "chrome" else self.as_dict()
+        path.write_text(json.dumps(body, indent=None if format == "chrome" else 2))
+
+        written = [path]
+        if self.cpu is not None:
+            cpu_path = path.with_suffix(".prof")
+            self.cpu.dump_stats(cpu_path)
+            written.append(cpu_path)
+        return written
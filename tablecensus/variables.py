@@ -1,22 +1,27 @@
 import ast
 
+import numpy as np
 import pandas as pd
-from .census_value import CensusValue
+from .census_value import CensusArray, CensusValue
 
 
-def extract_names(expr: str) -> set[str]:
-    if pd.isna(expr) or not expr.strip():
+def parse_calculation(expr: str) -> ast.Expression:
+    if pd.isna(expr) or not str(expr).strip():
         raise ValueError("Empty or missing calculation")
-    
+
     try:
-        tree = ast.parse(str(expr).strip(), mode="eval")
-        return {node.id for node in ast.walk(tree) if isinstance(node, ast.Name)}
+        return ast.parse(str(expr).strip(), mode="eval")
     except SyntaxError as e:
         raise ValueError(f"Invalid calculation syntax: '{expr}'. Error: {e}")
     except Exception as e:
         raise ValueError(f"Error parsing calculation '{expr}': {e}")
 
 
+def extract_names(expr: str) -> set[str]:
+    tree = parse_calculation(expr)
+    return {node.id for node in ast.walk(tree) if isinstance(node, ast.Name)}
+
+
 def collect_variables(indicators: pd.DataFrame) -> set:
     """
     'indicators' is the list of equations that comes out of the tablecensus
@@ -101,6 +106,50 @@ def create_namespace(raw_census: pd.DataFrame, variables: list[str]) -> pd.DataF
     return pd.DataFrame({**header, **value_columns})
 
 
+def wrap_census_arrays(raw_census: pd.DataFrame, v) -> CensusArray:
+    table = v[:-3]
+    estimate_col = f"{table}_{v[-3:]}E"
+    error_col = f"{table}_{v[-3:]}M"
+
+    def column(name):
+        # A code none of these years publishes was never asked for.
+        if name not in raw_census:
+            return np.full(len(raw_census), np.nan)
+        return raw_census[name].to_numpy(dtype="float64", na_value=np.nan)
+
+    return CensusArray(column(estimate_col), column(error_col), table)
+
+
+def create_array_namespace(raw_census: pd.DataFrame, variables: list[str]) -> dict[str, CensusArray]:
+    return {v: wrap_census_arrays(raw_census, v) for v in variables}
+
+
+def moe_column_name(col: str) -> str:
+    # "snake_case" -> append '_moe'
+    # "readable" -> append ' MOE'
+    if '_' in col or col.islower():
+        return f"{col}_moe"
+    return f"{col} MOE"
+
+
+def unwrap_arrays(header: pd.DataFrame, results: dict) -> pd.DataFrame:
+    """
+    The columnar counterpart of 'unwrap_calculations': each CensusArray
+    result becomes an estimate column and a MOE column next to the header.
+    """
+    unwrapped_data = {col: header[col].to_numpy() for col in header.columns}
+
+    for col, result in results.items():
+        if isinstance(result, CensusArray):
+            unwrapped_data[col] = result.estimate
+            unwrapped_data[moe_column_name(col)] = result.error
+        else:
+            # A calculation with no census variables in it is just a number.
+            unwrapped_data[col] = np.full(len(header), result)
+
+    return pd.DataFrame(unwrapped_data)
+
+
 def unwrap_calculations(results: pd.DataFrame, variables: pd.DataFrame) -> pd.DataFrame:
     """
     Takes a frame that has named equations that are of the 'census_value' type
@@ -130,12 +179,7 @@ def unwrap_calculations(results: pd.DataFrame, variables: pd.DataFrame) -> pd.Da
             errors = col_data.apply(lambda cv: cv.error)
             
             # Determine MOE column naming convention based on variable name
-            if '_' in col or col.islower():
-                # snake_case pattern - append '_moe'
-                moe_col = f"{col}_moe"
-            else:
-                # readable pattern - append ' MOE'
-                moe_col = f"{col} MOE"
+            moe_col = moe_column_name(col)
             
             unwrapped_data[col] = estimates
             unwrapped_data[moe_col] = errors
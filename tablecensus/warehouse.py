@@ -0,0 +1,229 @@
+"""Keep every fetched ACS cell locally, so later pulls only ask for what's new.
+
+The response cache in `cache.py` only helps when a URL repeats exactly. Data
+dictionaries rarely do that -- they share most of their table stems but mix
+them with different geographies and different neighbours in each call. The
+warehouse stores values one cell at a time, keyed by
+
+    (year, release, GEO_ID, variable code)
+
+so that any later call plan can be checked against it cell by cell, and only
+the (geography, variable, year) combinations nobody has fetched yet turn into
+API calls.
+
+Wildcard geography parts ("tract:*") do not name their GEO_IDs up front, so
+the warehouse also remembers which GEO_IDs each geography part returned. A
+part that has never been fetched is entirely missing.
+
+Values are kept as the strings the API returned, so a payload rebuilt from
+the warehouse parses exactly like one fresh from the network. Codes the API
+refused for a geography part are kept as empty cells, and remembered, so a
+later run served from here still reports them.
+"""
+
+import sqlite3
+from pathlib import Path
+
+from .config import cache_dir
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cells (
+    year INTEGER NOT NULL,
+    release TEXT NOT NULL,
+    geo_id TEXT NOT NULL,
+    variable TEXT NOT NULL,
+    value TEXT,
+    PRIMARY KEY (year, release, geo_id, variable)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS names (
+    year INTEGER NOT NULL,
+    release TEXT NOT NULL,
+    geo_id TEXT NOT NULL,
+    name TEXT,
+    PRIMARY KEY (year, release, geo_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS geo_parts (
+    year INTEGER NOT NULL,
+    release TEXT NOT NULL,
+    geo_part TEXT NOT NULL,
+    geo_id TEXT NOT NULL,
+    PRIMARY KEY (year, release, geo_part, geo_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS rejected (
+    year INTEGER NOT NULL,
+    release TEXT NOT NULL,
+    geo_part TEXT NOT NULL,
+    variable TEXT NOT NULL,
+    PRIMARY KEY (year, release, geo_part, variable)
+) WITHOUT ROWID;
+"""
+
+# Stay well under SQLite's bound-parameter limit on older builds.
+MAX_PARAMS = 500
+
+
+def _chunk(lst, n):
+    for i in range(0, len(lst), n):
+        yield lst[i : i + n]
+
+
+class Warehouse:
+    def __init__(self, path: Path, read: bool = True):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.read = read
+        # Responses are stored from a worker thread while they stream in; the
+        # callers never touch the connection from two threads at once.
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def _geo_ids(self, geo_part, year, release) -> list[str]:
+        rows = self.connection.execute(
+            "SELECT geo_id FROM geo_parts WHERE year = ? AND release = ? AND geo_part = ? "
+            "ORDER BY geo_id",
+            (int(year), release, geo_part),
+        )
+        return [geo_id for (geo_id,) in rows]
+
+    def missing(self, geo_part, year, release, codes: list[str]) -> list[str]:
+        """The codes that have to be fetched for this geography part."""
+        if not self.read:
+            return list(codes)
+
+        expected = len(self._geo_ids(geo_part, year, release))
+        if not expected:
+            return list(codes)
+
+        counts = {}
+        for batch in _chunk(list(codes), MAX_PARAMS):
+            marks = ",".join("?" * len(batch))
+            counts.update(self.connection.execute(
+                "SELECT c.variable, COUNT(*) FROM geo_parts g "
+                "JOIN cells c ON c.year = g.year AND c.release = g.release "
+                "AND c.geo_id = g.geo_id "
+                "WHERE g.year = ? AND g.release = ? AND g.geo_part = ? "
+                f"AND c.variable IN ({marks}) GROUP BY c.variable",
+                (int(year), release, geo_part, *batch),
+            ))
+
+        return [code for code in codes if counts.get(code, 0) < expected]
+
+    def split(self, needs: dict[tuple, list[str]]) -> tuple[dict, dict]:
+        """
+        Splits a needs mapping into the codes held here and the codes still
+        to fetch, per label. Labels with nothing in a half are left out of it.
+        """
+        held, missing = {}, {}
+        for label, codes in needs.items():
+            absent = self.missing(*label, codes)
+            present = [c for c in codes if c not in absent]
+            if present:
+                held[label] = present
+            if absent:
+                missing[label] = absent
+        return held, missing
+
+    def rejections(self, needs: dict[tuple, list[str]]) -> list[tuple]:
+        """(label, codes) for the codes in 'needs' the API refused when they were fetched."""
+        found = []
+        for (geo_part, year, release), codes in needs.items():
+            refused = {
+                variable for (variable,) in self.connection.execute(
+                    "SELECT variable FROM rejected WHERE year = ? AND release = ? "
+                    "AND geo_part = ?",
+                    (int(year), release, geo_part),
+                )
+            }
+            dropped = [code for code in codes if code in refused]
+            if dropped:
+                found.append(((geo_part, year, release), dropped))
+        return found
+
+    def payload(self, geo_part, year, release, codes: list[str]) -> list[list]:
+        """Rebuild an API-shaped response (header row, then data rows)."""
+        geo_ids = self._geo_ids(geo_part, year, release)
+        names = dict(self.connection.execute(
+            "SELECT n.geo_id, n.name FROM geo_parts g "
+            "JOIN names n ON n.year = g.year AND n.release = g.release "
+            "AND n.geo_id = g.geo_id "
+            "WHERE g.year = ? AND g.release = ? AND g.geo_part = ?",
+            (int(year), release, geo_part),
+        ))
+
+        values = {}
+        for batch in _chunk(list(codes), MAX_PARAMS):
+            marks = ",".join("?" * len(batch))
+            for geo_id, variable, value in self.connection.execute(
+                "SELECT c.geo_id, c.variable, c.value FROM geo_parts g "
+                "JOIN cells c ON c.year = g.year AND c.release = g.release "
+                "AND c.geo_id = g.geo_id "
+                "WHERE g.year = ? AND g.release = ? AND g.geo_part = ? "
+                f"AND c.variable IN ({marks})",
+                (int(year), release, geo_part, *batch),
+            ):
+                values[(geo_id, variable)] = value
+
+        header = ["GEO_ID", "NAME", *codes]
+        rows = [
+            [geo_id, names.get(geo_id), *(values.get((geo_id, c)) for c in codes)]
+            for geo_id in geo_ids
+        ]
+        return [header, *rows]
+
+    def store(self, responses, variable_codes, rejected: dict | None = None) -> None:
+        """
+        Write every requested cell from a list of (label, payload) responses.
+        'rejected' maps a label to the codes the API refused for it; their
+        empty cells are marked as such (see 'rejections').
+        """
+        wanted = set(variable_codes)
+        rejected = rejected or {}
+
+        with self.connection:
+            for (geo_part, year, release), data in responses:
+                refused = rejected.get((geo_part, year, release), ())
+                try:
+                    columns, *rows = data
+                    geo_idx = columns.index("GEO_ID")
+                except (TypeError, ValueError):
+                    continue
+
+                year = int(year)
+                name_idx = columns.index("NAME") if "NAME" in columns else None
+                value_idx = [(i, c) for i, c in enumerate(columns) if c in wanted]
+
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO cells VALUES (?, ?, ?, ?, ?)",
+                    (
+                        (year, release, row[geo_idx], code, row[i])
+                        for row in rows
+                        for i, code in value_idx
+                    ),
+                )
+                if name_idx is not None:
+                    self.connection.executemany(
+                        "INSERT OR REPLACE INTO names VALUES (?, ?, ?, ?)",
+                        ((year, release, row[geo_idx], row[name_idx]) for row in rows),
+                    )
+                self.connection.executemany(
+                    "INSERT OR IGNORE INTO geo_parts VALUES (?, ?, ?, ?)",
+                    ((year, release, geo_part, row[geo_idx]) for row in rows),
+                )
+                self.connection.executemany(
+                    "INSERT OR IGNORE INTO rejected VALUES (?, ?, ?, ?)",
+                    ((year, release, geo_part, code) for code in refused),
+                )
+
+
+def open_warehouse(mode: str = "use") -> Warehouse | None:
+    """Follows the same modes as `cache.open_cache`."""
+    if mode == "off":
+        return None
+    return Warehouse(cache_dir() / "warehouse.sqlite3", read=(mode == "use"))
@@ -0,0 +1,123 @@
+from unittest.mock import patch
+from urllib.parse import unquote
+
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+
+from tablecensus import main
+from tablecensus.assemble import assemble_from
+from tablecensus.batch import BatchEntry, assemble_batch, load_manifest, merge_needs
+from tablecensus.fake_api import respond
+from tablecensus.request_prep import query_param
+
+
+def fake_populate(calls, **_):
+    return [
+        (label, respond(
+            str(label[1]),
+            unquote(query_param(url, "get")),
+            query_param(url, "for"),
+            query_param(url, "in") or "",
+        ))
+        for label, url in calls
+    ]
+
+
+def write_dictionary(path, variables, counties=("163", "099")):
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        pd.DataFrame(variables, columns=["name", "calculation"]).to_excel(
+            writer, sheet_name="Variables", index=False
+        )
+        pd.DataFrame({"year": [2022], "release": ["acs5"]}).to_excel(
+            writer, sheet_name="Years", index=False
+        )
+        pd.DataFrame({"state": ["26"] * len(counties), "county": list(counties)}).to_excel(
+            writer, sheet_name="Geographies", index=False
+        )
+
+
+POVERTY = [("poverty_rate", "B17001002 / B17001001")]
+POPULATION = [("population", "B01001001"), ("poverty_count", "B17001002")]
+
+
+def test_merged_needs_ask_for_each_code_once():
+    label = ("for=county:163&in=state:26", 2022, "acs5")
+    other = ("for=county:*&in=state:26", 2022, "acs5")
+
+    merged = merge_needs([{label: ["A", "B"]}, {label: ["B", "C"], other: ["A"]}])
+
+    assert merged == {label: ["A", "B", "C"], other: ["A"]}
+
+
+@patch("tablecensus.request_prep.get_api_key", return_value="test_key")
+@patch("tablecensus.assemble.populate_data", side_effect=fake_populate)
+def test_reports_match_separate_runs_with_one_fetch(populate, _, tmp_path):
+    write_dictionary(tmp_path / "poverty.xlsx", POVERTY)
+    write_dictionary(tmp_path / "population.xlsx", POPULATION)
+    entries = [
+        BatchEntry(tmp_path / f"{name}.xlsx", tmp_path / f"{name}.csv")
+        for name in ("poverty", "population")
+    ]
+
+    reports = dict(assemble_batch(entries, cache_mode="off"))
+
+    (calls,), _ = populate.call_args
+    assert populate.call_count == 1
+    assert len(calls) == 1
+    for entry in entries:
+        pd.testing.assert_frame_equal(
+            reports[entry], assemble_from(entry.dictionary, cache_mode="off")
+        )
+
+
+def test_manifest_paths_are_relative_to_it(tmp_path):
+    manifest = tmp_path / "nightly.toml"
+    manifest.write_text('[[report]]\ndictionary = "a.xlsx"\noutput = "out/a.csv"\n')
+
+    assert load_manifest(manifest) == [BatchEntry(tmp_path / "a.xlsx", tmp_path / "out" / "a.csv")]
+
+    manifest.write_text('[[report]]\ndictionary = "a.xlsx"\n')
+    with pytest.raises(ValueError, match="needs a 'dictionary' and an 'output'"):
+        load_manifest(manifest)
+
+
+@patch("tablecensus.request_prep.get_api_key", return_value="test_key")
+@patch("tablecensus.assemble.populate_data", side_effect=fake_populate)
+def test_a_broken_dictionary_does_not_stop_the_rest(_, __, tmp_path):
+    write_dictionary(tmp_path / "poverty.xlsx", POVERTY)
+    (tmp_path / "broken.xlsx").write_text("not a workbook")
+
+    result = CliRunner().invoke(main, [
+        "batch", str(tmp_path), "--output-dir", str(tmp_path / "out"), "--format", "csv", "--no-cache",
+    ])
+
+    assert result.exit_code == 1
+    assert "1 of 2 dictionaries failed" in result.output
+    [written] = (tmp_path / "out").glob("report_poverty_*.csv")
+    assert len(pd.read_csv(written)) == 2
+
+
+@patch("tablecensus.request_prep.get_api_key", return_value="test_key")
+@patch("tablecensus.assemble.populate_data", side_effect=fake_populate)
+def test_variable_lists_are_downloaded_once_per_batch(_, __, tmp_path, monkeypatch):
+    monkeypatch.setenv("CENSUS_PREFLIGHT", "1")
+    downloads = []
+
+    def download(year, release):
+        downloads.append((year, release))
+        return {"variables": {
+            code: {} for code in ("B01001_001E", "B01001_001M", "B17001_001E", "B17001_001M",
+                                  "B17001_002E", "B17001_002M")
+        }}
+
+    monkeypatch.setattr("tablecensus.catalog.download_variables", download)
+    entries = []
+    for i in range(3):
+        write_dictionary(tmp_path / f"d{i}.xlsx", POVERTY if i % 2 else POPULATION)
+        entries.append(BatchEntry(tmp_path / f"d{i}.xlsx", tmp_path / f"d{i}.csv"))
+
+    results = list(assemble_batch(entries, cache_mode="off"))
+
+    assert not any(isinstance(report, Exception) for _, report in results)
+    assert downloads == [(2022, "acs5")]
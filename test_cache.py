@@ -0,0 +1,122 @@
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+from tablecensus.cache import ResponseCache, cache_key, open_cache, strip_api_key
+from tablecensus.request_manager import manage_requests
+
+
+URL = (
+    "https://api.census.gov/data/2022/acs/acs5"
+    "?get=GEO_ID,NAME,B01001_001E&for=county:163&in=state:26&key=secret"
+)
+PAYLOAD = [["GEO_ID", "NAME", "B01001_001E"], ["0500000US26163", "Wayne County, Michigan", "1749343"]]
+
+
+def test_strip_api_key():
+    assert "secret" not in strip_api_key(URL)
+    assert strip_api_key(URL).endswith("in=state:26")
+
+
+def test_key_ignores_api_key():
+    assert cache_key(URL) == cache_key(URL.replace("secret", "another"))
+    assert cache_key(URL) != cache_key(URL.replace("163", "099"))
+
+
+def test_round_trip(tmp_path):
+    cache = ResponseCache(tmp_path, ttl_days=1, max_size_mb=10)
+    assert cache.get(URL) is None
+
+    cache.put(URL, PAYLOAD)
+    assert cache.get(URL) == PAYLOAD
+    assert cache.hits == 1
+
+
+def test_expired_entries_miss(tmp_path):
+    cache = ResponseCache(tmp_path, ttl_days=1, max_size_mb=10)
+    cache.put(URL, PAYLOAD)
+
+    path = next(tmp_path.glob("*/*.json.gz"))
+    old = time.time() - 2 * 24 * 60 * 60
+    os.utime(path, (old, old))
+
+    assert cache.get(URL) is None
+
+
+def test_reading_an_entry_does_not_extend_its_ttl(tmp_path):
+    cache = ResponseCache(tmp_path, ttl_days=1, max_size_mb=10)
+    cache.put(URL, PAYLOAD)
+
+    path = next(tmp_path.glob("*/*.json.gz"))
+    written = time.time() - 0.75 * 24 * 60 * 60
+    os.utime(path, (written, written))
+
+    assert cache.get(URL) == PAYLOAD
+    assert path.stat().st_mtime == pytest.approx(written)
+    assert path.stat().st_atime > written
+
+    os.utime(path, (time.time(), written - 0.5 * 24 * 60 * 60))
+    assert cache.get(URL) is None
+
+
+def test_refresh_mode_writes_without_reading(isolated_config):
+    open_cache("use").put(URL, PAYLOAD)
+
+    assert open_cache("refresh").get(URL) is None
+    assert open_cache("use").get(URL) == PAYLOAD
+    assert open_cache("off") is None
+
+
+def test_evict_least_recently_used(tmp_path):
+    cache = ResponseCache(tmp_path, ttl_days=1, max_size_mb=10)
+    urls = [URL.replace("163", code) for code in ("001", "003", "005")]
+    for i, url in enumerate(urls):
+        cache.put(url, PAYLOAD)
+        path = cache._path(url)
+        os.utime(path, (1000 + i, 1000 + i))
+
+    # Keep room for exactly two entries.
+    cache.max_bytes = 2 * cache._path(urls[0]).stat().st_size
+    assert cache.evict() == 1
+
+    assert not cache._path(urls[0]).exists()
+    assert cache._path(urls[2]).exists()
+
+
+def test_cached_requests_are_not_sent(tmp_path):
+    cache = ResponseCache(tmp_path, ttl_days=1, max_size_mb=10)
+    cache.put(URL, PAYLOAD)
+
+    # Served straight from disk; nothing goes out to api.census.gov.
+    ok, errors = asyncio.run(manage_requests([("label", URL)], cache))
+
+    assert errors == []
+    assert ok == [("label", PAYLOAD)]
+
+
+def test_threads_storing_one_url_at_once(tmp_path):
+    cache = ResponseCache(tmp_path, ttl_days=1, max_size_mb=10)
+    payload = PAYLOAD * 2000
+    barrier = threading.Barrier(8)
+    errors = []
+
+    def store():
+        barrier.wait()
+        try:
+            for _ in range(5):
+                cache.put(URL, payload)
+        except OSError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=store) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert cache.get(URL) == payload
+    assert list(tmp_path.glob("*/*.tmp")) == []
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from tablecensus.calculations import Node, compile_calculations
+from tablecensus.census_value import CensusArray
+
+
+@pytest.fixture
+def namespace():
+    return {
+        "B17001001": CensusArray(np.array([1000.0, 500.0]), np.array([50.0, 40.0]), "B17001"),
+        "B17001002": CensusArray(np.array([100.0, 50.0]), np.array([10.0, 8.0]), "B17001"),
+        "B17001003": CensusArray(np.array([60.0, 20.0]), np.array([6.0, 4.0]), "B17001"),
+    }
+
+
+def test_shared_subexpressions_become_one_node():
+    plan = compile_calculations(pd.DataFrame({
+        "name": ["a", "b", "c"],
+        "calculation": [
+            "(B17001002 + B17001003) / B17001001",
+            "(B17001003 + B17001002) / B17001001 * 100",
+            "B17001002 / B17001001",
+        ],
+    }))
+
+    sums = [n for n in plan.nodes if n.op == "+"]
+    divisions = [n for n in plan.nodes if n.op == "/"]
+    assert len(sums) == 1
+    assert len(divisions) == 2
+    denominator = plan.nodes.index(Node("var", ("B17001001",)))
+    assert plan.use_counts()[denominator] == 2
+
+
+def test_constants_are_folded():
+    plan = compile_calculations(pd.DataFrame({
+        "name": ["pct"], "calculation": ["B17001002 / B17001001 * (50 + 50)"],
+    }))
+
+    assert [n.args[0] for n in plan.nodes if n.op == "const"] == [50, 100]
+
+
+def test_evaluate_matches_direct_arithmetic(namespace):
+    plan = compile_calculations(pd.DataFrame({
+        "name": ["rate", "combined", "negated"],
+        "calculation": ["B17001002 / B17001001", "B17001002 + B17001003", "-B17001002"],
+    }))
+
+    results = plan.evaluate(namespace)
+
+    expected = namespace["B17001002"] / namespace["B17001001"]
+    np.testing.assert_allclose(results["rate"].estimate, expected.estimate)
+    np.testing.assert_allclose(results["rate"].error, expected.error)
+    np.testing.assert_allclose(results["combined"].estimate, [160.0, 70.0])
+    np.testing.assert_allclose(results["negated"].estimate, [-100.0, -50.0])
+    np.testing.assert_allclose(results["negated"].error, [10.0, 8.0])
+
+
+def test_single_variable_output(namespace):
+    plan = compile_calculations(pd.DataFrame({"name": ["total"], "calculation": ["B17001001"]}))
+    assert plan.evaluate(namespace)["total"] is namespace["B17001001"]
+
+
+def test_unsupported_syntax():
+    with pytest.raises(ValueError, match="Unsupported expression"):
+        compile_calculations(pd.DataFrame({"name": ["x"], "calculation": ["B17001001 ** 2"]}))
+
+
+def test_constant_division_by_zero():
+    with pytest.raises(ValueError, match="❌ .*divides by zero"):
+        compile_calculations(pd.DataFrame({"name": ["x"], "calculation": ["B17001001 * (1 / 0)"]}))
+
+
+def test_report_marks_shared_nodes():
+    plan = compile_calculations(pd.DataFrame({
+        "name": ["a", "b"],
+        "calculation": ["B17001002 / B17001001", "B17001003 / B17001001"],
+    }))
+
+    report = plan.report()
+    assert report.startswith("Calculation plan: 2 indicators from 3 census variables in 2 operations")
+    assert "used 2x" in report
+    assert "-> a" in report
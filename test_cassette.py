@@ -0,0 +1,85 @@
+import asyncio
+import gzip
+import json
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from tablecensus.assemble import assemble_from
+from tablecensus.cache import ResponseCache
+from tablecensus.cassette import Recorder, Replay
+from tablecensus.request_manager import RequestError, manage_requests
+
+
+URL = (
+    "https://api.census.gov/data/2022/acs/acs5"
+    "?get=GEO_ID,NAME,B01001_001E&for=county:163&in=state:26&key=secret"
+)
+LABEL = ("for=county:163&in=state:26", 2022, "acs5")
+PAYLOAD = [["GEO_ID", "NAME", "B01001_001E"], ["0500000US26163", "Wayne County, Michigan", "1749343"]]
+
+
+def test_recording_leaves_out_the_key(tmp_path):
+    recorder = Recorder(tmp_path / "run.jsonl.gz")
+    recorder.record(LABEL, URL, PAYLOAD)
+    recorder.close()
+
+    with gzip.open(tmp_path / "run.jsonl.gz", "rt") as f:
+        [entry] = [json.loads(line) for line in f]
+
+    assert "secret" not in entry["url"]
+    assert entry["label"] == list(LABEL)
+    assert Replay(tmp_path / "run.jsonl.gz").get(URL.replace("secret", "other")) == PAYLOAD
+
+
+def test_record_then_replay_offline(tmp_path):
+    cache = ResponseCache(tmp_path / "cache", ttl_days=1, max_size_mb=10)
+    cache.put(URL, PAYLOAD)
+
+    recorder = Recorder(tmp_path / "run.jsonl.gz")
+    asyncio.run(manage_requests([(LABEL, URL)], cache, recorder=recorder))
+    recorder.close()
+
+    replay = Replay(tmp_path / "run.jsonl.gz")
+    with patch("tablecensus.request_manager.ClientSession") as session:
+        ok, errors = asyncio.run(manage_requests(
+            [(LABEL, URL), (LABEL, URL.replace("163", "099"))], replay=replay
+        ))
+
+    session.assert_not_called()
+    assert ok == [(LABEL, PAYLOAD)]
+    assert len(errors) == 1 and isinstance(errors[0], RequestError)
+    assert "replay archive" in str(errors[0])
+
+
+def test_missing_archive():
+    with pytest.raises(FileNotFoundError, match="Replay archive not found"):
+        Replay("nowhere.jsonl.gz")
+
+
+@patch("tablecensus.request_prep.get_api_key", return_value=None)
+def test_replay_needs_no_api_key(_, tmp_path):
+    dictionary = tmp_path / "dictionary.xlsx"
+    with pd.ExcelWriter(dictionary, engine="openpyxl") as writer:
+        pd.DataFrame({"name": ["population"], "calculation": ["B01001001"]}).to_excel(
+            writer, sheet_name="Variables", index=False
+        )
+        pd.DataFrame({"year": [2022], "release": ["acs5"]}).to_excel(
+            writer, sheet_name="Years", index=False
+        )
+        pd.DataFrame({"state": ["26"], "county": ["163"]}).to_excel(
+            writer, sheet_name="Geographies", index=False
+        )
+
+    archive = tmp_path / "run.jsonl.gz"
+    recorder = Recorder(archive)
+    recorder.record(LABEL, URL.replace("B01001_001E", "B01001_001E,B01001_001M"), [
+        ["GEO_ID", "NAME", "B01001_001E", "B01001_001M"],
+        ["0500000US26163", "Wayne County, Michigan", "1749343", "20"],
+    ])
+    recorder.close()
+
+    result = assemble_from(dictionary, replay=archive)
+
+    assert list(result["population"]) == [1749343]
@@ -0,0 +1,127 @@
+from unittest.mock import patch
+
+import pytest
+from click.testing import CliRunner
+
+from tablecensus import main
+from tablecensus.catalog import Catalog, open_catalog, preflight
+
+
+def document(*tables):
+    variables = {"NAME": {"label": "Geographic Area Name"}}
+    for table, cells in tables:
+        for cell in range(1, cells + 1):
+            code = f"{table}_{cell:03d}"
+            variables[f"{code}E"] = {
+                "label": f"Estimate!!Total:!!Cell {cell}",
+                "concept": "Poverty Status by Sex" if table == "B17001" else "Sex by Age",
+            }
+            variables[f"{code}M"] = {"label": f"Margin of Error!!Total:!!Cell {cell}"}
+            variables[f"{code}EA"] = {"label": f"Annotation of Estimate!!Total:!!Cell {cell}"}
+    return {"variables": variables}
+
+
+LISTS = {
+    (2019, "acs5"): document(("B01001", 3)),
+    (2023, "acs5"): document(("B01001", 3), ("B17001", 2)),
+}
+
+
+@pytest.fixture
+def preflight_on(monkeypatch):
+    monkeypatch.setenv("CENSUS_PREFLIGHT", "1")
+    downloads = []
+
+    def download(year, release, base_url=None):
+        downloads.append((year, release))
+        return LISTS.get((int(year), release))
+
+    monkeypatch.setattr("tablecensus.catalog.download_variables", download)
+    return downloads
+
+
+def test_variable_list_is_indexed_by_dictionary_code(tmp_path):
+    catalog = Catalog(tmp_path / "catalog.sqlite3")
+    assert catalog.store(2023, "acs5", LISTS[2023, "acs5"]) == 5
+
+    assert catalog.search("b01001_00", 2023, "acs5") == [
+        ("B01001001", "Total: > Cell 1", "Sex by Age"),
+        ("B01001002", "Total: > Cell 2", "Sex by Age"),
+        ("B01001003", "Total: > Cell 3", "Sex by Age"),
+    ]
+    assert [code for code, _, _ in catalog.search("poverty cell 2", 2023, "acs5")] == ["B17001002"]
+    assert "B17001_002M" in catalog.api_codes(2023, "acs5")
+    assert catalog.latest("acs5") == 2023
+
+
+def test_preflight_drops_codes_a_year_lacks(preflight_on):
+    needs = {
+        ("for=county:163&in=state:26", 2019, "acs5"): ["B01001_001E", "B01001_001M", "B17001_001E"],
+        ("for=county:163&in=state:26", 2023, "acs5"): ["B01001_001E", "B01001_001M", "B17001_001E"],
+    }
+
+    assert preflight(needs) == {
+        ("for=county:163&in=state:26", 2019, "acs5"): ["B01001_001E", "B01001_001M"],
+        ("for=county:163&in=state:26", 2023, "acs5"): ["B01001_001E", "B01001_001M", "B17001_001E"],
+    }
+    # Downloaded once, then served from the index.
+    preflight(needs)
+    assert preflight_on == [(2019, "acs5"), (2023, "acs5")]
+
+
+def test_preflight_without_cache_still_checks(preflight_on, isolated_config):
+    needs = {("for=state:26", 2023, "acs5"): ["B01001_999E"]}
+
+    for _ in range(2):
+        with pytest.raises(ValueError, match="B01001999"):
+            preflight(needs, cache_mode="off")
+    # Downloaded each time, and nothing written to the cache folder.
+    assert preflight_on == [(2023, "acs5")] * 2
+    assert not (isolated_config.parent / "cache" / "catalog.sqlite3").exists()
+
+
+def test_preflight_stops_on_codes_no_year_has(preflight_on):
+    needs = {("for=state:26", 2023, "acs5"): ["B01001_001E", "B01001_999E", "B01001_999M"]}
+
+    with pytest.raises(ValueError, match="B01001999"):
+        preflight(needs)
+
+
+def test_unavailable_list_leaves_codes_unchecked(preflight_on):
+    needs = {("for=state:26", 2010, "acs5"): ["B01001_999E"]}
+    assert preflight(needs) == needs
+
+
+@patch("tablecensus.request_prep.get_api_key", return_value="test_key")
+@patch("tablecensus.assemble.populate_data")
+def test_bad_code_is_never_sent(mock_populate_data, _, preflight_on, tmp_path):
+    import pandas as pd
+    from tablecensus import assemble_from
+
+    dictionary = tmp_path / "dictionary.xlsx"
+    with pd.ExcelWriter(dictionary, engine="openpyxl") as writer:
+        pd.DataFrame({"name": ["total", "typo"], "calculation": ["B01001001", "B01001999"]}).to_excel(
+            writer, sheet_name="Variables", index=False
+        )
+        pd.DataFrame({"state": ["26"]}).to_excel(
+            writer, sheet_name="Geographies", index=False
+        )
+        pd.DataFrame({"year": [2023], "release": ["acs5"]}).to_excel(
+            writer, sheet_name="Years", index=False
+        )
+
+    with pytest.raises(ValueError, match="B01001999"):
+        assemble_from(dictionary)
+    mock_populate_data.assert_not_called()
+
+
+def test_vars_search_command(preflight_on):
+    result = CliRunner().invoke(main, ["vars", "search", "poverty", "--year", "2023"])
+
+    assert result.exit_code == 0, result.output
+    assert "B17001001" in result.output and "B01001001" not in result.output
+
+    # Without --year, the latest list already downloaded.
+    result = CliRunner().invoke(main, ["vars", "search", "B0100100"])
+    assert result.output.count("\n") == 3
+    assert open_catalog().latest("acs5") == 2023
@@ -1,6 +1,6 @@
 import pytest
 import numpy as np
-from tablecensus.census_value import CensusValue
+from tablecensus.census_value import CensusArray, CensusValue
 
 
 class TestCensusValue:
@@ -223,3 +223,100 @@ class TestCensusValue:
         
         assert result.estimate == pytest.approx(308.64)
         assert result.error == pytest.approx(19.725)
+
+
+def _scalar(value):
+    return None if value is None or np.isnan(value) else float(value)
+
+
+def _assert_matches_scalar(array_result, scalar_results):
+    for i, expected in enumerate(scalar_results):
+        estimate, error = array_result.estimate[i], array_result.error[i]
+        if expected.estimate is None:
+            # A missing scalar also drops its table tag; for the column the
+            # tag stays, which changes nothing since the row stays missing.
+            assert np.isnan(estimate)
+            assert np.isnan(error)
+            continue
+
+        assert estimate == pytest.approx(expected.estimate)
+
+        if expected.error is None:
+            assert np.isnan(error)
+        else:
+            assert error == pytest.approx(expected.error)
+
+        assert array_result.table == expected.table
+
+
+class TestCensusArray:
+
+    estimates_a = np.array([100.0, 100.0, 100.0, np.nan, 100.0, -50.0])
+    errors_a = np.array([12.0, 2.0, np.nan, 5.0, 10.0, 5.0])
+    estimates_b = np.array([20.0, 20.0, 20.0, 20.0, 0.0, 25.0])
+    errors_b = np.array([2.0, 10.0, 2.0, 2.0, 2.0, 3.0])
+
+    def pair(self, table_a="table1", table_b="table1"):
+        arrays = (
+            CensusArray(self.estimates_a, self.errors_a, table_a),
+            CensusArray(self.estimates_b, self.errors_b, table_b),
+        )
+        scalars = [
+            (
+                CensusValue(_scalar(ea), _scalar(ma), table_a),
+                CensusValue(_scalar(eb), _scalar(mb), table_b),
+            )
+            for ea, ma, eb, mb in zip(
+                self.estimates_a, self.errors_a, self.estimates_b, self.errors_b
+            )
+        ]
+        return arrays, scalars
+
+    @pytest.mark.parametrize("tables", [("table1", "table1"), ("table1", "table2"), (None, None)])
+    def test_add_matches_scalar(self, tables):
+        (a, b), scalars = self.pair(*tables)
+        _assert_matches_scalar(a + b, [x + y for x, y in scalars])
+
+    @pytest.mark.parametrize("tables", [("table1", "table1"), ("table1", "table2")])
+    def test_sub_matches_scalar(self, tables):
+        (a, b), scalars = self.pair(*tables)
+        _assert_matches_scalar(a - b, [x - y for x, y in scalars])
+
+    def test_mul_matches_scalar(self):
+        (a, _), scalars = self.pair()
+        _assert_matches_scalar(a * 2.5, [x * 2.5 for x, _ in scalars])
+        _assert_matches_scalar(3 * a, [3 * x for x, _ in scalars])
+
+    def test_mul_invalid_type(self):
+        (a, b), _ = self.pair()
+        with pytest.raises(TypeError, match="CensusValues cannot be multiplied"):
+            a * b
+
+    @pytest.mark.parametrize("tables", [("table1", "table1"), ("table1", "table2"), (None, None)])
+    def test_truediv_matches_scalar(self, tables):
+        # Covers vsu > 0, vsu < 0, missing error, missing estimate and a zero
+        # denominator in one pass.
+        (a, b), scalars = self.pair(*tables)
+        _assert_matches_scalar(a / b, [x / y for x, y in scalars])
+
+    def test_truediv_by_number(self):
+        (a, _), scalars = self.pair()
+        _assert_matches_scalar(a / 4, [x / 4 for x, _ in scalars])
+
+    def test_truediv_by_zero_number(self):
+        (a, _), _ = self.pair()
+        result = a / 0
+        assert np.isnan(result.estimate).all()
+        assert np.isnan(result.error).all()
+
+    def test_rtruediv_by_number(self):
+        cv = CensusArray(np.array([20.0]), np.array([2.0]), "table1")
+        result = 100 / cv
+
+        assert result.estimate[0] == 5.0
+        assert result.error[0] == 50.0
+        assert result.table == "table1"
+
+    def test_repr(self):
+        (a, _), _ = self.pair()
+        assert repr(a) == "CensusArray(6 values, table='table1')"
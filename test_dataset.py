@@ -0,0 +1,62 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tablecensus.dataset import column_calculations, write_parquet_dataset
+
+pa_dataset = pytest.importorskip("pyarrow.dataset")
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+REPORT = pd.DataFrame({
+    "geoid": ["1400000US26163000200", "0500000US26163", "1400000US26163000100", "0500000US26163"],
+    "geoname": ["Tract 2", "Wayne County", "Tract 1", "Wayne County"],
+    "total": [3.0, np.nan, 1.0, 5.0],
+    "total_moe": [0.3, 0.2, 0.1, 0.5],
+    "Year": [2022, 2022, 2022, 2021],
+    "Release": ["acs5"] * 4,
+})
+CALCULATIONS = column_calculations(pd.DataFrame({"name": ["total"], "calculation": ["B01001001"]}))
+
+
+def test_partitioned_by_year_release_and_summary_level(tmp_path):
+    path = write_parquet_dataset(REPORT, tmp_path / "report.parquet", CALCULATIONS)
+
+    files = sorted(p.relative_to(path).as_posix() for p in path.rglob("*.parquet"))
+    assert files == [
+        "Year=2021/Release=acs5/summary_level=050/part-0.parquet",
+        "Year=2022/Release=acs5/summary_level=050/part-0.parquet",
+        "Year=2022/Release=acs5/summary_level=140/part-0.parquet",
+    ]
+
+    tracts = pq.read_table(path / "Year=2022/Release=acs5/summary_level=140/part-0.parquet")
+    assert tracts.schema.field("geoid").type.value_type == "string"
+    assert tracts.schema.field("total").metadata == {b"calculation": b"B01001001"}
+    # Sorted by geoid inside each file.
+    assert tracts.column("geoid").to_pylist() == ["1400000US26163000100", "1400000US26163000200"]
+
+
+def test_reads_back_with_the_sidecar_schema(tmp_path):
+    path = write_parquet_dataset(REPORT, tmp_path / "report.parquet", CALCULATIONS, codec="snappy")
+
+    sidecar = json.loads((path / "_schema.json").read_text())
+    assert sidecar["compression"] == "snappy"
+    assert {"name": "total_moe", "type": "double",
+            "calculation": "margin of error of B01001001"} in sidecar["columns"]
+
+    table = pa_dataset.dataset(path, partitioning="hive").to_table(
+        filter=pa_dataset.field("Year") == 2021
+    )
+    assert table.column("total").to_pylist() == [5.0]
+
+
+def test_replaces_only_its_own_datasets(tmp_path):
+    path = write_parquet_dataset(REPORT, tmp_path / "report.parquet")
+    write_parquet_dataset(REPORT[REPORT["Year"] == 2022], path)
+    assert not (path / "Year=2021").exists()
+
+    (tmp_path / "elsewhere").mkdir()
+    with pytest.raises(FileExistsError):
+        write_parquet_dataset(REPORT, tmp_path / "elsewhere")
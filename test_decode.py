@@ -0,0 +1,51 @@
+import numpy as np
+
+from tablecensus.assemble import ResponseFrames
+from tablecensus.decode import decode_column, decode_payload
+
+
+def test_sentinels_and_nulls_become_nan():
+    column = decode_column(["12", None, "-666666666", "-555555555", "3.5", "-222222222"])
+
+    assert column.dtype == np.float64
+    assert column[0] == 12 and column[4] == 3.5
+    assert np.isnan(column[[1, 2, 3, 5]]).all()
+
+
+def test_non_numeric_cells_only_lose_themselves():
+    column = decode_column(["1", "*****", "2"])
+
+    assert column[0] == 1 and column[2] == 2
+    assert np.isnan(column[1])
+
+
+def test_decode_payload_keeps_only_requested_codes():
+    data = [
+        ["GEO_ID", "NAME", "A_001E", "A_001EA", "A_001M"],
+        ["g1", "One", "5", "*", "-555555555"],
+        ["g2", "Two", "7", None, "2"],
+    ]
+
+    geo_ids, names, values = decode_payload(data, {"A_001E", "A_001M"})
+
+    assert list(geo_ids) == ["g1", "g2"]
+    assert list(names) == ["One", "Two"]
+    assert set(values) == {"A_001E", "A_001M"}
+    assert list(values["A_001E"]) == [5, 7]
+    assert np.isnan(values["A_001M"][0])
+
+
+def test_batches_in_a_different_order_are_aligned_on_geo_id():
+    frames = ResponseFrames(["A_001E", "B_001E"])
+    label = ("for=tract:*", 2023, "acs5")
+
+    frames.add(label, [["GEO_ID", "NAME", "A_001E"], ["g1", "One", "1"], ["g2", "Two", "2"]])
+    frames.add(label, [["GEO_ID", "NAME", "B_001E"], ["g3", "Three", "30"], ["g1", "One", "10"]])
+
+    [(_, frame)] = list(frames.frames())
+
+    assert list(frame.index) == ["g1", "g2", "g3"]
+    assert list(frame["NAME"]) == ["One", "Two", "Three"]
+    assert frame.loc["g1", "B_001E"] == 10
+    assert np.isnan(frame.loc["g2", "B_001E"])
+    assert np.isnan(frame.loc["g3", "A_001E"])
@@ -0,0 +1,108 @@
+from importlib.resources import files
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from tablecensus import dictionary
+from tablecensus.assemble import read_dictionary
+from tablecensus.dictionary import load_sheets
+
+
+TEMPLATE = Path(str(files("tablecensus") / "templates" / "dictionary_template.xlsx"))
+
+
+def write_dictionary(path, names=("total",), sheets=("Variables", "Geographies", "Years")):
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        if "Variables" in sheets:
+            pd.DataFrame({"name": list(names), "calculation": ["B01001001"] * len(names)}).to_excel(
+                writer, sheet_name="Variables", index=False
+            )
+        if "Years" in sheets:
+            pd.DataFrame({"year": [2022], "release": ["acs5"]}).to_excel(
+                writer, sheet_name="Years", index=False
+            )
+        if "Geographies" in sheets:
+            pd.DataFrame({"state": [26], "county": ["163"]}).to_excel(
+                writer, sheet_name="Geographies", index=False
+            )
+        pd.DataFrame({"reference": range(100)}).to_excel(writer, sheet_name="Variable Library", index=False)
+
+
+def test_matches_read_excel_on_the_template():
+    variables, geographies, releases = read_dictionary(TEMPLATE, use_cache=False)
+
+    pd.testing.assert_frame_equal(variables, pd.read_excel(TEMPLATE, sheet_name="Variables"))
+    pd.testing.assert_frame_equal(
+        geographies, pd.read_excel(TEMPLATE, sheet_name="Geographies", dtype="string")
+    )
+    assert releases == list(
+        pd.read_excel(TEMPLATE, sheet_name="Years").itertuples(index=False, name=None)
+    )
+
+
+def test_numbers_in_geographies_read_as_strings(tmp_path):
+    path = tmp_path / "dictionary.xlsx"
+    write_dictionary(path)
+
+    _, geographies, releases = read_dictionary(path)
+
+    assert list(geographies.loc[0]) == ["26", "163"]
+    assert releases == [(2022, "acs5")]
+
+
+def test_unchanged_file_is_not_parsed_again(tmp_path, monkeypatch):
+    path = tmp_path / "dictionary.xlsx"
+    write_dictionary(path)
+    first = load_sheets(path)
+
+    monkeypatch.setattr(dictionary, "_parse", lambda _: pytest.fail("parsed again"))
+
+    # In memory, and on disk for the next process.
+    pd.testing.assert_frame_equal(load_sheets(path)["Variables"], first["Variables"])
+    dictionary._loaded.clear()
+    pd.testing.assert_frame_equal(load_sheets(path)["Variables"], first["Variables"])
+
+
+def test_edited_file_is_parsed_again(tmp_path):
+    path = tmp_path / "dictionary.xlsx"
+    write_dictionary(path)
+    load_sheets(path)
+
+    write_dictionary(path, names=("total", "other"))
+
+    assert list(load_sheets(path)["Variables"]["name"]) == ["total", "other"]
+
+
+def test_callers_cannot_change_the_cache(tmp_path):
+    path = tmp_path / "dictionary.xlsx"
+    write_dictionary(path)
+
+    variables = load_sheets(path)["Variables"]
+    variables.loc[0, "name"] = "changed"
+
+    assert load_sheets(path)["Variables"].loc[0, "name"] == "total"
+
+
+def test_missing_sheet(tmp_path):
+    path = tmp_path / "dictionary.xlsx"
+    write_dictionary(path, sheets=("Variables", "Geographies"))
+
+    with pytest.raises(ValueError, match="Missing 'Years' sheet"):
+        read_dictionary(path)
+
+
+def test_repeated_names(tmp_path):
+    path = tmp_path / "dictionary.xlsx"
+    write_dictionary(path, names=("total", "total"))
+
+    with pytest.raises(ValueError, match="No repeated variable names"):
+        read_dictionary(path)
+
+
+def test_not_a_workbook(tmp_path):
+    path = tmp_path / "dictionary.xlsx"
+    path.write_text("name,calculation\n")
+
+    with pytest.raises(ValueError, match="Could not read"):
+        read_dictionary(path)
@@ -0,0 +1,155 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pandas as pd
+from aiohttp import ClientSession
+
+from tablecensus import request_manager
+from tablecensus.assemble import assemble_async
+from tablecensus.fake_api import GROUP_CELLS, respond, start_fake_api
+from tablecensus.request_manager import AdaptiveLimiter, manage_requests
+from tablecensus.request_prep import build_calls
+
+
+def test_wildcard_rows_follow_the_reference_shapes():
+    header, *rows = respond("2022", "GEO_ID,NAME,B01001_001E,B01001_001M", "tract:*", "state:26 county:163")
+
+    assert header == ["GEO_ID", "NAME", "B01001_001E", "B01001_001M", "state", "county", "tract"]
+    assert len(rows) == 27
+    assert rows[0][0] == "1400000US26163000001"
+    assert rows[0][4:] == ["26", "163", "000001"]
+
+
+def test_answers_are_deterministic():
+    once = respond("2022", "GEO_ID,B01001_001E", "county:163,099", "state:26")
+    again = respond("2022", "GEO_ID,B01001_001E", "county:163,099", "state:26")
+
+    assert once == again
+    assert [row[0] for row in once[1:]] == ["0500000US26163", "0500000US26099"]
+
+
+def test_group_returns_annotated_table():
+    header, row = respond("2022", "group(B01001)", "state:26", "")
+
+    assert len(header) == 2 + 4 * GROUP_CELLS + 1
+    assert header[2:6] == ["B01001_001E", "B01001_001EA", "B01001_001M", "B01001_001MA"]
+    assert row[3] is None
+
+
+def test_client_runs_against_the_fake(monkeypatch):
+    monkeypatch.setattr(request_manager, "MAX_RETRIES", 0)
+
+    async def scenario():
+        api, runner, base_url = await start_fake_api(latency=0.01, max_concurrent=2)
+        try:
+            needs = {
+                ("for=county:*&in=state:26", 2022, "acs5"): ["B01001_001E", "B01001_001M"],
+                ("for=county:163&in=state:26", 2021, "acs5"): ["B01001_001E", "B01001_001M"],
+            }
+            calls = build_calls(needs, require_key=False, base_url=base_url)
+            ok, errors = await manage_requests(calls, limiter=AdaptiveLimiter(initial=4))
+        finally:
+            await runner.cleanup()
+        return api, ok, errors
+
+    api, ok, errors = asyncio.run(scenario())
+
+    assert errors == []
+    assert sorted(len(data) - 1 for _, data in ok) == [1, 62]
+    assert api.requests == 2
+    assert api.peak_in_flight <= 2
+
+
+def test_injected_overload_is_retried_or_reported(monkeypatch):
+    monkeypatch.setattr(request_manager, "MAX_RETRIES", 0)
+
+    async def scenario():
+        api, runner, base_url = await start_fake_api(overload_rate=1.0)
+        try:
+            calls = build_calls(
+                {("for=state:26", 2022, "acs5"): ["B01001_001E"]},
+                require_key=False, base_url=base_url,
+            )
+            limiter = AdaptiveLimiter(initial=4)
+            ok, errors = await manage_requests(calls, limiter=limiter)
+        finally:
+            await runner.cleanup()
+        return limiter, ok, errors
+
+    limiter, ok, errors = asyncio.run(scenario())
+
+    assert ok == []
+    assert len(errors) == 1
+    assert limiter.limit == 2
+
+
+@patch("tablecensus.request_prep.get_api_key", return_value="test_key")
+def test_assemblies_share_a_session_and_limiter(_, tmp_path, monkeypatch):
+    dictionary = tmp_path / "dictionary.xlsx"
+    with pd.ExcelWriter(dictionary, engine="openpyxl") as writer:
+        pd.DataFrame({"name": ["population"], "calculation": ["B01001001"]}).to_excel(
+            writer, sheet_name="Variables", index=False
+        )
+        pd.DataFrame({"year": [2022, 2021], "release": ["acs5", "acs5"]}).to_excel(
+            writer, sheet_name="Years", index=False
+        )
+        pd.DataFrame({"state": ["26"], "county": ["*"]}).to_excel(
+            writer, sheet_name="Geographies", index=False
+        )
+
+    async def scenario():
+        api, runner, base_url = await start_fake_api(latency=0.01)
+        monkeypatch.setenv("CENSUS_API_URL", base_url)
+        limiter = AdaptiveLimiter(initial=1, adaptive=False)
+        try:
+            async with ClientSession() as session:
+                reports = await asyncio.gather(*(
+                    assemble_async(dictionary, cache_mode="off", session=session, limiter=limiter)
+                    for _ in range(3)
+                ))
+        finally:
+            await runner.cleanup()
+        return api, limiter, reports
+
+    api, limiter, reports = asyncio.run(scenario())
+
+    # The three runs want the same two calls. Any that's already on its way
+    # when another run asks for it is shared rather than sent again.
+    assert api.requests + limiter.shared == 6
+    assert limiter.sent == api.requests
+    assert api.peak_in_flight == 1
+    for report in reports:
+        assert len(report) == 2 * 62
+        pd.testing.assert_frame_equal(report, reports[0])
+
+
+@patch("tablecensus.request_prep.get_api_key", return_value="test_key")
+def test_more_assemblies_than_default_workers(_, tmp_path, monkeypatch):
+    dictionary = tmp_path / "dictionary.xlsx"
+    with pd.ExcelWriter(dictionary, engine="openpyxl") as writer:
+        pd.DataFrame({"name": ["population"], "calculation": ["B01001001"]}).to_excel(
+            writer, sheet_name="Variables", index=False
+        )
+        pd.DataFrame({"year": [2022], "release": ["acs5"]}).to_excel(
+            writer, sheet_name="Years", index=False
+        )
+        pd.DataFrame({"state": ["26"], "county": ["163"]}).to_excel(
+            writer, sheet_name="Geographies", index=False
+        )
+
+    async def scenario():
+        # Parsing a response needs one of these two workers.
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=2))
+        api, runner, base_url = await start_fake_api(latency=0.05)
+        monkeypatch.setenv("CENSUS_API_URL", base_url)
+        try:
+            return await asyncio.wait_for(asyncio.gather(*(
+                assemble_async(dictionary, cache_mode="off") for _ in range(4)
+            )), timeout=10)
+        finally:
+            await runner.cleanup()
+
+    reports = asyncio.run(scenario())
+
+    assert [len(report) for report in reports] == [1] * 4
@@ -0,0 +1,173 @@
+from unittest.mock import patch
+from urllib.parse import unquote
+
+import pandas as pd
+
+from tablecensus.assemble import assemble_from
+from tablecensus.fake_api import respond
+from tablecensus.geography import GeoPart
+from tablecensus.output import write_report
+from tablecensus.partitioned import assemble_partitioned, by_state, plan_partitions
+from tablecensus.reference import STATE_FIPS
+from tablecensus.request_prep import query_param
+
+
+def fake_populate(calls, **_):
+    return [
+        (label, respond(
+            str(label[1]),
+            unquote(query_param(url, "get")),
+            query_param(url, "for"),
+            query_param(url, "in") or "",
+        ))
+        for label, url in calls
+    ]
+
+
+def write_dictionary(path):
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        pd.DataFrame({
+            "name": ["population", "share"],
+            "calculation": ["B01001001", "B01001002 / B01001001"],
+        }).to_excel(writer, sheet_name="Variables", index=False)
+        pd.DataFrame({"year": [2022, 2021], "release": ["acs5", "acs5"]}).to_excel(
+            writer, sheet_name="Years", index=False
+        )
+        pd.DataFrame({"state": ["*", "26"], "county": ["*", None], "place": [None, "22000"]}).to_excel(
+            writer, sheet_name="Geographies", index=False
+        )
+
+
+def test_state_wildcard_becomes_one_part_per_state():
+    parts = by_state([
+        GeoPart("for=tract:*&in=state:*%20county:*", 52 * 1650),
+        GeoPart("for=place:22000&in=state:26", 1),
+        GeoPart("for=state:*", 52),
+    ])
+
+    assert set(parts) == {*STATE_FIPS, None}
+    assert [part.query for part in parts["26"]] == [
+        "for=tract:*&in=state:26%20county:*", "for=place:22000&in=state:26",
+    ]
+    assert parts["26"][0].rows == 1650
+    assert [part.query for part in parts[None]] == ["for=state:*"]
+
+
+def test_states_are_packed_into_the_budget():
+    parts = [GeoPart(f"for=county:*&in=state:{state}", 100) for state in ("01", "02", "04")]
+    releases = [(2022, "acs5"), (2021, "acs5")]
+
+    partitions = plan_partitions(parts, releases, row_size=1_000, budget_bytes=250_000)
+
+    assert [(p.states, p.releases) for p in partitions] == [
+        (["01", "02"], [(2022, "acs5")]), (["04"], [(2022, "acs5")]),
+        (["01", "02"], [(2021, "acs5")]), (["04"], [(2021, "acs5")]),
+    ]
+
+
+@patch("tablecensus.request_prep.get_api_key", return_value="test_key")
+@patch("tablecensus.assemble.populate_data", side_effect=fake_populate)
+def test_same_report_as_assembling_at_once(populate, _, tmp_path):
+    dictionary = tmp_path / "dictionary.xlsx"
+    write_dictionary(dictionary)
+
+    whole = assemble_from(dictionary, cache_mode="off")
+    with assemble_partitioned(dictionary, memory_budget_mb=0.5, cache_mode="off") as report:
+        assert len(report) > 2
+        write_report(report, tmp_path / "report.csv")
+
+    pieces = pd.read_csv(tmp_path / "report.csv", dtype={"geoid": str})
+
+    def ordered(df):
+        return df.sort_values(["Year", "geoid"]).reset_index(drop=True)
+
+    pd.testing.assert_frame_equal(
+        ordered(pieces), ordered(whole), check_dtype=False, check_column_type=False
+    )
+
+
+@patch("tablecensus.request_prep.get_api_key", return_value="test_key")
+@patch("tablecensus.assemble.populate_data", side_effect=fake_populate)
+def test_code_missing_from_one_year_is_checked_over_the_whole_pull(populate, _, tmp_path, monkeypatch):
+    monkeypatch.setenv("CENSUS_PREFLIGHT", "1")
+    published = {
+        2021: {"variables": {"B01001_001E": {}, "B01001_001M": {}}},
+        2022: {"variables": {"B01001_001E": {}, "B01001_001M": {}, "B17001_001E": {}, "B17001_001M": {}}},
+    }
+    monkeypatch.setattr(
+        "tablecensus.catalog.download_variables", lambda year, release: published[int(year)]
+    )
+
+    dictionary = tmp_path / "dictionary.xlsx"
+    with pd.ExcelWriter(dictionary, engine="openpyxl") as writer:
+        pd.DataFrame({"name": ["population", "poverty"], "calculation": ["B01001001", "B17001001"]}).to_excel(
+            writer, sheet_name="Variables", index=False
+        )
+        pd.DataFrame({"year": [2022, 2021], "release": ["acs5", "acs5"]}).to_excel(
+            writer, sheet_name="Years", index=False
+        )
+        pd.DataFrame({"state": ["26"], "county": ["*"]}).to_excel(
+            writer, sheet_name="Geographies", index=False
+        )
+
+    with assemble_partitioned(dictionary, memory_budget_mb=0.05, cache_mode="use") as report:
+        pieces = pd.concat(list(report))
+
+    sent = [url for call in populate.call_args_list for _, url in call.args[0]]
+    assert not any("B17001" in url and "/2021/" in url for url in sent)
+    assert pieces.loc[pieces["Year"] == 2021, "poverty"].isna().all()
+    assert pieces.loc[pieces["Year"] == 2022, "poverty"].notna().all()
+
+
+def recording_populate(calls, recorder=None, replay=None, **_):
+    if replay is None:
+        responses = fake_populate(calls)
+    else:
+        responses = [(label, replay.get(url)) for label, url in calls]
+        missing = [label for label, data in responses if data is None]
+        if missing:
+            raise RuntimeError(f"No response for {missing} in the replay archive")
+    for (label, data), (_, url) in zip(responses, calls):
+        if recorder is not None:
+            recorder.record(label, url, data)
+    return responses
+
+
+@patch("tablecensus.request_prep.get_api_key", return_value="test_key")
+@patch("tablecensus.assemble.populate_data", side_effect=recording_populate)
+def test_replay_leaves_out_what_the_recording_did(populate, _, tmp_path, monkeypatch):
+    monkeypatch.setenv("CENSUS_PREFLIGHT", "1")
+    published = {
+        2021: {"variables": {"B01001_001E": {}, "B01001_001M": {}}},
+        2022: {"variables": {"B01001_001E": {}, "B01001_001M": {}, "B17001_001E": {}, "B17001_001M": {}}},
+    }
+    monkeypatch.setattr(
+        "tablecensus.catalog.download_variables", lambda year, release: published[int(year)]
+    )
+
+    dictionary = tmp_path / "dictionary.xlsx"
+    with pd.ExcelWriter(dictionary, engine="openpyxl") as writer:
+        pd.DataFrame({"name": ["population", "poverty"], "calculation": ["B01001001", "B17001001"]}).to_excel(
+            writer, sheet_name="Variables", index=False
+        )
+        pd.DataFrame({"year": [2022, 2021], "release": ["acs5", "acs5"]}).to_excel(
+            writer, sheet_name="Years", index=False
+        )
+        pd.DataFrame({"state": ["26"], "county": ["*"]}).to_excel(
+            writer, sheet_name="Geographies", index=False
+        )
+
+    whole, parts = tmp_path / "whole.jsonl.gz", tmp_path / "parts.jsonl.gz"
+    recorded = assemble_from(dictionary, record=whole)
+    with assemble_partitioned(dictionary, memory_budget_mb=0.05, record=parts):
+        pass
+
+    # Offline: nothing is checked, and the calls match the recording's.
+    monkeypatch.setattr("tablecensus.catalog.download_variables", None)
+    replayed = assemble_from(dictionary, replay=whole)
+    with assemble_partitioned(dictionary, memory_budget_mb=0.05, replay=parts) as report:
+        pieces = pd.concat(list(report))
+
+    pd.testing.assert_frame_equal(replayed, recorded)
+    assert pieces.loc[pieces["Year"] == 2021, "poverty"].isna().all()
+    assert pieces.loc[pieces["Year"] == 2022, "poverty"].notna().all()
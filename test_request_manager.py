@@ -0,0 +1,344 @@
+import asyncio
+import json
+import threading
+
+import pytest
+from aiohttp import ClientResponseError
+
+from tablecensus import request_manager
+from tablecensus.cache import ResponseCache
+from tablecensus.request_manager import (
+    AdaptiveLimiter,
+    RejectedRequest,
+    RequestError,
+    fetch_async,
+    make_request,
+    manage_requests,
+)
+from tablecensus.request_prep import query_param
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_limit_grows_after_a_healthy_window():
+    limiter = AdaptiveLimiter(initial=2, ceiling=4)
+
+    for _ in range(2):
+        limiter.record_success(0.5)
+    assert limiter.limit == 3
+
+    for _ in range(3 + 4):
+        limiter.record_success(0.5)
+    assert limiter.limit == 4
+    assert limiter.peak == 4
+
+
+def test_slow_responses_do_not_grow_the_limit():
+    limiter = AdaptiveLimiter(initial=2, ceiling=4)
+    limiter.record_success(0.5)
+
+    for _ in range(10):
+        limiter.record_success(5.0)
+    assert limiter.limit == 2
+
+
+def test_overload_halves_once_per_wave():
+    async def scenario():
+        limiter = AdaptiveLimiter(initial=16, ceiling=32)
+
+        async def overloaded():
+            with pytest.raises(ClientResponseError):
+                async with limiter.slot():
+                    await asyncio.sleep(0.01)
+                    raise ClientResponseError(None, (), status=503)
+
+        # Eight requests fail together: one back-off, not eight.
+        await asyncio.gather(*(overloaded() for _ in range(8)))
+        assert limiter.limit == 8
+
+        with pytest.raises(asyncio.TimeoutError):
+            async with limiter.slot():
+                raise asyncio.TimeoutError()
+        assert limiter.limit == 4
+
+        # A bad request says nothing about load.
+        with pytest.raises(ClientResponseError):
+            async with limiter.slot():
+                raise ClientResponseError(None, (), status=400)
+        assert limiter.limit == 4
+
+    run(scenario())
+
+
+def test_slots_respect_the_limit():
+    async def scenario():
+        limiter = AdaptiveLimiter(initial=3, ceiling=3)
+        peak = 0
+
+        async def work():
+            nonlocal peak
+            async with limiter.slot():
+                peak = max(peak, limiter.in_flight)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(work() for _ in range(20)))
+        return peak, limiter
+
+    peak, limiter = run(scenario())
+    assert peak == 3
+    assert limiter.sent == 20
+
+
+def test_fixed_mode_never_moves():
+    limiter = AdaptiveLimiter(initial=8, ceiling=32, adaptive=False)
+    for _ in range(100):
+        limiter.record_success(0.1)
+    run(limiter.record_overload(limiter._epoch))
+
+    assert limiter.limit == 8
+    assert limiter.summary() == "Concurrency fixed at 8."
+
+
+class FakeResponse:
+    def __init__(self, data, status=200):
+        self.data = data
+        self.status = status
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise ClientResponseError(None, (), status=self.status, message="Bad Request")
+
+    async def text(self):
+        return self.data
+
+    async def json(self):
+        return self.data
+
+    async def read(self):
+        return json.dumps(self.data).encode()
+
+
+class SlowForBigCalls:
+    """Times out on any call for more than 'max_codes' variables or any state-wide wildcard."""
+
+    def __init__(self, max_codes=2, counties=("001", "003")):
+        self.max_codes = max_codes
+        self.counties = counties
+        self.urls = []
+
+    def get(self, url, timeout=None):
+        self.urls.append(url)
+        get = query_param(url, "get").split(",")
+        geo_in = query_param(url, "in") or ""
+
+        if query_param(url, "get") == "NAME":
+            return FakeResponse([["NAME", "state", "county"], *(["x", "26", c] for c in self.counties)])
+        if len(get) - 2 > self.max_codes or "county" not in geo_in and "tract" in url:
+            raise asyncio.TimeoutError()
+
+        county = geo_in.rpartition(":")[2] if "county" in geo_in else "000"
+        header = ["GEO_ID", "NAME", *get[2:]]
+        rows = [[f"G{county}{i}", f"Place {county}{i}", *(f"{c}:{i}" for c in get[2:])] for i in range(2)]
+        return FakeResponse([header, *rows])
+
+
+class Bar:
+    n = 0
+
+    def update(self, k):
+        self.n += k
+
+
+@pytest.fixture
+def no_waiting(monkeypatch):
+    async def instant(_):
+        pass
+
+    monkeypatch.setattr(request_manager, "MAX_RETRIES", 0)
+    monkeypatch.setattr(request_manager.asyncio, "sleep", instant)
+
+
+def test_timed_out_call_is_split_by_variables(no_waiting):
+    session = SlowForBigCalls(max_codes=1)
+    url = "https://api.census.gov/data/2023/acs/acs5?get=GEO_ID,NAME,A_001E,A_002E,A_003E&for=place:*&in=state:26"
+    bar = Bar()
+
+    label, data = run(make_request(("label", url), session, bar, AdaptiveLimiter()))
+
+    assert label == "label"
+    assert data[0] == ["GEO_ID", "NAME", "A_001E", "A_002E", "A_003E"]
+    assert data[1] == ["G0000", "Place 0000", "A_001E:0", "A_002E:0", "A_003E:0"]
+    assert len(data) == 3
+    assert bar.n == 1
+
+
+def test_timed_out_state_wildcard_is_split_by_county(no_waiting):
+    session = SlowForBigCalls(max_codes=5)
+    url = "https://api.census.gov/data/2023/acs/acs5?get=GEO_ID,NAME,A_001E&for=tract:*&in=state:26"
+
+    _, data = run(make_request(("label", url), session, Bar(), AdaptiveLimiter()))
+
+    assert "in=state:26%20county:001" in session.urls[-2] + session.urls[-1]
+    assert [row[0] for row in data[1:]] == ["G0010", "G0011", "G0030", "G0031"]
+
+
+def test_split_gives_up_past_the_depth_limit(no_waiting):
+    session = SlowForBigCalls(max_codes=0)
+    url = "https://api.census.gov/data/2023/acs/acs5?get=GEO_ID,NAME,A_001E,A_002E,A_003E,A_004E,A_005E&for=place:*"
+
+    result = run(make_request(("label", url), session, Bar(), AdaptiveLimiter()))
+
+    assert isinstance(result, RequestError)
+    assert "timed out" in str(result)
+
+
+class RejectsCodes(SlowForBigCalls):
+    """Answers 400 to any call naming one of 'bad'."""
+
+    def __init__(self, bad):
+        super().__init__(max_codes=50)
+        self.bad = set(bad)
+
+    def get(self, url, timeout=None):
+        bad = sorted(self.bad & set(query_param(url, "get").split(",")))
+        if bad:
+            self.urls.append(url)
+            return FakeResponse(f"error: unknown variable '{bad[0]}'", status=400)
+        return super().get(url, timeout)
+
+
+def test_rejected_chunk_is_bisected_down_to_the_bad_codes(no_waiting):
+    session = RejectsCodes(bad={"B_002E", "B_002M"})
+    codes = ["A_001E", "A_001M", "B_002E", "B_002M", "C_003E", "C_003M"]
+    url = f"https://api.census.gov/data/2019/acs/acs5?get=GEO_ID,NAME,{','.join(codes)}&for=place:*"
+    rejected = []
+
+    _, data = run(make_request((("p", 2019, "acs5"), url), session, Bar(), AdaptiveLimiter(), rejected=rejected))
+
+    header, *rows = data
+    assert set(header) == {"GEO_ID", "NAME", *codes}
+    assert rows[0][header.index("C_003M")] == "C_003M:0"
+    assert rows[0][header.index("B_002E")] is None
+    # The bad pair straddles the first halving, so each half reports one.
+    assert sorted(code for _, dropped in rejected for code in dropped) == ["B_002E", "B_002M"]
+
+
+def test_chunk_of_only_bad_codes_is_an_error(no_waiting):
+    session = RejectsCodes(bad={"B_002E", "B_002M"})
+    url = "https://api.census.gov/data/2019/acs/acs5?get=GEO_ID,NAME,B_002E,B_002M&for=place:*"
+    rejected = []
+
+    result = run(make_request(("label", url), session, Bar(), AdaptiveLimiter(), rejected=rejected))
+
+    assert isinstance(result, RejectedRequest)
+    assert result.codes == ["B_002E", "B_002M"]
+    assert "B_002E" in str(result)
+    assert rejected == []
+
+
+def test_bad_geography_is_not_bisected(no_waiting):
+    class RejectsGeography(SlowForBigCalls):
+        def get(self, url, timeout=None):
+            self.urls.append(url)
+            return FakeResponse("error: unknown/unsupported geography hierarchy", status=400)
+
+    session = RejectsGeography()
+    codes = ",".join(f"A_{i:03d}E" for i in range(1, 9))
+    url = f"https://api.census.gov/data/2019/acs/acs5?get=GEO_ID,NAME,{codes}&for=blob:*"
+
+    result = run(make_request(("label", url), session, Bar(), AdaptiveLimiter()))
+
+    assert type(result) is RequestError
+    assert "unsupported geography" in str(result)
+    assert len(session.urls) == 1
+
+
+def test_salvaged_call_is_cached_whole(no_waiting, tmp_path, capsys):
+    codes = ["A_001E", "A_001M", "B_002E", "B_002M", "C_003E", "C_003M"]
+    url = f"https://api.census.gov/data/2019/acs/acs5?get=GEO_ID,NAME,{','.join(codes)}&for=place:*"
+    cache = ResponseCache(tmp_path, ttl_days=1, max_size_mb=10)
+
+    label = ("place:*", 2019, "acs5")
+
+    first = RejectsCodes(bad={"B_002E"})
+    ok = run(fetch_async([(label, url)], cache=cache, session=first))
+    assert len(first.urls) > 1
+    assert "B_002E (2019 acs5)" in capsys.readouterr().out
+
+    again = RejectsCodes(bad={"B_002E"})
+    rejected = []
+    assert run(fetch_async([(label, url)], cache=cache, session=again, rejected=rejected)) == ok
+    assert again.urls == []
+    # Still reported, though nothing was sent.
+    assert rejected == [(label, ["B_002E"])]
+    assert "B_002E (2019 acs5)" in capsys.readouterr().out
+
+
+def test_responses_are_handed_over_as_they_arrive(no_waiting, monkeypatch):
+    class Session(SlowForBigCalls):
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+    monkeypatch.setattr(request_manager, "ClientSession", lambda: Session())
+    received = []
+
+    def consume(label, data):
+        received.append((label, len(data), threading.current_thread() is threading.main_thread()))
+
+    requests = [
+        (i, f"https://api.census.gov/data/2023/acs/acs5?get=GEO_ID,NAME,A_00{i}E&for=place:*")
+        for i in range(3)
+    ]
+    ok, errors = run(manage_requests(requests, on_response=consume))
+
+    assert ok == [] and errors == []
+    assert sorted(received) == [(0, 3, False), (1, 3, False), (2, 3, False)]
+
+
+def test_identical_requests_in_flight_go_out_once(no_waiting):
+    session = SlowForBigCalls(max_codes=5)
+    url = "https://api.census.gov/data/2023/acs/acs5?get=GEO_ID,NAME,A_001E&for=place:*"
+    limiter = AdaptiveLimiter()
+
+    ok, errors = run(manage_requests(
+        [("first", f"{url}&key=one"), ("second", f"{url}&key=two")],
+        limiter=limiter, session=session,
+    ))
+
+    assert errors == []
+    assert len(session.urls) == 1
+    assert sorted(label for label, _ in ok) == ["first", "second"]
+    assert ok[0][1] == ok[1][1]
+    assert limiter.shared == 1
+
+
+def test_every_waiter_hears_of_rejected_codes(no_waiting):
+    session = RejectsCodes(bad={"B_002E"})
+    codes = ["A_001E", "A_001M", "B_002E", "B_002M"]
+    url = f"https://api.census.gov/data/2019/acs/acs5?get=GEO_ID,NAME,{','.join(codes)}&for=place:*"
+    label = ("place:*", 2019, "acs5")
+    limiter = AdaptiveLimiter()
+    first, second = [], []
+
+    async def scenario():
+        return await asyncio.gather(
+            manage_requests([(label, url)], limiter=limiter, rejected=first, session=session),
+            manage_requests([(label, url)], limiter=limiter, rejected=second, session=session),
+        )
+
+    (ok_first, _), (ok_second, _) = run(scenario())
+
+    assert limiter.shared == 1
+    assert ok_first == ok_second
+    assert first == second == [(label, ["B_002E"])]
@@ -0,0 +1,201 @@
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from tablecensus.geography import GeoPart, build_api_geo_parts, estimate_rows
+from tablecensus.reference import SumLevel
+from tablecensus.request_prep import (
+    API_MAX_VARIABLES,
+    MAX_URL_LENGTH,
+    build_calls,
+    estimate_payload,
+    group_tables,
+    pack,
+    plan_calls,
+    plan_needs,
+)
+
+
+def codes_for(table, cells):
+    return [f"{table}_{cell:03d}{kind}" for cell in cells for kind in "EM"]
+
+
+@pytest.fixture(autouse=True)
+def api_key():
+    with patch("tablecensus.request_prep.get_api_key", return_value="test_key"):
+        yield
+
+
+def test_mostly_used_table_is_grouped():
+    codes = codes_for("B01001", range(1, 50)) + codes_for("B19013", [1])
+    grouped, loose = group_tables(codes)
+
+    assert grouped == ["B01001"]
+    assert loose == codes_for("B19013", [1])
+
+
+def test_sparse_or_small_tables_stay_loose():
+    sparse = codes_for("B01001", [1, 2, 26, 49])
+    small = codes_for("B17001", range(1, 6))
+
+    assert group_tables(sparse + small) == ([], sparse + small)
+
+
+def test_grouped_table_is_a_single_call():
+    codes = codes_for("B01001", range(1, 50))
+    needs = plan_needs([GeoPart("for=county:163&in=state:26", 1)], codes, [(2022, "acs5")])
+
+    calls = build_calls(needs)
+
+    assert len(calls) == 1
+    label, url = calls[0]
+    assert label == ("for=county:163&in=state:26", 2022, "acs5")
+    assert "get=group(B01001)&for=county:163&in=state:26" in url
+
+
+def test_loose_codes_are_packed_evenly():
+    codes = [code for n in range(1, 31) for code in codes_for(f"B{n:05d}", [1])]
+    needs = plan_needs([GeoPart("for=state:26", 1)], codes, [(2022, "acs5"), (2021, "acs5")])
+
+    calls = build_calls(needs)
+
+    requested = [url.split("get=")[1].split("&")[0].split(",") for _, url in calls]
+    # 60 codes + GEO_ID,NAME need two calls per year; split 30/30, not 48/12.
+    assert len(calls) == 4
+    assert all(len(batch) == 32 for batch in requested)
+    assert all(len(batch) <= API_MAX_VARIABLES for batch in requested)
+    assert sorted(c for batch in requested for c in batch[2:]) == sorted(codes * 2)
+
+
+def test_pack_respects_both_limits():
+    items = [f"{n:06d}" for n in range(300)]
+
+    by_count = pack(items, 100, 10_000)
+    assert [len(b) for b in by_count] == [100, 100, 100]
+
+    by_length = pack(items, 300, 1000)
+    assert all(len(",".join(b)) <= 1000 for b in by_length)
+    assert len(by_length) == 3
+    assert max(map(len, by_length)) - min(map(len, by_length)) <= 1
+    assert [i for b in by_length for i in b] == items
+
+
+def test_urls_stay_under_limit():
+    tracts = ",".join(f"{n:06d}" for n in range(270))
+    geo_parts = [GeoPart(f"for=tract:{tracts}&in=state:26%20county:163", 270)]
+    codes = [code for n in range(1, 101) for code in codes_for(f"B{n:05d}", [1])]
+
+    calls = build_calls(plan_needs(geo_parts, codes, [(2022, "acs5")]))
+
+    assert all(len(url) <= MAX_URL_LENGTH for _, url in calls)
+
+
+def test_estimate_rows():
+    state = (SumLevel.STATE, "26")
+    assert estimate_rows(SumLevel.TRACT, frozenset({state, (SumLevel.COUNTY, "163")}), ["1", "2"]) == 2
+    assert estimate_rows(SumLevel.TRACT, frozenset({state, (SumLevel.COUNTY, "163")}), ["*"]) == 27
+    assert estimate_rows(SumLevel.TRACT, frozenset({state, (SumLevel.COUNTY, "*")}), ["*"]) == 27 * 62
+    assert estimate_rows(SumLevel.STATE, SumLevel.STATE, ["*"]) == 52
+
+
+def test_estimate_payload():
+    geo_parts = [GeoPart("for=county:*&in=state:26", 83)]
+    needs = plan_needs(geo_parts, codes_for("B01001", range(1, 50)) + codes_for("B19013", [1]), [(2022, "acs5")])
+
+    planned = plan_calls(needs)
+    rows, size = estimate_payload(planned, needs, geo_parts)
+
+    assert rows == 2 * 83
+    assert size == 83 * (2 + 4 * 49) * 12 + 83 * 4 * 12
+
+
+@patch("tablecensus.assemble.populate_data")
+def test_group_response_keeps_only_requested_columns(mock_populate_data, tmp_path):
+    from tablecensus import assemble_from
+
+    dictionary = tmp_path / "dictionary.xlsx"
+    with pd.ExcelWriter(dictionary, engine="openpyxl") as writer:
+        pd.DataFrame({"name": ["total"], "calculation": ["B01001001"]}).to_excel(
+            writer, sheet_name="Variables", index=False
+        )
+        pd.DataFrame({"year": [2022], "release": ["acs5"]}).to_excel(
+            writer, sheet_name="Years", index=False
+        )
+        pd.DataFrame({"state": ["26"]}).to_excel(writer, sheet_name="Geographies", index=False)
+
+    mock_populate_data.return_value = [(("for=state:26", 2022, "acs5"), [
+        ["GEO_ID", "NAME", "B01001_001E", "B01001_001EA", "B01001_001M", "B01001_001MA",
+         "B01001_002E", "B01001_002M", "state"],
+        ["0400000US26", "Michigan", "10034113", None, "-555555555", "*****", "4977000", "1200", "26"],
+    ])]
+
+    result = assemble_from(str(dictionary), cache_mode="off")
+
+    assert list(result.columns) == ["geoid", "geoname", "Year", "Release", "total", "total_moe"]
+    assert result["total"].iloc[0] == 10034113
+
+
+def tract_geographies(tracts):
+    return pd.DataFrame({
+        "state": ["26"] * len(tracts),
+        "county": ["163"] * len(tracts),
+        "tract": tracts,
+    }, dtype="string")
+
+
+def test_long_explicit_list_becomes_filtered_wildcard():
+    tracts = [f"{n:06d}" for n in range(300)]
+
+    (part,) = build_api_geo_parts(tract_geographies(tracts))
+
+    assert part.query == "for=tract:*&in=state:26%20county:163"
+    assert part.keep == frozenset(tracts)
+    assert part.keeps("1400000US26163000299")
+    assert not part.keeps("1400000US26163000300")
+
+
+def test_short_explicit_list_stays_explicit():
+    (part,) = build_api_geo_parts(tract_geographies(["511400", "511500"]))
+
+    assert part.query == "for=tract:511400,511500&in=state:26%20county:163"
+    assert part.keep is None
+
+
+def test_wildcard_row_covers_explicit_siblings():
+    geographies = pd.DataFrame({"state": ["26", "26", "26"], "county": ["163", "*", "099"]}, dtype="string")
+
+    (part,) = build_api_geo_parts(geographies)
+
+    assert part.query == "for=county:*&in=state:26"
+    assert part.keep is None
+
+
+@patch("tablecensus.assemble.populate_data")
+def test_wildcard_rows_are_filtered_to_requested(mock_populate_data, tmp_path):
+    from tablecensus import assemble_from
+
+    tracts = [f"{n:06d}" for n in range(300)]
+    dictionary = tmp_path / "dictionary.xlsx"
+    with pd.ExcelWriter(dictionary, engine="openpyxl") as writer:
+        pd.DataFrame({"name": ["total"], "calculation": ["B01001001"]}).to_excel(
+            writer, sheet_name="Variables", index=False
+        )
+        pd.DataFrame({"year": [2022], "release": ["acs5"]}).to_excel(
+            writer, sheet_name="Years", index=False
+        )
+        tract_geographies(tracts).to_excel(writer, sheet_name="Geographies", index=False)
+
+    header = ["GEO_ID", "NAME", "B01001_001E", "B01001_001M", "state", "county", "tract"]
+    rows = [
+        [f"1400000US26163{n:06d}", f"Tract {n}", "100", "10", "26", "163", f"{n:06d}"]
+        for n in range(610)
+    ]
+    mock_populate_data.return_value = [
+        (("for=tract:*&in=state:26%20county:163", 2022, "acs5"), [header, *rows])
+    ]
+
+    result = assemble_from(str(dictionary), cache_mode="off")
+
+    assert len(result) == 300
+    assert set(result["geoid"].str[-6:]) == set(tracts)
@@ -0,0 +1,60 @@
+import json
+import subprocess
+import sys
+
+import tablecensus
+
+
+# What the package must not import until a command needs it.
+HEAVY = ("pandas", "numpy", "aiohttp", "openpyxl", "pyarrow")
+
+# Generous for a slow CI machine; most of it is click. The heavy imports
+# alone take the best part of a second.
+IMPORT_BUDGET_SECONDS = 0.3
+
+
+def heavy_modules_after(code: str, cwd=None) -> list[str]:
+    script = (
+        f"{code}\n"
+        "import json, sys\n"
+        f"print(json.dumps([m for m in {HEAVY!r} if m in sys.modules]))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script], capture_output=True, text=True, check=True, cwd=cwd,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_import_leaves_heavy_modules_alone():
+    assert heavy_modules_after("import tablecensus") == []
+
+
+def test_help_and_start_leave_heavy_modules_alone(tmp_path):
+    run = (
+        "from tablecensus import main\n"
+        "for args in (['--help'], ['assemble', '--help'], ['start', '.']):\n"
+        "    try:\n"
+        "        main(args)\n"
+        "    except SystemExit:\n"
+        "        pass"
+    )
+    assert heavy_modules_after(run, cwd=tmp_path) == []
+    assert list(tmp_path.glob("data_dictionary_*.xlsx"))
+
+
+def test_import_time():
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import tablecensus"],
+        capture_output=True, text=True, check=True,
+    )
+    # The last line is the package itself, with everything it imported.
+    cumulative = int(result.stderr.strip().splitlines()[-1].split("|")[1])
+    assert cumulative / 1e6 < IMPORT_BUDGET_SECONDS
+
+
+def test_public_names_still_import():
+    from tablecensus import assemble_from
+    from tablecensus.assemble import assemble_from as direct
+
+    assert assemble_from is direct
+    assert tablecensus.StageTimer.__name__ == "StageTimer"
@@ -0,0 +1,57 @@
+import zipfile
+from xml.etree import ElementTree
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+from tablecensus.table_style import write_d3_excel
+
+
+def test_values_round_trip(tmp_path):
+    path = tmp_path / "report.xlsx"
+    df = pd.DataFrame({
+        "geoid": ["26163", "26099", "26125"],
+        "rate": [0.25, np.nan, np.inf],
+        "Year": [2022, 2022, 2021],
+    })
+
+    write_d3_excel(df, path)
+
+    sheet = load_workbook(path).active
+    assert [[c.value for c in row] for row in sheet.iter_rows()] == [
+        ["geoid", "rate", "Year"],
+        ["26163", 0.25, 2022],
+        ["26099", None, 2022],
+        ["26125", "inf", 2021],
+    ]
+
+
+def test_d3_look_without_per_cell_styles(tmp_path):
+    path = tmp_path / "report.xlsx"
+    write_d3_excel(pd.DataFrame({"a": range(4), "b": range(4)}), path)
+
+    sheet = load_workbook(path).active
+    header, body = sheet["A1"], sheet["B3"]
+    assert header.font.b and header.font.name == "IBM Plex Sans"
+    assert header.border.bottom.style == "thin"
+    assert body.font.name == "IBM Plex Sans" and body.font.sz == 13
+    assert not body.has_style
+
+    (stripes,) = list(sheet.conditional_formatting)
+    assert str(stripes.sqref) == "A2:B5"
+    assert stripes.rules[0].formula == ["MOD(ROW(),2)=0"]
+
+
+def test_default_font_in_saved_stylesheet(tmp_path):
+    path = tmp_path / "report.xlsx"
+    write_d3_excel(pd.DataFrame({"a": [1]}), path)
+
+    with zipfile.ZipFile(path) as xlsx:
+        styles = ElementTree.fromstring(xlsx.read("xl/styles.xml"))
+    ns = {"s": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+    default = styles.find("s:fonts/s:font", ns)
+
+    # Font 0 is what every unstyled cell is shown in.
+    assert default.find("s:name", ns).get("val") == "IBM Plex Sans"
+    assert default.find("s:sz", ns).get("val") == "13"
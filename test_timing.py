@@ -0,0 +1,71 @@
+import time
+
+from tablecensus.timing import StageTimer
+
+
+def test_repeated_stages_add_up():
+    timer = StageTimer()
+    for _ in range(3):
+        with timer.stage("fetch"):
+            time.sleep(0.01)
+    with timer.stage("eval"):
+        pass
+
+    assert list(timer.stages) == ["fetch", "eval"]
+    assert timer.stages["fetch"] >= 0.03
+    assert "fetch" in timer.report()
+
+
+def test_stage_is_recorded_when_it_raises():
+    timer = StageTimer()
+    try:
+        with timer.stage("read"):
+            raise ValueError
+    except ValueError:
+        pass
+
+    assert "read" in timer.stages
+
+
+def test_profiler_records_stages_and_requests(tmp_path):
+    import asyncio
+    import json
+
+    from tablecensus.fake_api import start_fake_api
+    from tablecensus.request_manager import manage_requests
+    from tablecensus.request_prep import build_calls
+    from tablecensus.timing import Profiler
+
+    profiler = Profiler(cpu=True)
+
+    async def fetch():
+        _, runner, base_url = await start_fake_api()
+        try:
+            calls = build_calls(
+                {("for=county:*&in=state:26", 2022, "acs5"): ["B01001_001E"]},
+                require_key=False, base_url=base_url,
+            )
+            return await manage_requests(calls)
+        finally:
+            await runner.cleanup()
+
+    with profiler.stage("plan"):
+        with profiler.stage("inner"):
+            pass
+    with profiler.stage("fetch"), profiler.activate():
+        asyncio.run(fetch())
+
+    profile = profiler.as_dict()
+    assert [s["name"] for s in profile["stages"]] == ["plan", "fetch"]
+    assert profile["stages"][0]["children"][0]["name"] == "inner"
+
+    [request] = profile["requests"]
+    assert request["outcome"] == "ok"
+    assert request["bytes"] > 0
+    assert "key=" not in request["url"]
+    assert profile["summary"]["attempts"] == 1
+
+    written = profiler.write(tmp_path / "profile.json", "chrome")
+    trace = json.loads(written[0].read_text())
+    assert {e["cat"] for e in trace["traceEvents"] if "cat" in e} >= {"stage", "request"}
+    assert written[1].suffix == ".prof"
@@ -0,0 +1,123 @@
+from unittest.mock import patch
+
+import pandas as pd
+
+from tablecensus import assemble_from
+from tablecensus.warehouse import Warehouse
+
+
+LABEL = ("for=county:163,099&in=state:26", 2020, "acs5")
+PAYLOAD = [
+    ["GEO_ID", "NAME", "B01001_001E", "B01001_001M", "state", "county"],
+    ["0500000US26163", "Wayne County, Michigan", "1749343", "100", "26", "163"],
+    ["0500000US26099", "Macomb County, Michigan", "881217", "50", "26", "099"],
+]
+CODES = ["B01001_001E", "B01001_001M"]
+
+
+def test_unknown_geo_part_is_all_missing(tmp_path):
+    warehouse = Warehouse(tmp_path / "w.sqlite3")
+    assert warehouse.missing(*LABEL, CODES) == CODES
+
+
+def test_stored_cells_are_not_missing(tmp_path):
+    warehouse = Warehouse(tmp_path / "w.sqlite3")
+    warehouse.store([(LABEL, PAYLOAD)], CODES)
+
+    assert warehouse.missing(*LABEL, CODES) == []
+    assert warehouse.missing(*LABEL, CODES + ["B17001_001E"]) == ["B17001_001E"]
+    # Same geography, different year: nothing known yet.
+    assert warehouse.missing(LABEL[0], 2021, "acs5", CODES) == CODES
+
+
+def test_payload_round_trip(tmp_path):
+    warehouse = Warehouse(tmp_path / "w.sqlite3")
+    warehouse.store([(LABEL, PAYLOAD)], CODES)
+
+    header, *rows = warehouse.payload(*LABEL, ["B01001_001E"])
+
+    assert header == ["GEO_ID", "NAME", "B01001_001E"]
+    assert sorted(rows) == [
+        ["0500000US26099", "Macomb County, Michigan", "881217"],
+        ["0500000US26163", "Wayne County, Michigan", "1749343"],
+    ]
+
+
+def test_refresh_ignores_stored_cells(tmp_path):
+    Warehouse(tmp_path / "w.sqlite3").store([(LABEL, PAYLOAD)], CODES)
+    assert Warehouse(tmp_path / "w.sqlite3", read=False).missing(*LABEL, CODES) == CODES
+
+
+@patch("tablecensus.request_prep.get_api_key", return_value="test_key")
+@patch("tablecensus.assemble.populate_data")
+def test_second_run_only_fetches_new_variables(mock_populate_data, _, tmp_path):
+    dictionary = tmp_path / "dictionary.xlsx"
+
+    def write_dictionary(calculations):
+        with pd.ExcelWriter(dictionary, engine="openpyxl") as writer:
+            pd.DataFrame({"name": calculations, "calculation": calculations}).to_excel(
+                writer, sheet_name="Variables", index=False
+            )
+            pd.DataFrame({"year": [2020], "release": ["acs5"]}).to_excel(
+                writer, sheet_name="Years", index=False
+            )
+            pd.DataFrame({"state": ["26", "26"], "county": ["163", "099"]}).to_excel(
+                writer, sheet_name="Geographies", index=False
+            )
+
+    write_dictionary(["B01001001"])
+    mock_populate_data.return_value = [(LABEL, PAYLOAD)]
+    first = assemble_from(str(dictionary))
+
+    write_dictionary(["B01001001", "B19013001"])
+    mock_populate_data.reset_mock()
+    mock_populate_data.return_value = [(LABEL, [
+        ["GEO_ID", "NAME", "B19013_001E", "B19013_001M"],
+        ["0500000US26163", "Wayne County, Michigan", "45000", "1500"],
+        ["0500000US26099", "Macomb County, Michigan", "55000", "2000"],
+    ])]
+    second = assemble_from(str(dictionary))
+
+    (calls,), _ = mock_populate_data.call_args
+    fetched = {code for _, url in calls for code in url.split("get=")[1].split("&")[0].split(",")}
+    assert "B19013_001E" in fetched
+    assert "B01001_001E" not in fetched
+
+    assert sorted(second["B01001001"]) == sorted(first["B01001001"])
+    assert set(second["B19013001"]) == {45000, 55000}
+
+    # Nothing new: no calls at all.
+    mock_populate_data.reset_mock()
+    assemble_from(str(dictionary))
+    mock_populate_data.assert_not_called()
+
+
+@patch("tablecensus.request_prep.get_api_key", return_value="test_key")
+@patch("tablecensus.assemble.populate_data")
+def test_rejected_codes_are_reported_from_the_warehouse(mock_populate_data, _, tmp_path, capsys):
+    dictionary = tmp_path / "dictionary.xlsx"
+    with pd.ExcelWriter(dictionary, engine="openpyxl") as writer:
+        pd.DataFrame({"name": ["total", "male"], "calculation": ["B01001001", "B01001002"]}).to_excel(
+            writer, sheet_name="Variables", index=False
+        )
+        pd.DataFrame({"year": [2020], "release": ["acs5"]}).to_excel(
+            writer, sheet_name="Years", index=False
+        )
+        pd.DataFrame({"state": ["26", "26"], "county": ["163", "099"]}).to_excel(
+            writer, sheet_name="Geographies", index=False
+        )
+
+    def refuse(calls, rejected=None, **_):
+        rejected.append((LABEL, ["B01001_002E", "B01001_002M"]))
+        header, *rows = PAYLOAD
+        return [(LABEL, [header + ["B01001_002E", "B01001_002M"], *(row + [None, None] for row in rows)])]
+
+    mock_populate_data.side_effect = refuse
+    assemble_from(str(dictionary))
+    capsys.readouterr()
+
+    # Served from the warehouse, and still reported.
+    mock_populate_data.reset_mock()
+    assemble_from(str(dictionary))
+    mock_populate_data.assert_not_called()
+    assert "B01001_002E, B01001_002M (2020 acs5)" in capsys.readouterr().out
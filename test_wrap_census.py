@@ -1,5 +1,12 @@
 import pandas as pd
-from tablecensus.variables import create_namespace, unwrap_calculations
+import pytest
+from tablecensus.variables import (
+    create_array_namespace,
+    create_namespace,
+    unwrap_arrays,
+    unwrap_calculations,
+)
+from tablecensus.calculations import evaluate_calculation
 from tablecensus.census_value import CensusValue
 
 
@@ -44,3 +51,28 @@ def test_unwrap_calculations():
     variables_df = pd.DataFrame()  # Empty DataFrame as second parameter
     unwrapped = unwrap_calculations(namespace, variables_df)
 
+
+
+def test_evaluate_on_array_namespace():
+    raw_census_data = pd.DataFrame({
+        "GEO_ID": ["1", "2"],
+        "NAME": ["one", "two"],
+        "Year": [2020, 2020],
+        "Release": ["acs5", "acs5"],
+        "B17001_001E": pd.array([100, 0], dtype="Float64"),
+        "B17001_001M": pd.array([10, 1], dtype="Float64"),
+        "B17001_002E": pd.array([20, None], dtype="Float64"),
+        "B17001_002M": pd.array([2, 1], dtype="Float64"),
+    })
+
+    namespace = create_array_namespace(raw_census_data, ["B17001001", "B17001002"])
+    rate = evaluate_calculation("B17001002 / B17001001 * 100", namespace)
+
+    assert rate.estimate[0] == 20
+    assert pd.isna(rate.estimate[1])
+
+    unwrapped = unwrap_arrays(raw_census_data[["GEO_ID", "NAME"]], {"poverty_rate": rate})
+    assert list(unwrapped.columns) == ["GEO_ID", "NAME", "poverty_rate", "poverty_rate_moe"]
+
+    with pytest.raises(ValueError, match="Unsupported expression"):
+        evaluate_calculation("max(B17001001, B17001002)", namespace)